@@ -13,43 +13,22 @@ import json
 import re
 import math
 from typing import List, Tuple
-from neo4j import GraphDatabase
-from openai import OpenAI
 import argparse
-
-from Secret.secret import (
-    NEO4J_URI_secret,
-    NEO4J_USER_secret,
-    NEO4J_PASS_secret,
-    OPENAI_API_KEY_secret,
-    COHERE_API_KEY_secret
-)
-
-from openai import OpenAI
-import cohere
-
-client = OpenAI(api_key=OPENAI_API_KEY_secret)
-cohere_client = cohere.Client(COHERE_API_KEY_secret)
+from pathlib import Path
+import numpy as np
+sys.path.append(str(Path(__file__).resolve().parents[1] / "query"))
+from snapshot_export import export_graph_snapshot, write_path_aggregates
+from entity_index import EntityIndex, ENTITY_INDEX_PATH
+from quantization import EMBEDDING_QUANT, QUANT_MODES, quantize_matrix, quantize_embedding, row_norms, quantized_cosine, dequantize_matrix
+from config import get_neo4j_driver, get_openai_client, OPENAI_API_KEY, MODEL_NAME, SYSTEM_MAX_HOPS
+from cosine_similarity import cosine_similarity
+from top_k import fetch_full_embeddings
 
 
 # === CONFIGURATION ===
 
-NEO4J_URI = os.getenv("NEO4J_URI", NEO4J_URI_secret)
-NEO4J_USER = os.getenv("NEO4J_USER", NEO4J_USER_secret)
-NEO4J_PASS = os.getenv("NEO4J_PASS", NEO4J_PASS_secret)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", OPENAI_API_KEY_secret)
-COHERE_API_KEY = os.getenv("COHERE_API_KEY", COHERE_API_KEY_secret)
-MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
 SIMILAR_K = int(os.getenv("SIMILAR_K", 7))
-
-# Validate OpenAI API key
-if not OPENAI_API_KEY:
-    print("Error: OPENAI_API_KEY must be set as an environment variable or in this file.")
-    sys.exit(1)
-
-# Initialize clients
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
-client = OpenAI(api_key=OPENAI_API_KEY)
+PATH_AGG_TOP_M = int(os.getenv("PATH_AGG_TOP_M", 8))
 
 # === ENTITY EXTRACTION ===
 def extract_entities(text: str) -> List[str]:
@@ -59,7 +38,7 @@ def extract_entities(text: str) -> List[str]:
         f"Text:\n{text}\n\nEntities:"
     )
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[{"role": "user", "content": prompt}]
         )
@@ -81,8 +60,10 @@ def cosine_similarity(a: List[float], b: List[float]) -> float:
     return dot / (norm_a * norm_b) if norm_a and norm_b else 0.0
 
 # === PROCESS AND LINK CHUNKS + ENTITIES ===
-def process_chunks_and_entities():
-    with driver.session() as session:
+def process_chunks_and_entities(index_path: str = ENTITY_INDEX_PATH):
+    # Build the entity -> chunk postings alongside the MENTIONED_IN links
+    entity_index = EntityIndex()
+    with get_neo4j_driver().session() as session:
         result = session.run("MATCH (c:Chunk) RETURN c.id AS id, c.content AS content")
         for record in result:
             chunk_id = record["id"]
@@ -100,32 +81,71 @@ def process_chunks_and_entities():
                     name=entity,
                     id=chunk_id
                 )
+                entity_index.add(entity, chunk_id)
+            entity_index.num_chunks += 1
             print(f"Linked entities: {entities}\n")
-    print("\n✅ Entity extraction and linking complete.")
+    entity_index.save(index_path)
+    print(f"\n✅ Entity extraction and linking complete. Entity index ({len(entity_index)} entities) saved to {index_path}.")
+
+def build_entity_index(index_path: str = ENTITY_INDEX_PATH):
+    """
+    Rebuild the local entity index from existing MENTIONED_IN links,
+    without re-running entity extraction.
+    """
+    entity_index = EntityIndex()
+    with get_neo4j_driver().session() as session:
+        entity_index.num_chunks = session.run("MATCH (c:Chunk) RETURN count(c) AS n").single()["n"]
+        rows = session.run("MATCH (e:Entity)-[:MENTIONED_IN]->(c:Chunk) RETURN e.name AS name, c.id AS id")
+        for r in rows:
+            entity_index.add(r["name"], r["id"])
+    entity_index.save(index_path)
+    print(f"\n✅ Entity index ({len(entity_index)} entities over {entity_index.num_chunks} chunks) saved to {index_path}.")
 
 # === PROCESS AND LINK SIMILARITY ===
 def process_similarity():
     SIMILARITY_THRESHOLD = 0.75 
     TOP_K = SIMILAR_K  
 
-    with driver.session() as session:
+    # Rows are quantized as they stream in, so with EMBEDDING_QUANT set the
+    # working set is the compact matrix rather than N lists of Python floats.
+    ids: List[str] = []
+    rows_q = []
+    scales_q = []
+    with get_neo4j_driver().session() as session:
         rows = session.run("MATCH (c:Chunk) RETURN c.id AS id, c.embedding AS emb")
-        data: List[Tuple[str, List[float]]] = []
         for r in rows:
-            data.append((r["id"], r["emb"]))
-
-    for id_a, emb_a in data:
-        sims = []
-        for id_b, emb_b in data:
-            if id_a == id_b:
+            if r["emb"] is None:
                 continue
-            score = cosine_similarity(emb_a, emb_b)
-            sims.append((id_b, score))
-
-        sims_sorted = sorted(sims, key=lambda x: x[1], reverse=True)
+            codes, scales = quantize_matrix([r["emb"]], EMBEDDING_QUANT)
+            ids.append(r["id"])
+            rows_q.append(codes[0])
+            if scales is not None:
+                scales_q.append(scales[0])
+
+    if not ids:
+        print("No chunks with embeddings found.")
+        return
+    matrix = np.stack(rows_q)
+    scales = np.asarray(scales_q, dtype=np.float32) if scales_q else None
+    norms = row_norms(matrix, scales)
+    del rows_q
+
+    for a, id_a in enumerate(ids):
+        query = dequantize_matrix(matrix[a], scales[a] if scales is not None else None)
+        scores = quantized_cosine(matrix, scales, norms, query)
+        scores[a] = -np.inf
+        sims_sorted = [(ids[b], float(scores[b])) for b in np.argsort(-scores)[:TOP_K]]
+        if EMBEDDING_QUANT != "none":
+            # The quantized scores only pick the neighbours; SIMILAR_TO.score is stored at full precision
+            full = fetch_full_embeddings([id_a] + [id_b for id_b, _ in sims_sorted])
+            sims_sorted = sorted(
+                ((id_b, cosine_similarity(full[id_a], full[id_b])) for id_b, _ in sims_sorted),
+                key=lambda x: x[1],
+                reverse=True
+            )
 
         links_added = 0
-        with driver.session() as sess:
+        with get_neo4j_driver().session() as sess:
             for id_b, score in sims_sorted:
                 if score < SIMILARITY_THRESHOLD:
                     # Skip low similarity links
@@ -148,19 +168,67 @@ def process_similarity():
 
     print("\nSimilarity linking complete.")
 
+# === PROCESS QUANTIZED EMBEDDINGS ===
+def process_quantization(mode: str = EMBEDDING_QUANT):
+    """
+    Backfill the compact `embedding_q` / `embedding_scale` properties on every
+    Chunk so retrieval can run with EMBEDDING_QUANT set. The full vector is kept
+    because the vector index needs it.
+    """
+    if mode == "none":
+        print("EMBEDDING_QUANT is 'none'; nothing to quantize.")
+        return
+    with get_neo4j_driver().session() as session:
+        rows = session.run("MATCH (c:Chunk) WHERE c.embedding IS NOT NULL RETURN c.id AS id, c.embedding AS emb")
+        data = [(r["id"], r["emb"]) for r in rows]
+    with get_neo4j_driver().session() as sess:
+        for chunk_id, emb in data:
+            blob, scale = quantize_embedding(emb, mode)
+            sess.run(
+                """
+                MATCH (c:Chunk {id: $id})
+                SET c.embedding_q = $blob, c.embedding_scale = $scale, c.embedding_quant = $mode
+                """,
+                id=chunk_id,
+                blob=blob,
+                scale=scale,
+                mode=mode
+            )
+    print(f"\n✅ Stored {mode} embeddings for {len(data)} chunks.")
+
 
 # === CLI ===
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Entity extraction and similarity linking for GraphRAG.")
     parser.add_argument("--entities", action="store_true", help="Extract and link entities to chunks.")
     parser.add_argument("--similar", action="store_true", help="Calculate and link top-K similar chunks.")
+    parser.add_argument("--entity-index", action="store_true", help="Rebuild the local entity index from MENTIONED_IN links.")
+    parser.add_argument("--snapshot", metavar="DIR", help="Export a memory-mapped graph snapshot to DIR.")
+    parser.add_argument("--quantize", choices=[m for m in QUANT_MODES if m != "none"], help="Store float16/int8 copies of chunk embeddings.")
+    parser.add_argument("--path-aggregates", action="store_true", help="With --snapshot, also materialize per-anchor top-M paths per hop depth.")
+    parser.add_argument("--top-m", type=int, default=PATH_AGG_TOP_M, help="Paths stored per anchor and depth for --path-aggregates.")
     args = parser.parse_args()
+    if args.path_aggregates and not args.snapshot:
+        parser.error("--path-aggregates requires --snapshot DIR")
+
+    # Validate OpenAI API key
+    if args.entities and not OPENAI_API_KEY:
+        print("Error: OPENAI_API_KEY must be set as an environment variable or in this file.")
+        sys.exit(1)
 
-    if not args.entities and not args.similar:
+    if not args.entities and not args.similar and not args.snapshot and not args.quantize and not args.entity_index:
         parser.print_help()
         sys.exit(0)
 
     if args.entities:
         process_chunks_and_entities()
+    elif args.entity_index:
+        build_entity_index()
+    if args.quantize:
+        process_quantization(args.quantize)
     if args.similar:
         process_similarity()
+    if args.snapshot:
+        export_graph_snapshot(get_neo4j_driver(), args.snapshot)
+        if args.path_aggregates:
+            write_path_aggregates(args.snapshot, SYSTEM_MAX_HOPS, args.top_m)
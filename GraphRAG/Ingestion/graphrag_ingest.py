@@ -1,111 +1,261 @@
 import os
 import sys
 from pathlib import Path
-from typing import List
-from neo4j import GraphDatabase
-from openai import OpenAI
-import numpy as np
-from PyPDF2 import PdfReader
+from typing import Iterable, Iterator, List, Optional
 from tqdm import tqdm
-sys.path.append(str(Path(__file__).resolve().parents[1]))
-from Secret import secret
-from beir.datasets.data_loader import GenericDataLoader
+# The query modules import each other by bare name; import them the same way
+sys.path.append(str(Path(__file__).resolve().parents[1] / "query"))
+from quantization import EMBEDDING_QUANT, quantize_embedding
+from config import get_neo4j_driver, get_openai_client, EMBEDDING_MODEL, EMBEDDING_DIM
 
-from Secret.secret import (
-    NEO4J_URI_secret,
-    NEO4J_USER_secret,
-    NEO4J_PASS_secret,
-    OPENAI_API_KEY_secret,
-    COHERE_API_KEY_secret
-)
+# === CHUNKING ===
+# Windows are sized in tokens of the embedding model's tokenizer, so no chunk
+# can exceed the model's input limit (8191 tokens for text-embedding-3-small).
+EMBEDDING_ENCODING = "cl100k_base"
+EMBEDDING_TOKEN_LIMIT = 8191
+# Defaults match the previous word-based windows (380 words, 80 overlap ≈ 500 / 100 tokens)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", 500))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 100))
+READ_BLOCK_CHARS = 64 * 1024
 
-NEO4J_URI = os.getenv("NEO4J_URI", NEO4J_URI_secret)
-NEO4J_USER = os.getenv("NEO4J_USER", NEO4J_USER_secret)
-NEO4J_PASS = os.getenv("NEO4J_PASS", NEO4J_PASS_secret)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", OPENAI_API_KEY_secret)
-COHERE_API_KEY = os.getenv("COHERE_API_KEY", COHERE_API_KEY_secret)
+_encoding = None
 
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
-client = OpenAI(api_key=OPENAI_API_KEY)
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+        _encoding = tiktoken.get_encoding(EMBEDDING_ENCODING)
+    return _encoding
 
-print("🧼 Temporary files deleted.")
+def iter_token_windows(
+    blocks: Iterable[str],
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[str]:
+    """
+    Turn a stream of text blocks (pages, file reads) into overlapping windows
+    of `chunk_tokens` tokens that advance by `chunk_tokens - overlap_tokens`.
+    Only the current block and one window of tokens are held in memory.
+    """
+    chunk_tokens = min(chunk_tokens, EMBEDDING_TOKEN_LIMIT)
+    if not 0 <= overlap_tokens < chunk_tokens:
+        raise ValueError("overlap_tokens must be >= 0 and smaller than chunk_tokens")
+    encoding = get_encoding()
+    stride = chunk_tokens - overlap_tokens
 
-def load_text_chunks(text: str, chunk_size: int = 380, overlap: int = 80) -> List[str]:
+    def window(tokens: List[int]) -> str:
+        # Token slices can split a multi-byte character; drop the partial bytes
+        return encoding.decode_bytes(tokens).decode("utf-8", errors="ignore").strip()
 
-    words = text.split()
-    stride = chunk_size - overlap
-    chunks = [" ".join(words[i:i+chunk_size]) for i in range(0, len(words), stride)]
-    return chunks
+    buffer: List[int] = []
+    carry = ""
+    emitted = False
+    for block in blocks:
+        text = carry + block
+        # Hold back the trailing partial word so no token straddles two blocks
+        cut = max(text.rfind(" "), text.rfind("\n"))
+        if cut == -1 and len(text) < READ_BLOCK_CHARS:
+            carry = text
+            continue
+        carry, text = (text[cut + 1:], text[:cut + 1]) if cut != -1 else ("", text)
+        buffer.extend(encoding.encode(text, disallowed_special=()))
+        while len(buffer) >= chunk_tokens:
+            yield window(buffer[:chunk_tokens])
+            emitted = True
+            del buffer[:stride]
+
+    if carry:
+        buffer.extend(encoding.encode(carry, disallowed_special=()))
+    # Flush: the first `overlap_tokens` of the buffer were already emitted
+    while len(buffer) > (overlap_tokens if emitted else 0):
+        chunk = window(buffer[:chunk_tokens])
+        if chunk:
+            yield chunk
+        emitted = True
+        if len(buffer) <= chunk_tokens:
+            break
+        del buffer[:stride]
+
+def iter_txt_blocks(path: Path, block_chars: int = READ_BLOCK_CHARS) -> Iterator[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            block = f.read(block_chars)
+            if not block:
+                break
+            yield block
+
+def iter_pdf_blocks(path: Path) -> Iterator[str]:
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(str(path))
+    for page in reader.pages:
+        yield (page.extract_text() or "") + "\n"
+
+def load_text_chunks(text: str, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
+
+    return list(iter_token_windows([text], chunk_tokens, overlap_tokens))
 
 def load_txt_chunks(path:Path) -> List[str]: 
 
-    with open(path, 'r', encoding='utf=8') as f:
-        text = f.read()
-        return load_text_chunks(text)
+    return list(iter_token_windows(iter_txt_blocks(path)))
     
 def load_pdf_chunks(path:Path) -> List[str]: 
 
-    reader = PdfReader(str(path)) 
-    text = "".join(page.extract_text() or "" for page in reader.pages)
-    return load_text_chunks(text)
-
-def load_chunks_from_file(file_path:str) -> List[str]: 
+    return list(iter_token_windows(iter_pdf_blocks(path)))
 
+def iter_chunks_from_file(file_path:str) -> Iterator[str]:
+    """
+    Stream chunks from a .txt, .md or .pdf file page by page / block by block.
+    """
     path = Path(file_path)
     if not path.exists():
         print(f"Error: File {file_path} does not exist.")
-        return []
+        return
 
     if path.suffix.lower() == '.pdf':
-        return load_pdf_chunks(path)
+        yield from iter_token_windows(iter_pdf_blocks(path))
     elif path.suffix.lower() in ['.txt', '.md']:
-        return load_txt_chunks(path)
+        yield from iter_token_windows(iter_txt_blocks(path))
     else:
         print(f"Error: Unsupported file type {path.suffix}. Only .txt, .md, and .pdf are supported.")
-        return []
+
+def load_chunks_from_file(file_path:str) -> List[str]: 
+
+    return list(iter_chunks_from_file(file_path))
     
 def generate_embeddings_for_chunks(chunks: List[str]) -> List[List[float]]:
     embeddings = []
     for chunk in tqdm(chunks, desc="Generating embeddings", unit="chunk"):
         try:
-            response = client.embeddings.create(
-                model='text-embedding-3-small',
+            response = get_openai_client().embeddings.create(
+                model=EMBEDDING_MODEL,
                 input= chunk
             )
             embedding = response.data[0].embedding
             embeddings.append(embedding)
         except Exception as e:
             print(f"Error generating embedding for chunk: {e}")
-            embeddings.append([0.0] * 1536)
+            embeddings.append([0.0] * EMBEDDING_DIM)
     return embeddings
 
-def ingest_chunks_to_neo4j(chunks: List[str], embeddings: List[List[float]], file_name: str):
-    with driver.session() as session:
+def store_quantized_embedding(session, chunk_id: str, embedding: List[float], mode: str):
+    """
+    Store a compact byte[] copy of the embedding next to the full vector,
+    which the vector index still needs for anchor search.
+    """
+    blob, scale = quantize_embedding(embedding, mode)
+    session.run(
+        """
+        MATCH (c:Chunk {id: $id})
+        SET c.embedding_q = $blob, c.embedding_scale = $scale, c.embedding_quant = $mode
+        """,
+        id=chunk_id,
+        blob=blob,
+        scale=scale,
+        mode=mode
+    )
+
+def ingest_chunks_to_neo4j(
+    chunks: List[str],
+    embeddings: List[List[float]],
+    file_name: str,
+    start_index: int = 0,
+    driver=None,
+    tenant: Optional[str] = None
+):
+    with (driver or get_neo4j_driver()).session() as session:
         print(f"Chunks: {len(chunks)}") 
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_index):
             chunk_id = f"{file_name}_chunk_{i}"
             session.run(
                 """
                 MERGE (c:Chunk {id: $id})
-                SET c.content = $content, c.embedding = $embedding
+                SET c.content = $content, c.embedding = $embedding, c.source = $source, c.tenant = $tenant
                 """,
                 id=chunk_id,
                 content=chunk,
-                embedding=embedding
+                embedding=embedding,
+                source=file_name,
+                tenant=tenant
             )
+            if EMBEDDING_QUANT != "none":
+                store_quantized_embedding(session, chunk_id, embedding, EMBEDDING_QUANT)
             print(f"Ingested {chunk_id}")
 
+def ingest_chunks_to_shard(
+    shard,
+    chunks: List[str],
+    embeddings: List[List[float]],
+    file_name: str,
+    start_index: int = 0,
+    tenant: Optional[str] = None
+):
+    """
+    Write a batch into the shard chosen for its document: a Neo4j shard through
+    its own driver, an in-memory stand-in directly.
+    """
+    if hasattr(shard, "add_chunks"):
+        shard.add_chunks(
+            (f"{file_name}_chunk_{i}", chunk, embedding)
+            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings), start=start_index)
+        )
+    elif hasattr(shard, "driver"):
+        ingest_chunks_to_neo4j(chunks, embeddings, file_name, start_index, driver=shard.driver, tenant=tenant)
+    else:
+        raise ValueError(f"Shard {shard.name!r} is read-only.")
+
+def ingest_file_streaming(
+    file_path: str,
+    file_name: str,
+    batch_size: int = 64,
+    tenant: Optional[str] = None,
+    router=None
+) -> int:
+    """
+    Chunk, embed and ingest a file in batches of `batch_size` chunks, so memory
+    stays constant in the size of the file. Returns the number of chunks ingested.
+
+    With shards configured (PPF_SHARDS, or an explicit `router`) the whole file
+    goes to the shard the router picks for its source and `tenant`.
+    """
+    if router is None:
+        from sharding import get_shard_router
+        router = get_shard_router()
+    shard = router.shard_for_source(file_name, tenant) if router is not None else None
+
+    def write(batch: List[str], start_index: int):
+        embeddings = generate_embeddings_for_chunks(batch)
+        if shard is not None:
+            ingest_chunks_to_shard(shard, batch, embeddings, file_name, start_index, tenant)
+        else:
+            ingest_chunks_to_neo4j(batch, embeddings, file_name, start_index, tenant=tenant)
+
+    batch: List[str] = []
+    ingested = 0
+    for chunk in iter_chunks_from_file(file_path):
+        batch.append(chunk)
+        if len(batch) >= batch_size:
+            write(batch, ingested)
+            ingested += len(batch)
+            batch = []
+    if batch:
+        write(batch, ingested)
+        ingested += len(batch)
+    if shard is not None:
+        print(f"Routed {file_name} to shard {shard.name}.")
+    return ingested
+
 
 if __name__ == "__main__":
     import sys
 
     if len(sys.argv) < 2:
-        print("Usage: python graphrag_ingest.py <file_path>")
+        print("Usage: python graphrag_ingest.py <file_path> [tenant]")
         sys.exit(1)
 
     file_path = sys.argv[1]
     file_name = Path(file_path).stem
+    tenant = sys.argv[2] if len(sys.argv) > 2 else None
 
-    chunks = list(load_chunks_from_file(file_path))
-    embeddings = generate_embeddings_for_chunks(chunks)
-    ingest_chunks_to_neo4j(chunks, embeddings, file_name)
\ No newline at end of file
+    total = ingest_file_streaming(file_path, file_name, tenant=tenant)
+    print(f"\n✅ Ingested {total} chunks from {file_path}.")
\ No newline at end of file
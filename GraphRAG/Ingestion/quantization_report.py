@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# ---------------------------------------
+# quantization_report.py
+# ---------------------------------------
+# Accuracy-vs-memory report for quantized chunk embeddings.
+# Run it against the BEIR scifact graph (ingested with
+# run_beir_to_neo4j.py) either live from Neo4j or from a
+# snapshot exported with `entity_linker.py --snapshot DIR`:
+#
+#   python quantization_report.py --snapshot ../snapshots/scifact --out report.md
+# ---------------------------------------
+
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+sys.path.append(str(Path(__file__).resolve().parents[1] / "query"))
+from config import get_neo4j_driver
+from quantization import QUANT_MODES, bytes_per_vector, quantize_matrix, dequantize_matrix, row_norms, quantized_cosine
+
+SIMILARITY_THRESHOLD = 0.75
+SIMILAR_K = int(os.getenv("SIMILAR_K", 7))
+
+
+def load_embeddings_from_snapshot(snapshot_dir: str) -> np.ndarray:
+    return np.load(Path(snapshot_dir) / "embeddings.npy")
+
+
+def load_embeddings_from_neo4j() -> np.ndarray:
+    with get_neo4j_driver().session() as session:
+        rows = session.run("MATCH (c:Chunk) WHERE c.embedding IS NOT NULL RETURN c.embedding AS emb ORDER BY c.id")
+        return np.asarray([r["emb"] for r in rows], dtype=np.float32)
+
+
+def _top_neighbours(codes, scales, norms, query_row: int, query, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    scores = quantized_cosine(codes, scales, norms, query)
+    scores[query_row] = -np.inf
+    top = np.argsort(-scores)[:k]
+    return top, scores[top]
+
+
+def _ppf_precision(q: np.ndarray, chain: np.ndarray) -> float:
+    averaged = (q + chain.mean(axis=0)) / 2
+    norm = float(np.linalg.norm(q) * np.linalg.norm(averaged))
+    return float(q @ averaged) / norm if norm else 0.0
+
+
+def evaluate_mode(
+    matrix: np.ndarray,
+    mode: str,
+    sample: np.ndarray,
+    chains: List[np.ndarray],
+    k: int
+) -> dict:
+    """Compare one quantization mode against the float32 baseline."""
+    full_norms = row_norms(matrix)
+    codes, scales = quantize_matrix(matrix, mode)
+    norms = row_norms(codes, scales)
+    dequantized = dequantize_matrix(codes, scales)
+
+    recalls, edge_agreement, cosine_err = [], [], []
+    for row in sample:
+        q = matrix[row]
+        exact, exact_scores = _top_neighbours(matrix, None, full_norms, row, q, k)
+        approx, approx_scores = _top_neighbours(codes, scales, norms, row, q, k)
+        recalls.append(len(set(exact) & set(approx)) / k)
+        cosine_err.append(float(np.abs(np.sort(exact_scores) - np.sort(approx_scores)).mean()))
+
+        # SIMILAR_TO edges as process_similarity would create them
+        exact_edges = {int(b) for b, s in zip(exact[:SIMILAR_K], exact_scores[:SIMILAR_K]) if s >= SIMILARITY_THRESHOLD}
+        approx_edges = {int(b) for b, s in zip(approx[:SIMILAR_K], approx_scores[:SIMILAR_K]) if s >= SIMILARITY_THRESHOLD}
+        union = exact_edges | approx_edges
+        edge_agreement.append(len(exact_edges & approx_edges) / len(union) if union else 1.0)
+
+    precision_err = []
+    for query_row, chain in zip(sample, chains):
+        q = matrix[query_row]
+        precision_err.append(abs(_ppf_precision(q, matrix[chain]) - _ppf_precision(q, dequantized[chain])))
+
+    return {
+        "mode": mode,
+        "bytes_per_vector": bytes_per_vector(mode, matrix.shape[1]),
+        "total_mib": bytes_per_vector(mode, matrix.shape[1]) * matrix.shape[0] / 2 ** 20,
+        "recall_at_k": float(np.mean(recalls)),
+        "cosine_abs_err": float(np.mean(cosine_err)),
+        "edge_jaccard": float(np.mean(edge_agreement)),
+        "ppf_precision_abs_err": float(np.mean(precision_err)),
+        "ppf_precision_max_err": float(np.max(precision_err)) if precision_err else 0.0,
+    }
+
+
+def build_report(matrix: np.ndarray, num_queries: int = 200, k: int = 10, hops: int = 3, seed: int = 42) -> str:
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    sample = rng.choice(n, size=min(num_queries, n), replace=False)
+    chains = [rng.choice(n, size=hops + 1) for _ in sample]
+
+    lines = [
+        f"# Quantized embedding report ({n} chunks, dim {matrix.shape[1]})",
+        "",
+        f"{len(sample)} sampled chunks as queries, recall@{k} against float32 neighbours, "
+        f"SIMILAR_TO agreement at top-{SIMILAR_K} / threshold {SIMILARITY_THRESHOLD}, "
+        f"PPF precision on random {hops}-hop chains.",
+        "",
+        "| mode | bytes/vector | total MiB | recall@k | cosine abs err | SIMILAR_TO Jaccard | PPF abs err (mean / max) |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for mode in QUANT_MODES:
+        r = evaluate_mode(matrix, mode, sample, chains, k)
+        lines.append(
+            f"| {r['mode']} | {r['bytes_per_vector']} | {r['total_mib']:.2f} | {r['recall_at_k']:.4f} | "
+            f"{r['cosine_abs_err']:.6f} | {r['edge_jaccard']:.4f} | "
+            f"{r['ppf_precision_abs_err']:.6f} / {r['ppf_precision_max_err']:.6f} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Accuracy-vs-memory report for quantized embeddings.")
+    parser.add_argument("--snapshot", metavar="DIR", help="Read embeddings from a graph snapshot instead of Neo4j.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of sampled query chunks.")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours compared for recall@k.")
+    parser.add_argument("--out", help="Write the markdown report to this file.")
+    args = parser.parse_args()
+
+    matrix = load_embeddings_from_snapshot(args.snapshot) if args.snapshot else load_embeddings_from_neo4j()
+    if matrix.size == 0:
+        print("No chunk embeddings found.")
+        sys.exit(1)
+
+    report = build_report(matrix, num_queries=args.queries, k=args.k)
+    print(report)
+    if args.out:
+        Path(args.out).write_text(report, encoding="utf-8")
+        print(f"✅ Report written to {args.out}")
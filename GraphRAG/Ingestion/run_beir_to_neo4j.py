@@ -1,38 +1,11 @@
-import os
 import sys
 from pathlib import Path
-from typing import List
-from neo4j import GraphDatabase
-from openai import OpenAI
-import numpy as np
-from PyPDF2 import PdfReader
-from tqdm import tqdm
 sys.path.append(str(Path(__file__).resolve().parents[1]))
-from Secret import secret
 from beir.beir.datasets.data_loader import GenericDataLoader
-from graphrag_ingest import (
-    load_chunks_from_file,
-    generate_embeddings_for_chunks,
-    ingest_chunks_to_neo4j
-)
+from graphrag_ingest import ingest_file_streaming
 
-from Secret.secret import (
-    NEO4J_URI_secret,
-    NEO4J_USER_secret,
-    NEO4J_PASS_secret,
-    OPENAI_API_KEY_secret,
-    COHERE_API_KEY_secret
-)
-
-NEO4J_URI = os.getenv("NEO4J_URI", NEO4J_URI_secret)
-NEO4J_USER = os.getenv("NEO4J_USER", NEO4J_USER_secret)
-NEO4J_PASS = os.getenv("NEO4J_PASS", NEO4J_PASS_secret)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", OPENAI_API_KEY_secret)
-COHERE_API_KEY = os.getenv("COHERE_API_KEY", COHERE_API_KEY_secret)
-driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# Step 1: Load BEIR dataset (Scifact is small and good for first run)
+# Step 1: Load BEIR dataset (Scifact is small and good for first run).
+# queries and qrels are not needed here; query/eval_beir.py replays them against the ingested graph.
 corpus, queries, qrels = GenericDataLoader("../datasets/scifact", corpus_file="corpus.jsonl", query_file="queries.jsonl", qrels_folder="qrels").load(split="test")
 
 # Step 2: Create a temporary folder for fake document files
@@ -48,10 +21,9 @@ for doc_id, doc in corpus.items():
     with open(file_path, "w", encoding="utf-8") as f:
         f.write(f"{doc['title']}\n{doc['text']}")
 
-    # Use your ingestion pipeline
-    chunks = load_chunks_from_file(str(file_path))  # -> List[str]
-    embeddings = generate_embeddings_for_chunks(chunks)  # -> List[List[float]]
-    ingest_chunks_to_neo4j(chunks, embeddings, file_name)
+    # Use your ingestion pipeline (chunk -> embed -> ingest, streamed in batches)
+    # With PPF_SHARDS set, each document is routed to one of the scifact tenant's shards
+    ingest_file_streaming(str(file_path), file_name, tenant="scifact")
 
 print("✅ All BEIR documents ingested into Neo4j.")
 
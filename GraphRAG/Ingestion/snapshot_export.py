@@ -0,0 +1,291 @@
+# ---------------------------------------
+# snapshot_export.py
+# ---------------------------------------
+# Writes a read-only, memory-mappable snapshot of the
+# Chunk / SIMILAR_TO graph so retrieval can run in-process
+# without a Neo4j round trip. Run after process_similarity.
+#
+# Layout of <out_dir>:
+#   manifest.json        counts, embedding dim, graph max hops, format version, snapshot id
+#   ids.json             chunk ids, index i -> Chunk.id
+#   indptr.npy           int64  [N + 1]  CSR row pointers
+#   indices.npy          int32  [E]      CSR neighbour indices
+#   scores.npy           float32[E]      SIMILAR_TO.score per edge
+#   embeddings.npy       float32[N, D]   chunk embeddings
+#   norms.npy            float32[N]      L2 norm of each embedding
+#   embeddings_q.npy     float16/int8 [N, D]  compact scoring copy (optional)
+#   embedding_scales.npy float32[N]      per-row int8 scales (int8 only)
+#   norms_q.npy          float32[N]      L2 norm of each dequantized row (optional)
+#   content_offsets.npy  int64  [N + 1]  byte offsets into content.bin
+#   content.bin          utf-8 chunk contents, concatenated
+#
+# Optional, written by write_path_aggregates into <out_dir>/paths:
+#   manifest.json        depth / M / quantization, and the snapshot it belongs to
+#   nodes_h{h}.npy       int32  [N, M, h + 1]  top-M paths of h hops per anchor (-1 padded)
+#   path_scores_h{h}.npy float32[N, M]         link-time path score (sum of edge scores)
+#   sums_h{h}.npy        float16/int8/float32 [N, M, D]  summed embeddings of each path
+#   sum_scales_h{h}.npy  float32[N, M]         per-row int8 scales (int8 only)
+#   sum_sqnorms_h{h}.npy float32[N, M]         squared L2 norm of each dequantized sum
+#
+# The sums dominate: N x M x D bytes per depth for int8 (x2 float16,
+# x4 float32), for each of the max_hops depths. At 100k chunks, M = 8 and
+# D = 1536 that is ~1.2 GB per depth in int8, ~4.9 GB in float32.
+# ---------------------------------------
+
+import heapq
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+sys.path.append(str(Path(__file__).resolve().parents[1] / "query"))
+from graph_snapshot import PATH_AGGREGATES_FORMAT_VERSION, SNAPSHOT_FORMAT_VERSION, graph_max_hops
+from quantization import EMBEDDING_QUANT, quantize_matrix, row_norms
+
+PATH_AGGREGATES_BLOCK = 128
+
+
+def write_graph_snapshot(
+    ids: List[str],
+    contents: List[str],
+    embeddings: List[List[float]],
+    edges: List[Tuple[str, str, float]],
+    out_dir: str,
+    embedding_quant: str = EMBEDDING_QUANT
+) -> Path:
+    """
+    Build the CSR arrays from plain Python data and write them to `out_dir`.
+    The snapshot is written to a temporary sibling directory first and swapped
+    in with a rename, so readers never see a half-written snapshot.
+    With `embedding_quant` set to float16 or int8 a compact copy of the
+    embeddings is written alongside the float32 matrix and used for scoring.
+    """
+    out_path = Path(out_dir)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    tmp_path.mkdir(parents=True)
+
+    index_of: Dict[str, int] = {chunk_id: i for i, chunk_id in enumerate(ids)}
+    num_nodes = len(ids)
+
+    # CSR adjacency, neighbours of each row sorted by descending score
+    rows: List[List[Tuple[int, float]]] = [[] for _ in range(num_nodes)]
+    for id_a, id_b, score in edges:
+        if id_a in index_of and id_b in index_of:
+            rows[index_of[id_a]].append((index_of[id_b], float(score or 0.0)))
+
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    for i, row in enumerate(rows):
+        row.sort(key=lambda x: x[1], reverse=True)
+        indptr[i + 1] = indptr[i] + len(row)
+    indices = np.fromiter((j for row in rows for j, _ in row), dtype=np.int32, count=int(indptr[-1]))
+    scores = np.fromiter((s for row in rows for _, s in row), dtype=np.float32, count=int(indptr[-1]))
+
+    emb_matrix = np.asarray(embeddings, dtype=np.float32).reshape(num_nodes, -1)
+    norms = np.linalg.norm(emb_matrix, axis=1).astype(np.float32)
+
+    encoded = [(c or "").encode("utf-8") for c in contents]
+    offsets = np.zeros(num_nodes + 1, dtype=np.int64)
+    for i, blob in enumerate(encoded):
+        offsets[i + 1] = offsets[i] + len(blob)
+
+    np.save(tmp_path / "indptr.npy", indptr)
+    np.save(tmp_path / "indices.npy", indices)
+    np.save(tmp_path / "scores.npy", scores)
+    np.save(tmp_path / "embeddings.npy", emb_matrix)
+    np.save(tmp_path / "norms.npy", norms)
+    if embedding_quant != "none":
+        codes, scales = quantize_matrix(emb_matrix, embedding_quant)
+        np.save(tmp_path / "embeddings_q.npy", codes)
+        if scales is not None:
+            np.save(tmp_path / "embedding_scales.npy", scales)
+        np.save(tmp_path / "norms_q.npy", row_norms(codes, scales))
+    np.save(tmp_path / "content_offsets.npy", offsets)
+    with open(tmp_path / "content.bin", "wb") as f:
+        for blob in encoded:
+            f.write(blob)
+    with open(tmp_path / "ids.json", "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+    with open(tmp_path / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            # Ties path aggregates to this export; timestamps can collide
+            "snapshot_id": uuid.uuid4().hex,
+            "num_nodes": num_nodes,
+            "num_edges": int(indptr[-1]),
+            "embedding_dim": int(emb_matrix.shape[1]) if num_nodes else 0,
+            "embedding_quant": embedding_quant,
+            # Read by the query side in place of the all-pairs shortestPath query on Neo4j
+            "graph_max_hops": graph_max_hops(indptr, indices),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f, indent=2)
+
+    if out_path.exists():
+        shutil.rmtree(out_path)
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def _beam_paths(
+    indptr: List[int],
+    indices: List[int],
+    scores: List[float],
+    anchor: int,
+    max_hops: int,
+    beam_width: int
+) -> List[List[Tuple[float, Tuple[int, ...]]]]:
+    """
+    Beam search from `anchor`, scoring a path by the sum of its SIMILAR_TO edge
+    scores. Returns the beam at each depth 1..max_hops as (score, nodes), best
+    first. Like the Cypher expansion, a path never reuses an edge.
+    """
+    beam = [(0.0, (anchor,), ())]
+    depths = []
+    for _ in range(max_hops):
+        candidates = [
+            (score + scores[pos], nodes + (indices[pos],), used + (pos,))
+            for score, nodes, used in beam
+            for pos in range(indptr[nodes[-1]], indptr[nodes[-1] + 1])
+            if pos not in used
+        ]
+        if not candidates:
+            break
+        beam = heapq.nlargest(beam_width, candidates, key=lambda c: c[0])
+        depths.append([(score, nodes) for score, nodes, _ in beam])
+    return depths
+
+
+def write_path_aggregates(
+    snapshot_dir: str,
+    max_hops: int,
+    top_m: int = 8,
+    beam_width: int = 0,
+    quant: Optional[str] = None
+) -> Path:
+    """
+    Materialize, for every chunk and every hop depth up to `max_hops`, its
+    `top_m` best paths by link-time score (sum of edge scores, found by beam
+    search of width `beam_width`, default 4 * top_m) together with the summed
+    embedding of each path. Query-time PPF precision of a stored path then
+    needs one dot product with the sum; see graph_snapshot.PathAggregates.
+    Paths holding the same chunks are stored once. Written to
+    <snapshot_dir>/paths, tagged with the snapshot it was computed from.
+    Sums are stored in `quant` mode, by default the snapshot's own embedding
+    quantization; see the layout above for their size.
+    """
+    path = Path(snapshot_dir)
+    with open(path / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    quant = quant or manifest.get("embedding_quant", "none")
+    indptr = np.load(path / "indptr.npy").tolist()
+    indices = np.load(path / "indices.npy").tolist()
+    scores = np.load(path / "scores.npy").astype(float).tolist()
+    embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+    num_nodes, dim = embeddings.shape
+    beam_width = beam_width or 4 * top_m
+
+    tmp_path = path / "paths.tmp"
+    if tmp_path.exists():
+        shutil.rmtree(tmp_path)
+    tmp_path.mkdir()
+
+    sums_dtype = quantize_matrix(np.zeros((1, dim), dtype=np.float32), quant)[0].dtype
+    out = {}
+    for h in range(1, max_hops + 1):
+        out[h] = {
+            "nodes": np.lib.format.open_memmap(tmp_path / f"nodes_h{h}.npy", mode="w+", dtype=np.int32, shape=(num_nodes, top_m, h + 1)),
+            "scores": np.lib.format.open_memmap(tmp_path / f"path_scores_h{h}.npy", mode="w+", dtype=np.float32, shape=(num_nodes, top_m)),
+            "sums": np.lib.format.open_memmap(tmp_path / f"sums_h{h}.npy", mode="w+", dtype=sums_dtype, shape=(num_nodes, top_m, dim)),
+            "sqnorms": np.lib.format.open_memmap(tmp_path / f"sum_sqnorms_h{h}.npy", mode="w+", dtype=np.float32, shape=(num_nodes, top_m)),
+        }
+        if quant == "int8":
+            out[h]["scales"] = np.lib.format.open_memmap(tmp_path / f"sum_scales_h{h}.npy", mode="w+", dtype=np.float32, shape=(num_nodes, top_m))
+        out[h]["nodes"][:] = -1
+
+    stored = 0
+    for start in range(0, num_nodes, PATH_AGGREGATES_BLOCK):
+        end = min(start + PATH_AGGREGATES_BLOCK, num_nodes)
+        block_sums = {h: np.zeros((end - start, top_m, dim), dtype=np.float32) for h in out}
+        for anchor in range(start, end):
+            for h, beam in enumerate(_beam_paths(indptr, indices, scores, anchor, max_hops, beam_width), start=1):
+                kept, seen = [], set()
+                for score, nodes in beam:
+                    key = tuple(sorted(nodes))
+                    if key not in seen:
+                        seen.add(key)
+                        kept.append((score, nodes))
+                    if len(kept) == top_m:
+                        break
+                for m, (score, nodes) in enumerate(kept):
+                    out[h]["nodes"][anchor, m] = nodes
+                    out[h]["scores"][anchor, m] = score
+                    block_sums[h][anchor - start, m] = embeddings[list(nodes)].sum(axis=0)
+                stored += len(kept)
+        for h, sums in block_sums.items():
+            codes, scales = quantize_matrix(sums.reshape(-1, dim), quant)
+            out[h]["sums"][start:end] = codes.reshape(sums.shape)
+            if scales is not None:
+                out[h]["scales"][start:end] = scales.reshape(sums.shape[:2])
+            out[h]["sqnorms"][start:end] = (row_norms(codes, scales) ** 2).reshape(sums.shape[:2])
+
+    for arrays in out.values():
+        for array in arrays.values():
+            array.flush()
+    del out
+    with open(tmp_path / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "format_version": PATH_AGGREGATES_FORMAT_VERSION,
+            "snapshot_id": manifest.get("snapshot_id"),
+            "num_nodes": num_nodes,
+            "num_edges": manifest.get("num_edges"),
+            "max_hops": max_hops,
+            "top_m": top_m,
+            "beam_width": beam_width,
+            "quant": quant,
+            "path_score": "sum of SIMILAR_TO scores",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }, f, indent=2)
+
+    final_path = path / "paths"
+    if final_path.exists():
+        shutil.rmtree(final_path)
+    os.replace(tmp_path, final_path)
+    print(f"\n✅ Path aggregates written to {final_path} ({stored} paths, depths 1-{max_hops}, top {top_m}, {quant}).")
+    return final_path
+
+
+def export_graph_snapshot(driver, out_dir: str) -> Path:
+    """
+    Read every Chunk and SIMILAR_TO edge from Neo4j and write a snapshot to `out_dir`.
+    """
+    ids: List[str] = []
+    contents: List[str] = []
+    embeddings: List[List[float]] = []
+    edges: List[Tuple[str, str, float]] = []
+
+    with driver.session() as session:
+        rows = session.run(
+            "MATCH (c:Chunk) WHERE c.embedding IS NOT NULL "
+            "RETURN c.id AS id, c.content AS content, c.embedding AS emb ORDER BY c.id"
+        )
+        for r in rows:
+            ids.append(r["id"])
+            contents.append(r["content"])
+            embeddings.append(r["emb"])
+
+        rows = session.run(
+            "MATCH (a:Chunk)-[r:SIMILAR_TO]->(b:Chunk) "
+            "RETURN a.id AS id_a, b.id AS id_b, r.score AS score"
+        )
+        for r in rows:
+            edges.append((r["id_a"], r["id_b"], r["score"]))
+
+    out_path = write_graph_snapshot(ids, contents, embeddings, edges, out_dir)
+    print(f"\n✅ Graph snapshot written to {out_path} ({len(ids)} chunks, {len(edges)} SIMILAR_TO edges).")
+    return out_path
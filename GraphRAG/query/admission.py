@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from config import SYSTEM_MAX_HOPS, TOP_K
+
+# Load-aware retrieval budget: when the p95 latency of SLO_STAGE over recent
+# queries exceeds the SLO, or too many queries are in flight, new queries get a
+# smaller budget (fewer hops, fewer anchors, fewer expanded paths).
+SLO_P95_MS = float(os.getenv("PPF_SLO_P95_MS", 3000))
+SLO_STAGE = os.getenv("PPF_SLO_STAGE", "total")
+ADMISSION_WINDOW = int(os.getenv("PPF_ADMISSION_WINDOW", 100))
+ADMISSION_QUEUE_LIMIT = int(os.getenv("PPF_ADMISSION_QUEUE_LIMIT", 16))
+# Print a warning on every budget level change (they are always kept in `transitions`)
+ADMISSION_VERBOSE = os.getenv("PPF_ADMISSION_VERBOSE", "1") == "1"
+
+
+class Budget(NamedTuple):
+    level: int
+    max_hops: int
+    anchors: int
+    path_budget: Optional[int]  # max paths expanded per query (per shard when sharded); None = unbounded
+
+
+DEFAULT_LADDER = [
+    Budget(0, SYSTEM_MAX_HOPS, TOP_K, None),
+    Budget(1, 3, TOP_K, 5000),
+    Budget(2, 2, max(1, TOP_K - 1), 1000),
+    Budget(3, 1, max(1, TOP_K - 2), 200),
+]
+
+
+class Ticket:
+    """One admitted query: the budget it runs under and why."""
+
+    def __init__(self, budget: Budget, reason: Optional[str], in_flight: int, admitted_at: float, generation: int):
+        self.budget = budget
+        self.reason = reason
+        self.in_flight = in_flight
+        self.admitted_at = admitted_at
+        self.generation = generation
+        self.requested_hops: Optional[int] = None
+        self.granted_hops: Optional[int] = None
+
+    def cap_hops(self, hops: int) -> int:
+        """Hops actually used for a predicted hop count under this budget."""
+        self.requested_hops = hops
+        self.granted_hops = min(hops, self.budget.max_hops)
+        return self.granted_hops
+
+    @property
+    def degraded(self) -> bool:
+        return self.budget.level > 0 or (self.granted_hops or 0) < (self.requested_hops or 0)
+
+
+class AdmissionController:
+    """
+    Turns recent latencies and queue depth into a retrieval budget.
+
+    The budget level moves one step along `ladder` at a time: up when the p95
+    of `slo_stage` over the samples seen since the last change exceeds
+    `slo_p95_ms`, down when it falls under `restore_ratio` of the SLO with the
+    queue below `queue_limit`. Only queries admitted since the last change
+    count, so each level is judged on its own latencies: `cooldown` of them
+    before stepping up, `restore_after` (more, since the fast ones finish
+    first) before stepping back down. A query admitted
+    while more than `queue_limit` are in flight gets one extra level on top.
+
+    Level changes are kept in `transitions` (and printed if `verbose`), every
+    query that ran degraded in `degradations`. Failed queries count towards
+    the SLO with the time they took, so errors and timeouts raise the level too.
+    """
+
+    def __init__(
+        self,
+        slo_p95_ms: float = SLO_P95_MS,
+        slo_stage: str = SLO_STAGE,
+        window: int = ADMISSION_WINDOW,
+        queue_limit: int = ADMISSION_QUEUE_LIMIT,
+        ladder: List[Budget] = DEFAULT_LADDER,
+        restore_ratio: float = 0.7,
+        cooldown: int = 20,
+        restore_after: int = 60,
+        clock: Callable[[], float] = time.time,
+        verbose: bool = ADMISSION_VERBOSE
+    ):
+        self.slo_p95_ms = slo_p95_ms
+        self.slo_stage = slo_stage
+        self.window = window
+        self.queue_limit = queue_limit
+        self.ladder = ladder
+        self.restore_ratio = restore_ratio
+        self.cooldown = cooldown
+        self.restore_after = restore_after
+        self.clock = clock
+        self.verbose = verbose
+
+        self.level = 0
+        self.generation = 0
+        self.reason: Optional[str] = None
+        self.in_flight = 0
+        self.stage_ms: Dict[str, deque] = {}
+        self.since_change: deque = deque(maxlen=max(window, restore_after))
+        self.transitions: List[dict] = []
+        self.degradations: deque = deque(maxlen=10000)
+        self.admitted = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def admit(self) -> Ticket:
+        with self._lock:
+            self.in_flight += 1
+            self.admitted += 1
+            level, reason = self.level, self.reason
+            if self.in_flight > self.queue_limit and level < len(self.ladder) - 1:
+                level += 1
+                reason = f"queue depth {self.in_flight} > {self.queue_limit}" + (f"; {reason}" if reason else "")
+            return Ticket(self.ladder[level], reason, self.in_flight, self.clock(), self.generation)
+
+    def complete(self, ticket: Ticket, timings: Dict[str, float], failed: bool = False):
+        """
+        Record a finished query; `timings` are stage durations in seconds. For a
+        failed query they should include the time spent under the SLO stage.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.failed += failed
+            for stage, seconds in timings.items():
+                self.stage_ms.setdefault(stage, deque(maxlen=self.window)).append(seconds * 1000)
+            if self.slo_stage in timings and ticket.generation == self.generation:
+                self.since_change.append(timings[self.slo_stage] * 1000)
+            if ticket.degraded:
+                self.degradations.append({
+                    "at": ticket.admitted_at,
+                    "level": ticket.budget.level,
+                    "reason": ticket.reason,
+                    "in_flight": ticket.in_flight,
+                    "requested_hops": ticket.requested_hops,
+                    "granted_hops": ticket.granted_hops,
+                    "anchors": ticket.budget.anchors,
+                    "path_budget": ticket.budget.path_budget,
+                    "latency_ms": timings.get(self.slo_stage, 0.0) * 1000,
+                    "failed": failed,
+                })
+            self._adjust()
+
+    def _adjust(self):
+        if len(self.since_change) < self.cooldown:
+            return
+        p95 = float(np.percentile(self.since_change, 95))
+        if p95 > self.slo_p95_ms and self.level < len(self.ladder) - 1:
+            self._move(self.level + 1, f"{self.slo_stage} p95 {p95:.0f}ms > SLO {self.slo_p95_ms:.0f}ms", p95)
+        elif (
+            self.level > 0
+            and len(self.since_change) >= self.restore_after
+            and p95 < self.slo_p95_ms * self.restore_ratio
+            and self.in_flight <= self.queue_limit
+        ):
+            self._move(self.level - 1, f"{self.slo_stage} p95 {p95:.0f}ms < {self.restore_ratio:.0%} of SLO", p95)
+
+    def _move(self, level: int, reason: str, p95: float):
+        self.transitions.append({
+            "at": self.clock(),
+            "from": self.level,
+            "to": level,
+            "p95_ms": p95,
+            "in_flight": self.in_flight,
+            "reason": reason,
+        })
+        if self.verbose:
+            print(f"⚠️ Retrieval budget level {self.level} -> {level}: {reason}")
+        self.level = level
+        self.generation += 1
+        self.reason = reason if level > 0 else None
+        self.since_change.clear()
+
+    def p95_ms(self, stage: Optional[str] = None) -> Optional[float]:
+        samples = self.stage_ms.get(stage or self.slo_stage)
+        return float(np.percentile(samples, 95)) if samples else None
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "level": self.level,
+                "in_flight": self.in_flight,
+                "admitted": self.admitted,
+                "failed": self.failed,
+                "degraded": len(self.degradations),
+                "transitions": len(self.transitions),
+                **{f"{stage}_p95_ms": self.p95_ms(stage) for stage in self.stage_ms},
+            }
+
+
+@lru_cache(maxsize=None)
+def get_admission_controller() -> AdmissionController:
+    """The process-wide controller shared by all queries."""
+    return AdmissionController()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# ---------------------------------------
+# bench_admission.py
+# ---------------------------------------
+# Simulated load generator for the admission controller.
+# Queries arrive as a Poisson stream with a burst of mostly
+# broad questions in the middle; each one's latency follows a
+# simple cost model (fixed overhead plus a per-path expansion
+# cost, inflated by the number of queries in flight). The run
+# is replayed in simulated time without and with admission
+# control and the latency / degradation figures compared:
+#
+#   python bench_admission.py
+#   python bench_admission.py --slo-ms 2500 --burst-qps 15 --verbose
+# ---------------------------------------
+
+import argparse
+import heapq
+import random
+from typing import List, Optional
+
+import numpy as np
+
+from admission import DEFAULT_LADDER, AdmissionController
+from compute_max_hops import compute_hops
+from config import SIMILAR_K, SYSTEM_MAX_HOPS
+
+
+def service_ms(args, hops: int, anchors: int, path_budget: Optional[int], in_flight: int) -> float:
+    """Cost model: fixed overhead + per-path cost of an anchors x SIMILAR_K^hops expansion, times contention."""
+    paths = anchors * SIMILAR_K ** hops
+    if path_budget is not None:
+        paths = min(paths, path_budget)
+    return (args.base_ms + args.path_ms * paths) * (1.0 + in_flight / args.capacity)
+
+
+def simulate(args, controller: AdmissionController) -> List[dict]:
+    """Replay one arrival stream (same seed every call) through `controller`, in simulated time."""
+    rng = random.Random(args.seed)
+    now = 0.0
+    controller.clock = lambda: now
+
+    events = []
+    t, seq = 0.0, 0
+    while t < args.duration:
+        in_burst = args.burst_start <= t < args.burst_start + args.burst_len
+        t += rng.expovariate(args.burst_qps if in_burst else args.qps)
+        broad = rng.random() < (args.burst_broad if in_burst else args.broad)
+        score = rng.uniform(0.7, 1.0) if broad else rng.uniform(0.0, 0.5)
+        heapq.heappush(events, (t, seq, "arrive", {"score": score, "burst": in_burst}))
+        seq += 1
+
+    queries = []
+    while events:
+        now, _, kind, query = heapq.heappop(events)
+        if kind == "arrive":
+            ticket = controller.admit()
+            hops = ticket.cap_hops(compute_hops(query["score"], graph_max=SYSTEM_MAX_HOPS))
+            latency = service_ms(args, hops, ticket.budget.anchors, ticket.budget.path_budget, controller.in_flight)
+            query.update(ticket=ticket, hops=hops, latency_ms=latency)
+            heapq.heappush(events, (now + latency / 1000, seq, "done", query))
+            seq += 1
+        else:
+            controller.complete(query["ticket"], {"total": query["latency_ms"] / 1000})
+            queries.append(query)
+    return queries
+
+
+def p95(values: List[float]) -> float:
+    return float(np.percentile(values, 95)) if values else 0.0
+
+
+def report(name: str, queries: List[dict], controller: AdmissionController, slo_ms: float) -> dict:
+    latencies = [q["latency_ms"] for q in queries]
+    burst = [q["latency_ms"] for q in queries if q["burst"]]
+    return {
+        "run": name,
+        "queries": len(queries),
+        "p95_ms": p95(latencies),
+        "burst_p95_ms": p95(burst),
+        "over_slo": sum(latency > slo_ms for latency in latencies) / max(1, len(latencies)),
+        "degraded": len(controller.degradations) / max(1, len(queries)),
+        "mean_hops": sum(q["hops"] for q in queries) / max(1, len(queries)),
+        "transitions": len(controller.transitions),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulated load test of the admission controller.")
+    parser.add_argument("--duration", type=float, default=300.0, help="Seconds of arrivals.")
+    parser.add_argument("--qps", type=float, default=2.0, help="Base arrival rate.")
+    parser.add_argument("--broad", type=float, default=0.2, help="Share of broad queries outside the burst.")
+    parser.add_argument("--burst-start", type=float, default=100.0)
+    parser.add_argument("--burst-len", type=float, default=60.0)
+    parser.add_argument("--burst-qps", type=float, default=10.0)
+    parser.add_argument("--burst-broad", type=float, default=0.8, help="Share of broad queries in the burst.")
+    parser.add_argument("--base-ms", type=float, default=400.0, help="Per-query overhead (embed, rerank, LLM).")
+    parser.add_argument("--path-ms", type=float, default=0.01, help="Cost per expanded path.")
+    parser.add_argument("--capacity", type=float, default=8.0, help="In-flight queries that double latency.")
+    parser.add_argument("--slo-ms", type=float, default=3000.0, help="p95 latency SLO.")
+    parser.add_argument("--queue-limit", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="Print every budget level change.")
+    args = parser.parse_args()
+
+    runs = []
+    for name, ladder in (("uncontrolled", DEFAULT_LADDER[:1]), ("admission", DEFAULT_LADDER)):
+        controller = AdmissionController(
+            slo_p95_ms=args.slo_ms, slo_stage="total", queue_limit=args.queue_limit, ladder=ladder, verbose=False
+        )
+        queries = simulate(args, controller)
+        runs.append(report(name, queries, controller, args.slo_ms))
+        if args.verbose:
+            for change in controller.transitions:
+                print(f"t={change['at']:7.1f}s level {change['from']} -> {change['to']} "
+                      f"(in flight {change['in_flight']}): {change['reason']}")
+
+    print("| run | queries | p95 ms | burst p95 ms | over SLO | degraded | mean hops | level changes |")
+    print("|---|---|---|---|---|---|---|---|")
+    for run in runs:
+        print(f"| {run['run']} | {run['queries']} | {run['p95_ms']:.0f} | {run['burst_p95_ms']:.0f} | "
+              f"{run['over_slo']:.1%} | {run['degraded']:.1%} | {run['mean_hops']:.2f} | {run['transitions']} |")
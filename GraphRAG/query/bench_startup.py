@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# ---------------------------------------
+# bench_startup.py
+# ---------------------------------------
+# Startup-time benchmark for the query side: import time of
+# each module in a fresh interpreter, and the one-off cost of
+# the first real use of each lazily created client/model:
+#
+#   python bench_startup.py --repeats 5
+#   python bench_startup.py --question "What causes scurvy?"
+# ---------------------------------------
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+QUERY_DIR = Path(__file__).resolve().parent
+INGESTION_DIR = QUERY_DIR.parent / "Ingestion"
+ROOT = QUERY_DIR.parent.parent
+
+MODULES = [
+    "config", "top_k", "precision_expander", "rerank_cohere", "generate_answer", "cosine_similarity",
+    "embedding_query", "compute_max_hops", "GraphRag_retrieval_controller.predict_controller",
+    "orchestrator", "main", "graphrag_ingest",
+]
+
+IMPORT_SNIPPET = (
+    "import sys, time; sys.path[:0] = [{query!r}, {ingestion!r}, {root!r}]; "
+    "start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+)
+
+
+def time_import(module: str) -> float:
+    """Import `module` in a fresh interpreter and return the import time in seconds."""
+    code = IMPORT_SNIPPET.format(query=str(QUERY_DIR), ingestion=str(INGESTION_DIR), root=str(ROOT), module=module)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=QUERY_DIR)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr else f"import {module} failed")
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def time_first_use() -> dict:
+    """Cost of the first call to each lazy initializer, in this process."""
+    sys.path[:0] = [str(QUERY_DIR), str(ROOT)]
+    from config import get_openai_client, get_cohere_client, get_neo4j_driver
+    from GraphRag_retrieval_controller.predict_controller import load_models
+
+    timings = {}
+    for name, init in [
+        ("openai client", get_openai_client),
+        ("cohere client", get_cohere_client),
+        ("neo4j driver", lambda: get_neo4j_driver().verify_connectivity()),
+        ("controller models", load_models),
+    ]:
+        start = time.perf_counter()
+        try:
+            init()
+            timings[name] = time.perf_counter() - start
+        except Exception as e:
+            print(f"⚠️ {name} unavailable: {e}")
+    return timings
+
+
+def time_first_query(question: str) -> dict:
+    from orchestrator import answer_question
+
+    start = time.perf_counter()
+    _, stages = answer_question(question)
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    answer_question(question)
+    return {"first query": first, "second query": time.perf_counter() - start, **{f"  {k}": v for k, v in stages.items()}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure import time and first-use latency.")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh-interpreter imports per module.")
+    parser.add_argument("--question", help="Also time a first and second end-to-end query.")
+    args = parser.parse_args()
+
+    print("| module | import ms (median) | min | max |")
+    print("|---|---|---|---|")
+    for module in MODULES:
+        try:
+            samples = [time_import(module) * 1000 for _ in range(args.repeats)]
+        except RuntimeError as e:
+            print(f"| {module} | failed: {e} | | |")
+            continue
+        print(f"| {module} | {statistics.median(samples):.1f} | {min(samples):.1f} | {max(samples):.1f} |")
+
+    print("\n| first use | ms |")
+    print("|---|---|")
+    for name, seconds in time_first_use().items():
+        print(f"| {name} | {seconds * 1000:.1f} |")
+
+    if args.question:
+        print("\n| query | ms |")
+        print("|---|---|")
+        for name, seconds in time_first_query(args.question).items():
+            if isinstance(seconds, float):
+                print(f"| {name} | {seconds * 1000:.1f} |")
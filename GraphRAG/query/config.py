@@ -0,0 +1,76 @@
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+# Settings come from the environment, falling back to GraphRAG/Secret/secret.py.
+# Clients are built on first use, and the neo4j / openai / cohere packages are
+# only imported then, so importing a module that merely might need one is cheap.
+# A client whose settings are missing from both fails on first use, naming them.
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+try:
+    from Secret import secret as _secret
+except ImportError:
+    _secret = None
+
+
+def _setting(name: str, secret_name: str, default=None):
+    return os.getenv(name, getattr(_secret, secret_name, default))
+
+
+def _require(**settings):
+    missing = [name for name, value in settings.items() if not value]
+    if missing:
+        raise RuntimeError(
+            f"Missing setting(s) {', '.join(missing)}: set the environment variable(s) "
+            f"or define {', '.join(f'{name}_secret' for name in missing)} in GraphRAG/Secret/secret.py"
+        )
+
+
+NEO4J_URI = _setting("NEO4J_URI", "NEO4J_URI_secret")
+NEO4J_USER = _setting("NEO4J_USER", "NEO4J_USER_secret")
+NEO4J_PASS = _setting("NEO4J_PASS", "NEO4J_PASS_secret")
+OPENAI_API_KEY = _setting("OPENAI_API_KEY", "OPENAI_API_KEY_secret")
+COHERE_API_KEY = _setting("COHERE_API_KEY", "COHERE_API_KEY_secret")
+MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
+SIMILAR_K = int(os.getenv("SIMILAR_K", 3))
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+SYSTEM_MAX_HOPS = 10
+TOP_K = 5
+
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    _require(OPENAI_API_KEY=OPENAI_API_KEY)
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+
+@lru_cache(maxsize=None)
+def get_cohere_client():
+    _require(COHERE_API_KEY=COHERE_API_KEY)
+    import cohere
+    return cohere.Client(COHERE_API_KEY)
+
+
+@lru_cache(maxsize=None)
+def get_neo4j_driver():
+    """One pooled driver per process, shared by every query."""
+    _require(NEO4J_URI=NEO4J_URI, NEO4J_USER=NEO4J_USER, NEO4J_PASS=NEO4J_PASS)
+    from neo4j import GraphDatabase
+    return GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
+
+
+def reset_clients():
+    """
+    Drop cached clients. Runs automatically in forked children, which must not
+    reuse the parent's sockets or connection pool.
+    """
+    get_openai_client.cache_clear()
+    get_cohere_client.cache_clear()
+    get_neo4j_driver.cache_clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_clients)
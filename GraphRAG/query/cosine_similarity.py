@@ -1,33 +1,6 @@
-import os
-import sys
-from neo4j import GraphDatabase
-from typing import List, Tuple
-from openai import OpenAI
+from typing import List
 import math
-import cohere
-import joblib
-from pathlib import Path
 
-from Secret.secret import (
-    NEO4J_URI_secret,
-    NEO4J_USER_secret,
-    NEO4J_PASS_secret,
-    OPENAI_API_KEY_secret,
-    COHERE_API_KEY_secret
-)
-
-NEO4J_URI = os.getenv("NEO4J_URI", NEO4J_URI_secret)
-NEO4J_USER = os.getenv("NEO4J_USER", NEO4J_USER_secret)
-NEO4J_PASS = os.getenv("NEO4J_PASS", NEO4J_PASS_secret)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", OPENAI_API_KEY_secret)
-COHERE_API_KEY = os.getenv("COHERE_API_KEY", COHERE_API_KEY_secret)
-MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
-SIMILAR_K = int(os.getenv("SIMILAR_K", 3))
-client = OpenAI(api_key=OPENAI_API_KEY)
-cohere_client = cohere.Client(COHERE_API_KEY)
-EMBEDDING_DIM = 1536
-SYSTEM_MAX_HOPS = 10
-TOP_K = 5 
 
 def cosine_similarity(a: List[float], b: List[float]) -> float:
     dot = sum(x * y for x, y in zip(a, b))
@@ -0,0 +1,96 @@
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+ENTITY_INDEX_PATH = os.getenv(
+    "PPF_ENTITY_INDEX",
+    str(Path(__file__).resolve().parents[1] / "entity_index.json")
+)
+# Entities mentioned in more than this fraction of chunks are too common to narrow anything
+ENTITY_MAX_DF = float(os.getenv("PPF_ENTITY_MAX_DF", 0.2))
+MAX_ENTITY_TOKENS = 6
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_entity(name: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so question n-grams match entity names."""
+    return _SPACES.sub(" ", _NON_WORD.sub(" ", name.lower())).strip()
+
+
+class EntityIndex:
+    """
+    Inverted index from normalized entity name to the ids of the chunks that
+    mention it, mirroring the (:Entity)-[:MENTIONED_IN]->(:Chunk) links. Built
+    at link time by entity_linker.py and persisted as JSON.
+    """
+
+    def __init__(self, postings: Optional[Dict[str, List[str]]] = None, num_chunks: int = 0):
+        self.postings: Dict[str, Set[str]] = {name: set(ids) for name, ids in (postings or {}).items()}
+        self.num_chunks = num_chunks
+        self._max_tokens = max((len(name.split()) for name in self.postings), default=0)
+
+    def __len__(self) -> int:
+        return len(self.postings)
+
+    def add(self, entity: str, chunk_id: str):
+        name = normalize_entity(entity)
+        if not name:
+            return
+        self.postings.setdefault(name, set()).add(chunk_id)
+        self._max_tokens = max(self._max_tokens, len(name.split()))
+
+    def save(self, path: str = ENTITY_INDEX_PATH):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "num_chunks": self.num_chunks,
+                "postings": {name: sorted(ids) for name, ids in sorted(self.postings.items())},
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = ENTITY_INDEX_PATH) -> "EntityIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("postings", {}), data.get("num_chunks", 0))
+
+    def match(self, question: str, max_df: float = ENTITY_MAX_DF) -> Dict[str, Set[str]]:
+        """
+        Entities whose normalized name appears as a word n-gram of the question,
+        skipping entities mentioned in more than `max_df` of all chunks.
+        """
+        tokens = normalize_entity(question).split()
+        df_limit = max_df * self.num_chunks if self.num_chunks else None
+        matches: Dict[str, Set[str]] = {}
+        for n in range(1, min(self._max_tokens, MAX_ENTITY_TOKENS) + 1):
+            for i in range(len(tokens) - n + 1):
+                name = " ".join(tokens[i:i + n])
+                ids = self.postings.get(name)
+                if ids and (df_limit is None or len(ids) <= df_limit):
+                    matches[name] = ids
+        return matches
+
+    def candidate_chunks(self, question: str, max_df: float = ENTITY_MAX_DF) -> Optional[Set[str]]:
+        """
+        Union of chunk ids sharing an entity with the question, or None when no
+        entity matches (callers should then search unrestricted).
+        """
+        matches = self.match(question, max_df)
+        if not matches:
+            return None
+        return set().union(*matches.values())
+
+
+_entity_index: Optional[EntityIndex] = None
+
+
+def get_entity_index(path: str = ENTITY_INDEX_PATH) -> Optional[EntityIndex]:
+    """Process-wide index, loaded on first use; None if it has not been built."""
+    global _entity_index
+    if _entity_index is None and Path(path).exists():
+        _entity_index = EntityIndex.load(path)
+    return _entity_index
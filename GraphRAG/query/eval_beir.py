@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# ---------------------------------------
+# eval_beir.py
+# ---------------------------------------
+# Replays BEIR queries through the PPF pipeline at a given
+# concurrency and reports retrieval quality (nDCG@k, recall@k
+# against qrels) together with per-stage latency, throughput
+# and prompt tokens sent to the LLM.
+#
+# Against the live stack (graph ingested with run_beir_to_neo4j.py):
+#   python eval_beir.py --dataset ../datasets/scifact --concurrency 8 --out runs/live.json
+#
+# Offline, with deterministic fake embedding / rerank / chat
+# providers and an in-memory graph built from the corpus:
+#   python eval_beir.py --dataset ../datasets/scifact --offline --out runs/offline.json
+#   python eval_beir.py --synthetic 500 --offline --compare runs/offline.json
+#
+# With --compare the run is diffed against a previous run file
+# and the exit code is 1 if speed or quality regressed beyond
+# the tolerances.
+# ---------------------------------------
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import re
+import statistics
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import orchestrator
+from generate_answer import build_prompt
+from rerank_cohere import rerank_chunks_with_cohere
+from sharding import InMemoryShard, ShardRouter
+
+STAGES = ["embed", "entities", "hops", "anchors", "expansion", "rerank", "answer", "total"]
+
+OFFLINE_DIM = 256
+OFFLINE_CHUNK_WORDS = 200
+OFFLINE_SIMILAR_K = 5
+# Stands in for the offline graph's own max hops, to keep offline expansion cheap
+OFFLINE_MAX_HOPS = 3
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# === DATA ===
+def load_beir(dataset_dir: str, split: str = "test") -> Tuple[Dict[str, dict], Dict[str, str], Dict[str, Dict[str, int]]]:
+    """Read corpus.jsonl, queries.jsonl and qrels/<split>.tsv; only queries with qrels are kept."""
+    path = Path(dataset_dir)
+    corpus = {}
+    with open(path / "corpus.jsonl", encoding="utf-8") as f:
+        for line in f:
+            doc = json.loads(line)
+            corpus[str(doc["_id"])] = {"title": doc.get("title", ""), "text": doc.get("text", "")}
+    qrels: Dict[str, Dict[str, int]] = {}
+    with open(path / "qrels" / f"{split}.tsv", encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            qid, doc_id, score = line.rstrip("\n").split("\t")[:3]
+            qrels.setdefault(qid, {})[doc_id] = int(score)
+    queries = {}
+    with open(path / "queries.jsonl", encoding="utf-8") as f:
+        for line in f:
+            query = json.loads(line)
+            if str(query["_id"]) in qrels:
+                queries[str(query["_id"])] = query["text"]
+    return corpus, queries, qrels
+
+
+def synthetic_beir(num_docs: int, seed: int = 42) -> Tuple[Dict[str, dict], Dict[str, str], Dict[str, Dict[str, int]]]:
+    """Deterministic BEIR-shaped dataset: topical documents, one query per fifth document."""
+    rng = np.random.default_rng(seed)
+    num_topics = max(1, num_docs // 20)
+    topics = [[f"t{t}w{w}" for w in range(30)] for t in range(num_topics)]
+    common = [f"c{w}" for w in range(200)]
+    corpus, queries, qrels = {}, {}, {}
+    for d in range(num_docs):
+        topic = topics[d % num_topics]
+        words = list(rng.choice(topic, 40)) + list(rng.choice(common, 60))
+        rng.shuffle(words)
+        doc_id = f"d{d}"
+        corpus[doc_id] = {"title": "", "text": " ".join(words)}
+        if d % 5 == 0:
+            queries[f"q{d}"] = " ".join(rng.choice([w for w in words if w.startswith("t")], 6))
+            qrels[f"q{d}"] = {doc_id: 1}
+    return corpus, queries, qrels
+
+
+# === OFFLINE PROVIDERS ===
+def fake_embedding(text: str, dim: int = OFFLINE_DIM) -> List[float]:
+    """Signed feature hashing of word tokens: deterministic, and texts sharing words are similar."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in _TOKEN.findall(text.lower()):
+        h = zlib.crc32(token.encode("utf-8"))
+        vec[h % dim] += 1.0 if (h >> 16) & 1 else -1.0
+    norm = np.linalg.norm(vec)
+    return (vec / norm if norm else vec).tolist()
+
+
+def fake_broadness(embedding: List[float]) -> float:
+    """A hash of the (text's) embedding mapped uniformly onto [0, 1], so queries spread over all hop counts."""
+    return zlib.crc32(np.asarray(embedding, dtype=np.float32).tobytes()) / 0xFFFFFFFF
+
+
+def fake_generate(question: str, reranked_chunks) -> str:
+    """Echo the start of the top chain, so the answer depends only on retrieval."""
+    build_prompt(question, reranked_chunks)
+    if not reranked_chunks:
+        return ""
+    return " ".join(" ".join(reranked_chunks[0][1]).split()[:30])
+
+
+def build_offline_router(corpus: Dict[str, dict], num_shards: int = 1, similar_k: int = OFFLINE_SIMILAR_K) -> ShardRouter:
+    """
+    In-memory graph over the corpus: documents split into word windows
+    (ids `<doc>_chunk_<i>`, as ingest names them), fake embeddings, and
+    SIMILAR_TO edges to each chunk's `similar_k` nearest chunks in its shard.
+    """
+    router = ShardRouter([InMemoryShard(f"offline-{i}") for i in range(num_shards)])
+    for doc_id, doc in corpus.items():
+        words = f"{doc['title']}\n{doc['text']}".split()
+        rows = [
+            (f"{doc_id}_chunk_{i}", " ".join(words[start:start + OFFLINE_CHUNK_WORDS]), None)
+            for i, start in enumerate(range(0, max(len(words), 1), OFFLINE_CHUNK_WORDS))
+        ]
+        router.shard_for_source(doc_id).add_chunks((cid, text, fake_embedding(text)) for cid, text, _ in rows)
+
+    for shard in router.shards:
+        ids = list(shard.embeddings)
+        if len(ids) < 2:
+            continue
+        matrix = np.stack([shard.embeddings[c] for c in ids])
+        k = min(similar_k, len(ids) - 1)
+        for start in range(0, len(ids), 1024):
+            sims = matrix[start:start + 1024] @ matrix.T
+            for row, i in enumerate(range(start, min(start + 1024, len(ids)))):
+                sims[row, i] = -np.inf
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            for row, neighbours in enumerate(top):
+                for j in neighbours:
+                    shard.add_edge(ids[start + row], ids[j], float(sims[row, j]))
+    return router
+
+
+@contextlib.contextmanager
+def offline_providers(router: ShardRouter):
+    """Point the orchestrator's stages at the offline fakes and the in-memory graph, restoring them on exit."""
+    fakes = {
+        "get_shard_router": lambda: router,
+        "embedding_query": fake_embedding,
+        "predict_broadness_score": fake_broadness,
+        "graph_max_hops": lambda tenant=None: OFFLINE_MAX_HOPS,
+        "rerank_chunks_with_cohere": partial(rerank_chunks_with_cohere, backend="local"),
+        "generate_answer_from_chunks": fake_generate,
+    }
+    originals = {name: getattr(orchestrator, name) for name in fakes}
+    for name, fake in fakes.items():
+        setattr(orchestrator, name, fake)
+    try:
+        yield
+    finally:
+        for name, original in originals.items():
+            setattr(orchestrator, name, original)
+
+
+# === METRICS ===
+def count_tokens(text: str, offline: bool) -> int:
+    """Prompt tokens: cl100k_base (the chat models' tokenizer) live, a word count offline."""
+    if offline:
+        return len(_TOKEN.findall(text.lower()))
+    import tiktoken
+    return len(tiktoken.get_encoding("cl100k_base").encode(text, disallowed_special=()))
+
+
+def ranked_docs(chains) -> List[str]:
+    """Documents in the order their chunks appear in the final chains."""
+    docs = []
+    for ids_chain, _, _ in chains:
+        for chunk_id in ids_chain:
+            doc_id = chunk_id.rsplit("_chunk_", 1)[0]
+            if doc_id not in docs:
+                docs.append(doc_id)
+    return docs
+
+
+def ndcg_at_k(ranking: List[str], relevant: Dict[str, int], k: int) -> float:
+    dcg = sum(relevant.get(doc, 0) / math.log2(i + 2) for i, doc in enumerate(ranking[:k]))
+    ideal = sorted((r for r in relevant.values() if r > 0), reverse=True)[:k]
+    idcg = sum(r / math.log2(i + 2) for i, r in enumerate(ideal))
+    return dcg / idcg if idcg else 0.0
+
+
+def recall_at_k(ranking: List[str], relevant: Dict[str, int], k: int) -> float:
+    positives = {doc for doc, r in relevant.items() if r > 0}
+    return len(positives & set(ranking[:k])) / len(positives) if positives else 0.0
+
+
+def percentile(values: List[float], p: float) -> float:
+    return float(np.percentile(values, p)) if values else 0.0
+
+
+# === REPLAY ===
+async def replay(
+    queries: Dict[str, str],
+    qrels: Dict[str, Dict[str, int]],
+    concurrency: int,
+    k: int,
+    offline: bool,
+    speculative: bool = orchestrator.SPECULATIVE
+) -> Tuple[List[dict], float]:
+    """Run every query through answer_question_async, at most `concurrency` at a time."""
+    with ThreadPoolExecutor(max_workers=max(4, concurrency * 4)) as executor:
+        asyncio.get_running_loop().set_default_executor(executor)
+        return await _replay(queries, qrels, concurrency, k, offline, speculative)
+
+
+async def _replay(
+    queries: Dict[str, str],
+    qrels: Dict[str, Dict[str, int]],
+    concurrency: int,
+    k: int,
+    offline: bool,
+    speculative: bool
+) -> Tuple[List[dict], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(qid: str, text: str) -> dict:
+        async with semaphore:
+            trace: dict = {}
+            try:
+                _, timings = await orchestrator.answer_question_async(text, speculative, trace=trace)
+                error = None
+            except Exception as e:
+                timings, error = {}, f"{type(e).__name__}: {e}"
+        chains = trace.get("chains", [])
+        ranking = ranked_docs(chains)
+        return {
+            "qid": qid,
+            "error": error,
+            "hops": trace.get("hops"),
+            "stages_ms": {stage: timings[stage] * 1000 for stage in STAGES if stage in timings},
+            "speculation_hit": timings.get("speculation_hit"),
+            "ndcg": ndcg_at_k(ranking, qrels.get(qid, {}), k),
+            "recall": recall_at_k(ranking, qrels.get(qid, {}), k),
+            "prompt_tokens": count_tokens(build_prompt(text, chains), offline) if chains else 0,
+        }
+
+    start = time.perf_counter()
+    rows = await asyncio.gather(*(one(qid, text) for qid, text in queries.items()))
+    return rows, time.perf_counter() - start
+
+
+def summarize(rows: List[dict], wall_s: float, concurrency: int, k: int) -> dict:
+    ok = [r for r in rows if r["error"] is None]
+    summary = {
+        "queries": len(rows),
+        "errors": len(rows) - len(ok),
+        "concurrency": concurrency,
+        "k": k,
+        "wall_s": wall_s,
+        "throughput_qps": len(ok) / wall_s if wall_s else 0.0,
+        f"ndcg@{k}": statistics.fmean(r["ndcg"] for r in ok) if ok else 0.0,
+        f"recall@{k}": statistics.fmean(r["recall"] for r in ok) if ok else 0.0,
+        "prompt_tokens_mean": statistics.fmean(r["prompt_tokens"] for r in ok) if ok else 0.0,
+        "prompt_tokens_total": sum(r["prompt_tokens"] for r in ok),
+    }
+    hits = [r["speculation_hit"] for r in ok if r["speculation_hit"] is not None]
+    if hits:
+        summary["speculation_hit_rate"] = statistics.fmean(hits)
+    for stage in STAGES:
+        values = [r["stages_ms"][stage] for r in ok if stage in r["stages_ms"]]
+        if values:
+            summary[f"{stage}_p50_ms"] = percentile(values, 50)
+            summary[f"{stage}_p95_ms"] = percentile(values, 95)
+    return summary
+
+
+def print_summary(summary: dict):
+    print("| metric | value |")
+    print("|---|---|")
+    for key, value in summary.items():
+        print(f"| {key} | {value:.4f} |" if isinstance(value, float) else f"| {key} | {value} |")
+
+
+def compare_runs(
+    baseline: dict,
+    current: dict,
+    latency_tolerance: float,
+    quality_tolerance: float,
+    latency_floor_ms: float = 1.0
+) -> bool:
+    """
+    Print a metric-by-metric diff against a previous run. Returns True if a
+    latency grew by more than `latency_tolerance` (relative) and more than
+    `latency_floor_ms` (so sub-millisecond jitter is ignored), throughput fell
+    by more than `latency_tolerance`, or a quality metric dropped by more than
+    `quality_tolerance`.
+    """
+    base, cur = baseline["summary"], current["summary"]
+    if baseline.get("config") != current.get("config"):
+        print(f"⚠️ Run configs differ: {baseline.get('config')} vs {current.get('config')}")
+    regressed = False
+    print("| metric | baseline | current | delta | |")
+    print("|---|---|---|---|---|")
+    for key, value in cur.items():
+        if key not in base or not isinstance(value, float):
+            continue
+        old = base[key]
+        delta = value - old
+        flag = ""
+        if key.endswith("_ms") and old > 0 and delta / old > latency_tolerance and delta > latency_floor_ms:
+            flag = "slower"
+        elif key == "throughput_qps" and old > 0 and -delta / old > latency_tolerance:
+            flag = "slower"
+        elif key.startswith(("ndcg@", "recall@")) and -delta > quality_tolerance:
+            flag = "worse"
+        regressed = regressed or bool(flag)
+        print(f"| {key} | {old:.4f} | {value:.4f} | {delta:+.4f} | {flag} |")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay BEIR queries through the PPF pipeline.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--dataset", metavar="DIR", help="BEIR dataset directory (corpus.jsonl, queries.jsonl, qrels/).")
+    source.add_argument("--synthetic", type=int, metavar="DOCS", help="Generate a synthetic dataset with this many documents.")
+    parser.add_argument("--split", default="test", help="qrels split.")
+    parser.add_argument("--offline", action="store_true", help="Fake providers and an in-memory graph; no network.")
+    parser.add_argument("--shards", type=int, default=1, help="In-memory shards for --offline.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Queries in flight.")
+    parser.add_argument("--speculative", action="store_true", help="Speculative expansion (default: PPF_SPECULATIVE).")
+    parser.add_argument("--limit", type=int, help="Replay at most this many queries.")
+    parser.add_argument("--k", type=int, default=10, help="Cutoff for nDCG@k and recall@k.")
+    parser.add_argument("--out", help="Write the run (config, summary, per-query rows) to this JSON file.")
+    parser.add_argument("--compare", metavar="RUN", help="Previous run JSON to diff against.")
+    parser.add_argument("--latency-tolerance", type=float, default=0.10, help="Allowed relative latency growth.")
+    parser.add_argument("--latency-floor-ms", type=float, default=1.0, help="Ignore latency growth below this.")
+    parser.add_argument("--quality-tolerance", type=float, default=0.01, help="Allowed absolute nDCG/recall drop.")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own output.")
+    args = parser.parse_args()
+
+    if args.dataset:
+        corpus, queries, qrels = load_beir(args.dataset, args.split)
+    else:
+        corpus, queries, qrels = synthetic_beir(args.synthetic)
+    if args.limit:
+        queries = dict(list(queries.items())[:args.limit])
+
+    providers = contextlib.nullcontext()
+    if args.offline:
+        start = time.perf_counter()
+        router = build_offline_router(corpus, args.shards)
+        providers = offline_providers(router)
+        print(f"✅ In-memory graph: {sum(len(s) for s in router.shards)} chunks in {len(router)} shards "
+              f"({time.perf_counter() - start:.1f}s).")
+
+    speculative = args.speculative or orchestrator.SPECULATIVE
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with providers, output:
+        rows, wall_s = asyncio.run(replay(queries, qrels, args.concurrency, args.k, args.offline, speculative))
+
+    run = {
+        "config": {
+            "dataset": args.dataset or f"synthetic:{args.synthetic}",
+            "split": args.split,
+            "offline": args.offline,
+            "shards": args.shards if args.offline else None,
+            "speculative": speculative,
+            "k": args.k,
+            "queries": len(queries),
+        },
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "summary": summarize(rows, wall_s, args.concurrency, args.k),
+        "rows": rows,
+    }
+    print_summary(run["summary"])
+    for row in rows:
+        if row["error"]:
+            print(f"⚠️ {row['qid']}: {row['error']}")
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(run, indent=2), encoding="utf-8")
+        print(f"✅ Run written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        if compare_runs(baseline, run, args.latency_tolerance, args.quality_tolerance, args.latency_floor_ms):
+            print("\n❌ Regression against baseline.")
+            sys.exit(1)
+        print("\n✅ No regression against baseline.")
@@ -1,30 +1,9 @@
-import os
 from typing import List, Tuple
-from openai import OpenAI
-import cohere
 
-from Secret.secret import (
-    NEO4J_URI_secret,
-    NEO4J_USER_secret,
-    NEO4J_PASS_secret,
-    OPENAI_API_KEY_secret,
-    COHERE_API_KEY_secret
-)
+from config import get_openai_client, MODEL_NAME
 
-NEO4J_URI = os.getenv("NEO4J_URI", NEO4J_URI_secret)
-NEO4J_USER = os.getenv("NEO4J_USER", NEO4J_USER_secret)
-NEO4J_PASS = os.getenv("NEO4J_PASS", NEO4J_PASS_secret)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", OPENAI_API_KEY_secret)
-COHERE_API_KEY = os.getenv("COHERE_API_KEY", COHERE_API_KEY_secret)
-MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
-SIMILAR_K = int(os.getenv("SIMILAR_K", 3))
-client = OpenAI(api_key=OPENAI_API_KEY)
-cohere_client = cohere.Client(COHERE_API_KEY)
-EMBEDDING_DIM = 1536
-SYSTEM_MAX_HOPS = 10
-TOP_K = 5 
 
-def generate_answer_from_chunks(question: str,  reranked_chunks: List[Tuple[str, str, float]]) -> str:
+def build_prompt(question: str, reranked_chunks: List[Tuple[str, str, float]]) -> str:
     context = "\n\n".join(
     "\n\n".join(chunk[1]) if isinstance(chunk[1], list) else chunk[1]
     for chunk in reranked_chunks
@@ -38,11 +17,15 @@ def generate_answer_from_chunks(question: str,  reranked_chunks: List[Tuple[str,
         f"Question: {question}\n\n"
         "Answer:"
 )
+    return prompt
 
+
+def generate_answer_from_chunks(question: str,  reranked_chunks: List[Tuple[str, str, float]]) -> str:
+    prompt = build_prompt(question, reranked_chunks)
     print("Prompt prepared for the model.\n")
 
     try:
-        response = client.chat.completions.create(
+        response = get_openai_client().chat.completions.create(
             model=MODEL_NAME,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=500
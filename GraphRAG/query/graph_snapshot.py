@@ -0,0 +1,367 @@
+import json
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from config import SYSTEM_MAX_HOPS
+from quantization import dequantize_matrix, quantized_cosine
+
+# Bumped by Ingestion/snapshot_export.py whenever the on-disk layout changes
+SNAPSHOT_FORMAT_VERSION = 1
+PATH_AGGREGATES_FORMAT_VERSION = 1
+
+
+def _top_k(sims: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    k = min(k, len(sims))
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top])]
+    return [(int(i), float(sims[i])) for i in top]
+
+
+def graph_max_hops(indptr: np.ndarray, indices: np.ndarray, cap: int = SYSTEM_MAX_HOPS, batch: int = 64) -> int:
+    """
+    Snapshot counterpart of compute_max_hops.get_graph_defined_max_hops: the
+    longest shortest path, over SIMILAR_TO edges in either direction, between
+    two connected chunks. Capped at `cap`, since compute_hops never uses more.
+    Breadth-first search runs from `batch` sources at once, one bit per source.
+    Like the Cypher, falls back to 3 when no two chunks are connected.
+    """
+    indptr = np.asarray(indptr, dtype=np.int64)
+    num_nodes = len(indptr) - 1
+    sources = np.repeat(np.arange(num_nodes), np.diff(indptr))
+    targets = np.asarray(indices, dtype=np.int64)
+    # Undirected adjacency, grouped by node
+    ends = np.concatenate([sources, targets])
+    order = np.argsort(ends, kind="stable")
+    neighbours = np.concatenate([targets, sources])[order]
+    connected = np.bincount(ends, minlength=num_nodes) > 0
+    starts = np.searchsorted(ends[order], np.arange(num_nodes))[connected]
+
+    longest = 0
+    for first in range(0, num_nodes, batch):
+        count = min(batch, num_nodes - first)
+        frontier = np.zeros(num_nodes, dtype=np.uint64)
+        frontier[first:first + count] = np.left_shift(np.uint64(1), np.arange(count, dtype=np.uint64))
+        reached = frontier.copy()
+        depth = 0
+        while True:
+            step = np.zeros(num_nodes, dtype=np.uint64)
+            if len(starts):
+                step[connected] = np.bitwise_or.reduceat(frontier[neighbours], starts)
+            frontier = step & ~reached
+            if not frontier.any():
+                break
+            reached |= frontier
+            depth += 1
+            if depth >= cap:
+                return cap
+        longest = max(longest, depth)
+    return longest or 3
+
+
+class PathAggregates:
+    """
+    Per-anchor top-M paths for each hop depth with their summed embeddings,
+    written by Ingestion/snapshot_export.write_path_aggregates. PPF precision
+    of a path depends only on q . sum and |sum|^2, so scoring an anchor's stored
+    paths is one [M, D] @ [D] product, whatever the hop count.
+    """
+
+    def __init__(self, path_dir: Path):
+        with open(path_dir / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.max_hops: int = self.manifest["max_hops"]
+        self.nodes, self.sums, self.scales, self.sqnorms = {}, {}, {}, {}
+        for h in range(1, self.max_hops + 1):
+            self.nodes[h] = np.load(path_dir / f"nodes_h{h}.npy", mmap_mode="r")
+            self.sums[h] = np.load(path_dir / f"sums_h{h}.npy", mmap_mode="r")
+            self.sqnorms[h] = np.load(path_dir / f"sum_sqnorms_h{h}.npy", mmap_mode="r")
+            scales_path = path_dir / f"sum_scales_h{h}.npy"
+            self.scales[h] = np.load(scales_path, mmap_mode="r") if scales_path.exists() else None
+
+    def score_anchor(self, anchor: int, hops: int, query_embedding) -> Tuple[np.ndarray, np.ndarray]:
+        """Stored paths of `anchor` at depth `hops` as (node paths [M', hops + 1], PPF precisions [M'])."""
+        nodes = np.asarray(self.nodes[hops][anchor])
+        valid = nodes[:, 0] >= 0
+        if not valid.any():
+            return nodes[:0], np.zeros(0, dtype=np.float32)
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q_sq = float(q @ q)
+        dots = np.asarray(self.sums[hops][anchor][valid], dtype=np.float32) @ q
+        if self.scales[hops] is not None:
+            dots *= self.scales[hops][anchor][valid]
+        # precision = cos(q, (q + mean) / 2) with mean = sum / (hops + 1)
+        count = hops + 1
+        mean_dot = dots / count
+        mean_sq = self.sqnorms[hops][anchor][valid] / count ** 2
+        denom = np.sqrt(q_sq) * np.sqrt(np.maximum(q_sq + 2 * mean_dot + mean_sq, 0.0))
+        precisions = np.divide(q_sq + mean_dot, denom, out=np.zeros_like(denom), where=denom > 0)
+        return nodes[valid], precisions
+
+
+class GraphSnapshot:
+    """
+    Read-only view over a snapshot written by Ingestion/snapshot_export.py.
+    Every array is memory-mapped, so worker processes opening the same
+    snapshot share one copy of the graph through the OS page cache.
+    """
+
+    def __init__(self, snapshot_dir: str):
+        path = Path(snapshot_dir)
+        self.path = path
+        with open(path / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+            raise ValueError(
+                f"Snapshot {path} has format version {self.manifest.get('format_version')}, "
+                f"expected {SNAPSHOT_FORMAT_VERSION}; re-export it with Ingestion/snapshot_export.py"
+            )
+        with open(path / "ids.json", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        self.index_of: Dict[str, int] = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+
+        self.indptr = np.load(path / "indptr.npy", mmap_mode="r")
+        self.indices = np.load(path / "indices.npy", mmap_mode="r")
+        self.scores = np.load(path / "scores.npy", mmap_mode="r")
+        self.embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+        self.norms = np.load(path / "norms.npy", mmap_mode="r")
+
+        # Scoring runs on the compact copy when the snapshot was exported quantized;
+        # the float32 matrix is then only paged in for full-precision reranking.
+        self.embedding_quant = self.manifest.get("embedding_quant", "none")
+        if self.embedding_quant != "none":
+            self.score_matrix = np.load(path / "embeddings_q.npy", mmap_mode="r")
+            self.score_norms = np.load(path / "norms_q.npy", mmap_mode="r")
+            scales_path = path / "embedding_scales.npy"
+            self.score_scales = np.load(scales_path, mmap_mode="r") if scales_path.exists() else None
+        else:
+            self.score_matrix = self.embeddings
+            self.score_norms = self.norms
+            self.score_scales = None
+        self.content_offsets = np.load(path / "content_offsets.npy", mmap_mode="r")
+        if self.content_offsets[-1] > 0:
+            self.content_blob = np.memmap(path / "content.bin", dtype=np.uint8, mode="r")
+        else:
+            self.content_blob = np.zeros(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @cached_property
+    def graph_max_hops(self) -> int:
+        """Max hops of the snapshot graph, from the manifest (computed here for snapshots that predate it)."""
+        stored = self.manifest.get("graph_max_hops")
+        return stored if stored is not None else graph_max_hops(self.indptr, self.indices)
+
+    @cached_property
+    def path_aggregates(self) -> Optional[PathAggregates]:
+        """Materialized path aggregates for this snapshot, or None if absent or built from another snapshot."""
+        path_dir = self.path / "paths"
+        if not (path_dir / "manifest.json").exists():
+            return None
+        with open(path_dir / "manifest.json", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != PATH_AGGREGATES_FORMAT_VERSION:
+            print(f"⚠️ Path aggregates in {path_dir} have format version {manifest.get('format_version')}, "
+                  f"expected {PATH_AGGREGATES_FORMAT_VERSION}; ignoring them.")
+            return None
+        snapshot_id = self.manifest.get("snapshot_id")
+        if (snapshot_id is None or manifest.get("snapshot_id") != snapshot_id
+                or manifest.get("num_nodes") != len(self)):
+            print(f"⚠️ Path aggregates in {path_dir} were built from another snapshot; ignoring them.")
+            return None
+        return PathAggregates(path_dir)
+
+    def content(self, i: int) -> str:
+        start, end = self.content_offsets[i], self.content_offsets[i + 1]
+        return self.content_blob[start:end].tobytes().decode("utf-8")
+
+    def neighbours(self, i: int) -> np.ndarray:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def scoring_embedding(self, i: int) -> np.ndarray:
+        """Embedding used for PPF scoring: the compact row, dequantized, if present."""
+        if self.score_scales is not None:
+            return dequantize_matrix(self.score_matrix[i], self.score_scales[i])
+        return np.asarray(self.score_matrix[i], dtype=np.float32)
+
+    def full_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Full-precision embeddings for the given chunk ids."""
+        return {chunk_id: self.embeddings[self.index_of[chunk_id]] for chunk_id in ids if chunk_id in self.index_of}
+
+    def allowed_mask(self, allowed_ids: Optional[Set[str]]) -> Optional[np.ndarray]:
+        """Boolean node mask for a set of chunk ids, or None for no restriction."""
+        if allowed_ids is None:
+            return None
+        mask = np.zeros(len(self), dtype=bool)
+        mask[[self.index_of[c] for c in allowed_ids if c in self.index_of]] = True
+        return mask
+
+    def find_anchors(
+        self,
+        query_embedding: List[float],
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Exact cosine top-k over the embedding matrix, mirroring the
+        `chunk_embedding_index` vector query. Returns (node index, score).
+        With an `allowed` mask only those rows are scored.
+        """
+        if len(self) == 0 or k <= 0:
+            return []
+        if allowed is not None:
+            rows = np.flatnonzero(allowed)
+            if len(rows) == 0:
+                return []
+            scales = self.score_scales[rows] if self.score_scales is not None else None
+            sims = quantized_cosine(self.score_matrix[rows], scales, self.score_norms[rows], query_embedding)
+            return [(int(rows[i]), score) for i, score in _top_k(sims, k)]
+        sims = quantized_cosine(self.score_matrix, self.score_scales, self.score_norms, query_embedding)
+        return _top_k(sims, k)
+
+    def iter_anchor_paths(self, anchor: int, hops: int, allowed: Optional[np.ndarray] = None) -> Iterator[List[int]]:
+        """
+        Yield every path of exactly `hops` SIMILAR_TO edges starting at `anchor`,
+        as node-index lists. Like Cypher's variable-length match, a path never
+        reuses an edge but may revisit a node. With an `allowed` mask, expansion
+        never steps onto a node outside it.
+        """
+        # Stack of (node, depth, next edge position); edges in use are tracked by CSR position
+        path = [anchor]
+        used_edges: List[int] = []
+        stack = [(anchor, int(self.indptr[anchor]))]
+        while stack:
+            node, pos = stack[-1]
+            end = int(self.indptr[node + 1])
+            if len(path) - 1 == hops or pos >= end:
+                if len(path) - 1 == hops:
+                    yield list(path)
+                stack.pop()
+                path.pop()
+                if used_edges:
+                    used_edges.pop()
+                continue
+            stack[-1] = (node, pos + 1)
+            if pos in used_edges:
+                continue
+            nxt = int(self.indices[pos])
+            if allowed is not None and not allowed[nxt]:
+                continue
+            used_edges.append(pos)
+            path.append(nxt)
+            stack.append((nxt, int(self.indptr[nxt])))
+
+    def path_tuple(self, path: List[int], with_content: bool = True) -> Tuple[List[str], List[str], List[np.ndarray]]:
+        """Materialize a node-index path as (ids_chain, contents_chain, embeddings_chain)."""
+        return (
+            [self.ids[i] for i in path],
+            [self.content(i) for i in path] if with_content else None,
+            [self.scoring_embedding(i) for i in path],
+        )
+
+    def fetch_contents(self, ids: List[str]) -> Dict[str, str]:
+        """Snapshot counterpart of top_k.fetch_chunk_contents."""
+        return {chunk_id: self.content(self.index_of[chunk_id]) for chunk_id in dict.fromkeys(ids) if chunk_id in self.index_of}
+
+
+def iter_top_k_paths_snapshot(
+    snapshot: GraphSnapshot,
+    query_embedding: List[float],
+    k: int,
+    hops: int,
+    with_content: bool = True
+) -> Iterator[Tuple[List[str], List[str], List[np.ndarray]]]:
+    """Streaming form of get_top_k_paths_snapshot."""
+    for anchor, _ in snapshot.find_anchors(query_embedding, k):
+        for path in snapshot.iter_anchor_paths(anchor, hops):
+            yield snapshot.path_tuple(path, with_content)
+
+
+def get_top_k_paths_snapshot(
+    snapshot: GraphSnapshot,
+    query_embedding: List[float],
+    k: int,
+    hops: int,
+    with_content: bool = True
+) -> List[Tuple[List[str], List[str], List[np.ndarray]]]:
+    """
+    Snapshot-backed equivalent of top_k.get_top_k_paths_precise: top-k anchors
+    by vector similarity, then every path with exactly `hops` expansions.
+    """
+    paths = list(iter_top_k_paths_snapshot(snapshot, query_embedding, k, hops, with_content))
+
+    print(f"\n✅ Retrieved {len(paths)} total paths across {k} anchors using {hops} hops (snapshot).")
+    return paths
+
+
+def iter_scored_paths_snapshot(
+    snapshot: GraphSnapshot,
+    query_embedding: List[float],
+    anchors: List[Tuple[int, float]],
+    hops: int,
+    allowed: Optional[np.ndarray] = None,
+    with_content: bool = True
+) -> Iterator[Tuple[List[str], List[str], float]]:
+    """
+    Expand and PPF-score in one trie walk: running embedding sums follow the
+    DFS, so only rows of newly visited trie nodes are read and dequantized.
+    Yields (ids_chain, contents_chain, precision), dropping duplicate chains.
+    """
+    from precision_expander import PrefixSumScorer, chain_key
+
+    scorer = PrefixSumScorer(query_embedding)
+    seen = set()
+    duplicates = 0
+    try:
+        for anchor, _ in anchors:
+            for path in snapshot.iter_anchor_paths(anchor, hops, allowed):
+                key = chain_key(path)
+                if key in seen:
+                    duplicates += 1
+                    continue
+                seen.add(key)
+                precision = scorer.score(path, lambda i: snapshot.scoring_embedding(path[i]))
+                yield (
+                    [snapshot.ids[i] for i in path],
+                    [snapshot.content(i) for i in path] if with_content else None,
+                    precision,
+                )
+    finally:
+        print(f"\nPrefix scoring: {len(seen)} chains, {scorer.trie_nodes} trie nodes for "
+              f"{scorer.path_nodes} path nodes, {duplicates} duplicate chains dropped.")
+
+
+def iter_aggregate_chains_snapshot(
+    snapshot: GraphSnapshot,
+    query_embedding: List[float],
+    anchors: List[Tuple[int, float]],
+    hops: int,
+    allowed: Optional[np.ndarray] = None,
+    with_content: bool = True
+) -> Iterator[Tuple[List[str], List[str], float]]:
+    """
+    Chains from the materialized path aggregates instead of expansion: per
+    anchor a lookup plus one dot product per stored path. Requires
+    snapshot.path_aggregates covering `hops`. With an `allowed` mask, stored
+    paths that leave it are skipped. Duplicate chains are dropped.
+    """
+    from precision_expander import chain_key
+
+    aggregates = snapshot.path_aggregates
+    seen = set()
+    for anchor, _ in anchors:
+        paths, precisions = aggregates.score_anchor(anchor, hops, query_embedding)
+        for path, precision in zip(paths.tolist(), precisions.tolist()):
+            if allowed is not None and not allowed[path].all():
+                continue
+            key = chain_key(path)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield (
+                [snapshot.ids[i] for i in path],
+                [snapshot.content(i) for i in path] if with_content else None,
+                precision,
+            )
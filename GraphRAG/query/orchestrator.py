@@ -0,0 +1,441 @@
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from compute_max_hops import compute_hops
+from top_k import (
+    find_anchors_precise,
+    iter_anchor_paths_precise,
+    fetch_full_embeddings,
+    fetch_chunk_contents,
+)
+from graph_snapshot import GraphSnapshot, iter_scored_paths_snapshot, iter_aggregate_chains_snapshot
+from precision_expander import (
+    process_paths_for_ppf,
+    filter_by_precision,
+    iter_paths_for_ppf,
+    iter_paths_for_ppf_prefix,
+    stream_filter_by_precision,
+    rescore_with_full_precision,
+    attach_chain_contents,
+)
+from quantization import EMBEDDING_QUANT
+from entity_index import get_entity_index
+from sharding import get_shard_router
+from admission import Ticket, get_admission_controller
+from rerank_cohere import rerank_chunks_with_cohere
+from generate_answer import generate_answer_from_chunks
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from GraphRag_retrieval_controller.predict_controller import (
+    embedding_query,
+    predict_broadness_score
+)
+
+TOP_K = 5
+PRECISION_THRESHOLD = 0.8
+# Expansion hands TOP_K * RERANK_POOL chains to the reranker, which picks the final TOP_K
+RERANK_POOL = int(os.getenv("PPF_RERANK_POOL", 4))
+SNAPSHOT_DIR = os.getenv("PPF_SNAPSHOT_DIR")
+QUANT_RERANK_POOL = int(os.getenv("QUANT_RERANK_POOL", 4))
+# Two-phase retrieval: score on ids + embeddings, fetch content only for surviving chains
+TWO_PHASE = os.getenv("PPF_TWO_PHASE", "0") == "1"
+# Streaming: score paths straight off the cursor into a bounded top-N heap
+STREAMING = os.getenv("PPF_STREAMING", "0") == "1"
+# Early stop: end the stream once TOP_K chains pass the threshold (first passing, not best)
+STREAM_EARLY_STOP = os.getenv("PPF_STREAM_EARLY_STOP", "0") == "1"
+# Prefix scoring: running embedding sums over the expansion trie, duplicate chains dropped
+PREFIX_SCORING = os.getenv("PPF_PREFIX_SCORING", "0") == "1"
+# Path aggregates: score the snapshot's materialized per-anchor top-M paths instead of expanding
+PATH_AGGREGATES = os.getenv("PPF_PATH_AGGREGATES", "0") == "1"
+# Speculative expansion: start expanding at the most likely hop count before the prediction lands.
+# Off by default: a fresh process has no hop history and always guesses 1.
+SPECULATIVE = os.getenv("PPF_SPECULATIVE", "0") == "1"
+SPECULATIVE_HISTORY = int(os.getenv("PPF_SPECULATIVE_HISTORY", 50))
+# Entity pre-filtering: restrict anchors and expansion to chunks sharing an entity with the question
+ENTITY_FILTER = os.getenv("PPF_ENTITY_FILTER", "0") == "1"
+# Admission control: cap hops, anchors and expanded paths while the latency SLO is being missed
+ADMISSION = os.getenv("PPF_ADMISSION", "0") == "1"
+
+_snapshot: Optional[GraphSnapshot] = None
+_recent_hops: deque = deque(maxlen=SPECULATIVE_HISTORY)
+
+
+class ExpansionCancelled(Exception):
+    pass
+
+
+def get_snapshot() -> Optional[GraphSnapshot]:
+    global _snapshot
+    if SNAPSHOT_DIR and _snapshot is None:
+        _snapshot = GraphSnapshot(SNAPSHOT_DIR)
+    return _snapshot
+
+
+def most_likely_hops() -> int:
+    """Most frequent hop count over recent queries; 1 before any history exists."""
+    if not _recent_hops:
+        return 1
+    return Counter(_recent_hops).most_common(1)[0][0]
+
+
+# === STAGES ===
+def entity_candidates(question: str) -> Optional[Set[str]]:
+    """Chunk ids sharing an entity with the question, or None for an unrestricted search."""
+    if not ENTITY_FILTER:
+        return None
+    entity_index = get_entity_index()
+    if entity_index is None:
+        return None
+    candidates = entity_index.candidate_chunks(question)
+    if candidates is not None:
+        print(f"Entity filter: {len(candidates)} candidate chunks.")
+    return candidates
+
+
+def graph_max_hops(tenant: Optional[str] = None) -> Optional[int]:
+    """
+    Max hops of the configured in-process graph or shards. None for the single
+    Neo4j database, where compute_hops asks Neo4j itself.
+    """
+    router = get_shard_router()
+    if router is not None:
+        return router.graph_max_hops(tenant)
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.graph_max_hops
+    return None
+
+
+def predict_hops(query_emb: List[float], tenant: Optional[str] = None) -> Tuple[float, int]:
+    score = predict_broadness_score(query_emb)
+    return score, compute_hops(score, graph_max=graph_max_hops(tenant))
+
+
+def find_anchors(
+    query_emb: List[float],
+    k: int = TOP_K,
+    allowed_ids: Optional[Set[str]] = None,
+    tenant: Optional[str] = None
+):
+    """
+    Top-k anchors from the configured backend. With shards (PPF_SHARDS) this is
+    a dict of shard name -> anchors over the shards routed for `tenant`.
+    """
+    router = get_shard_router()
+    snapshot = get_snapshot()
+    if router is not None:
+        anchors = router.find_anchors(query_emb, k, tenant, allowed_ids, with_content=not TWO_PHASE)
+    elif snapshot is not None:
+        anchors = snapshot.find_anchors(query_emb, k, snapshot.allowed_mask(allowed_ids))
+    else:
+        anchors = find_anchors_precise(query_emb, k, with_content=not TWO_PHASE, allowed_ids=allowed_ids)
+    if not anchors and allowed_ids is not None:
+        return find_anchors(query_emb, k, tenant=tenant)
+    return anchors
+
+
+def _iter_paths(anchors, hops: int, allowed_ids: Optional[Set[str]] = None) -> Iterator[tuple]:
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        mask = snapshot.allowed_mask(allowed_ids)
+        return (
+            snapshot.path_tuple(path, not TWO_PHASE)
+            for anchor, _ in anchors
+            for path in snapshot.iter_anchor_paths(anchor, hops, mask)
+        )
+    return iter_anchor_paths_precise(anchors, hops, with_content=not TWO_PHASE, allowed_ids=allowed_ids)
+
+
+def _until_cancelled(paths: Iterator[tuple], cancel: threading.Event) -> Iterator[tuple]:
+    try:
+        for path in paths:
+            if cancel.is_set():
+                raise ExpansionCancelled()
+            yield path
+    finally:
+        if hasattr(paths, "close"):
+            paths.close()
+
+
+def _take(items: Iterator[tuple], limit: Optional[int]) -> Iterator[tuple]:
+    """The first `limit` items (all of them for None), closing the source early."""
+    if limit is None:
+        return items
+
+    def take():
+        try:
+            for i, item in enumerate(items):
+                if i >= limit:
+                    return
+                yield item
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+    return take()
+
+
+def _full_embeddings(ids: List[str], anchors) -> Dict[str, List[float]]:
+    router, snapshot = get_shard_router(), get_snapshot()
+    if router is not None:
+        return router.full_embeddings(ids, list(anchors))
+    return snapshot.full_embeddings(ids) if snapshot is not None else fetch_full_embeddings(ids)
+
+
+def _fetch_contents(ids: List[str], anchors) -> Dict[str, str]:
+    router, snapshot = get_shard_router(), get_snapshot()
+    if router is not None:
+        return router.fetch_contents(ids, list(anchors))
+    return snapshot.fetch_contents(ids) if snapshot is not None else fetch_chunk_contents(ids)
+
+
+def _select_chains(chains: Iterable[tuple], top_n: int) -> List[tuple]:
+    if STREAMING:
+        return stream_filter_by_precision(chains, threshold=PRECISION_THRESHOLD, top_n=top_n, early_stop=STREAM_EARLY_STOP)
+    return filter_by_precision(list(chains), threshold=PRECISION_THRESHOLD, top_n=top_n)
+
+
+def expand_and_filter(
+    query_emb: List[float],
+    anchors,
+    hops: int,
+    top_n: int = TOP_K,
+    cancel: Optional[threading.Event] = None,
+    allowed_ids: Optional[Set[str]] = None,
+    path_budget: Optional[int] = None
+) -> List[tuple]:
+    """
+    Expand the anchors by `hops`, score with PPF and filter down to `top_n`
+    chains, applying the quantized rerank and two-phase content fetch when
+    enabled. Raises ExpansionCancelled if `cancel` is set mid-expansion.
+    With `allowed_ids`, expansion is pruned to those chunks; if that leaves no
+    path of the requested length, the anchors are expanded unrestricted.
+    With shards, each shard expands and scores its own anchors in parallel and
+    the merged per-shard top chains go through the same filtering.
+    `path_budget` caps the number of paths (chains) scored, per shard.
+    """
+    router = get_shard_router()
+    snapshot = get_snapshot()
+    aggregates = snapshot.path_aggregates if snapshot is not None and PATH_AGGREGATES else None
+    if aggregates is not None and hops > aggregates.max_hops:
+        aggregates = None
+    if router is not None:
+        quantized = router.quantized
+    elif aggregates is not None:
+        # Chains are ranked on the stored path sums, whatever the snapshot's own mode
+        quantized = aggregates.manifest["quant"] != "none"
+    else:
+        quantized = snapshot.embedding_quant != "none" if snapshot is not None else EMBEDDING_QUANT != "none"
+    pool_size = top_n * QUANT_RERANK_POOL if quantized else top_n
+
+    if router is not None:
+        def wrap(paths):
+            paths = _until_cancelled(paths, cancel) if cancel is not None else paths
+            return _take(paths, path_budget)
+        chains = router.expand(query_emb, anchors, hops, pool_size, allowed_ids, not TWO_PHASE, wrap, PREFIX_SCORING)
+    elif aggregates is not None:
+        # Same cost at any depth: one dot product per stored path
+        chains = iter_aggregate_chains_snapshot(
+            snapshot, query_emb, anchors, hops, snapshot.allowed_mask(allowed_ids), not TWO_PHASE
+        )
+        if cancel is not None:
+            chains = _until_cancelled(chains, cancel)
+        chains = _take(chains, path_budget)
+    elif snapshot is not None and PREFIX_SCORING:
+        chains = iter_scored_paths_snapshot(
+            snapshot, query_emb, anchors, hops, snapshot.allowed_mask(allowed_ids), not TWO_PHASE
+        )
+        if cancel is not None:
+            chains = _until_cancelled(chains, cancel)
+        chains = _take(chains, path_budget)
+    else:
+        paths = _iter_paths(anchors, hops, allowed_ids)
+        if cancel is not None:
+            paths = _until_cancelled(paths, cancel)
+        paths = _take(paths, path_budget)
+        if PREFIX_SCORING:
+            chains = iter_paths_for_ppf_prefix(query_emb, paths)
+        elif STREAMING:
+            chains = iter_paths_for_ppf(query_emb, paths)
+        else:
+            chains = process_paths_for_ppf(query_emb, list(paths))
+
+    if quantized:
+        # Chains were scored on compact vectors: keep a wider pool, then rerank it at full precision
+        candidates = _select_chains(chains, pool_size)
+        candidate_ids = [chunk_id for chain in candidates for chunk_id in chain[0]]
+        full = _full_embeddings(candidate_ids, anchors)
+        filtered = rescore_with_full_precision(query_emb, candidates, full, top_n=top_n)
+    else:
+        filtered = _select_chains(chains, top_n)
+
+    if not filtered and allowed_ids is not None:
+        return expand_and_filter(query_emb, anchors, hops, top_n, cancel, path_budget=path_budget)
+
+    if TWO_PHASE:
+        surviving_ids = [chunk_id for chain in filtered for chunk_id in chain[0]]
+        contents = _fetch_contents(surviving_ids, anchors)
+        filtered = attach_chain_contents(filtered, contents)
+    return filtered
+
+
+# === PIPELINES ===
+def _timed(timings: Dict[str, float], stage: str, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def _admit() -> Optional[Ticket]:
+    return get_admission_controller().admit() if ADMISSION else None
+
+
+def _release(ticket: Optional[Ticket], timings: Dict[str, float], start: float):
+    if ticket is None:
+        return
+    failed = "total" not in timings
+    if failed:
+        # Errors and cancellations count with the time they took, so the SLO window sees them
+        timings = {**timings, "total": time.perf_counter() - start}
+    get_admission_controller().complete(ticket, timings, failed)
+
+
+def answer_question(
+    question: str,
+    tenant: Optional[str] = None,
+    trace: Optional[dict] = None
+) -> Tuple[str, Dict[str, float]]:
+    """
+    Sequential pipeline: embed -> broadness -> hops -> anchors -> expansion -> rerank -> answer.
+    `tenant` restricts a sharded search to that tenant's shards. A `trace` dict,
+    if given, receives the hop count, the retrieval budget and the reranked
+    chains passed to the LLM. With PPF_ADMISSION, hops, anchors and expanded
+    paths are capped by the admission controller's current budget.
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    ticket = _admit()
+    top_k = ticket.budget.anchors if ticket is not None else TOP_K
+    path_budget = ticket.budget.path_budget if ticket is not None else None
+    try:
+        query_emb = _timed(timings, "embed", embedding_query, question)
+        allowed_ids = _timed(timings, "entities", entity_candidates, question)
+        score, hops = _timed(timings, "hops", predict_hops, query_emb, tenant)
+        print(f"Broadness score: {score:.2f}")
+        _recent_hops.append(hops)
+        if ticket is not None:
+            hops = ticket.cap_hops(hops)
+        print(f"Using {hops} hops for retrieval.")
+        anchors = _timed(timings, "anchors", find_anchors, query_emb, top_k, allowed_ids, tenant)
+        filtered = _timed(
+            timings, "expansion", expand_and_filter, query_emb, anchors, hops, TOP_K * RERANK_POOL, None, allowed_ids, path_budget
+        )
+        reranked = _timed(timings, "rerank", rerank_chunks_with_cohere, question, filtered, TOP_K)
+        if trace is not None:
+            trace.update(hops=hops, chains=reranked, budget=ticket.budget if ticket is not None else None)
+        answer = _timed(timings, "answer", generate_answer_from_chunks, question, reranked)
+        timings["total"] = time.perf_counter() - start
+        return answer, timings
+    finally:
+        _release(ticket, timings, start)
+
+
+async def answer_question_async(
+    question: str,
+    speculative: bool = SPECULATIVE,
+    tenant: Optional[str] = None,
+    trace: Optional[dict] = None
+) -> Tuple[str, Dict[str, float]]:
+    """
+    Concurrent pipeline. After embedding, anchor search runs alongside broadness
+    prediction and hop computation, since it does not depend on them. With
+    `speculative`, expansion also starts at the most likely hop count as soon as
+    anchors are in; if the predicted hop count differs, that expansion is
+    cancelled and restarted at the right depth. Admission control applies as in
+    `answer_question`; the speculative guess is capped the same way.
+
+    Returns the answer and per-stage timings, including `critical_path_saved`:
+    the sum of the retrieval stage durations minus the wall time they took.
+    """
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    ticket = _admit()
+    top_k = ticket.budget.anchors if ticket is not None else TOP_K
+    path_budget = ticket.budget.path_budget if ticket is not None else None
+    cancel = threading.Event()
+    spec_task = None
+    try:
+        query_emb, allowed_ids = await asyncio.gather(
+            asyncio.to_thread(_timed, timings, "embed", embedding_query, question),
+            asyncio.to_thread(_timed, timings, "entities", entity_candidates, question),
+        )
+
+        retrieval_start = time.perf_counter()
+        hops_task = asyncio.create_task(asyncio.to_thread(_timed, timings, "hops", predict_hops, query_emb, tenant))
+        anchors_task = asyncio.create_task(asyncio.to_thread(_timed, timings, "anchors", find_anchors, query_emb, top_k, allowed_ids, tenant))
+
+        guess = most_likely_hops()
+        if ticket is not None:
+            guess = min(guess, ticket.budget.max_hops)
+        if speculative:
+            anchors = await anchors_task
+            spec_task = asyncio.create_task(asyncio.to_thread(
+                _timed, timings, "speculative_expansion", expand_and_filter,
+                query_emb, anchors, guess, TOP_K * RERANK_POOL, cancel, allowed_ids, path_budget
+            ))
+
+        score, hops = await hops_task
+        print(f"Broadness score: {score:.2f}")
+        _recent_hops.append(hops)
+        if ticket is not None:
+            hops = ticket.cap_hops(hops)
+        print(f"Using {hops} hops for retrieval.")
+
+        filtered = None
+        if spec_task is not None:
+            if hops == guess:
+                filtered = await spec_task
+                timings["expansion"] = timings.pop("speculative_expansion")
+                timings["speculation_hit"] = 1.0
+            else:
+                cancel.set()
+                try:
+                    await spec_task
+                except ExpansionCancelled:
+                    pass
+                timings["speculation_hit"] = 0.0
+        if filtered is None:
+            anchors = await anchors_task
+            filtered = await asyncio.to_thread(
+                _timed, timings, "expansion", expand_and_filter, query_emb, anchors, hops, TOP_K * RERANK_POOL, None, allowed_ids, path_budget
+            )
+
+        retrieval_wall = time.perf_counter() - retrieval_start
+        sequential = timings["hops"] + timings["anchors"] + timings["expansion"]
+        timings["critical_path_saved"] = max(0.0, sequential - retrieval_wall)
+
+        reranked = await asyncio.to_thread(_timed, timings, "rerank", rerank_chunks_with_cohere, question, filtered, TOP_K)
+        if trace is not None:
+            trace.update(hops=hops, chains=reranked, budget=ticket.budget if ticket is not None else None)
+        answer = await asyncio.to_thread(_timed, timings, "answer", generate_answer_from_chunks, question, reranked)
+        timings["total"] = time.perf_counter() - start
+        print(f"Critical-path latency saved: {timings['critical_path_saved'] * 1000:.1f} ms")
+        return answer, timings
+    finally:
+        # Stops a speculative expansion left running if a stage raised, and collects
+        # its outcome so the thread is done (and its error retrieved) before returning
+        cancel.set()
+        if spec_task is not None:
+            with contextlib.suppress(Exception):
+                await spec_task
+        _release(ticket, timings, start)
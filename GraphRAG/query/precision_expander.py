@@ -1,7 +1,67 @@
-from typing import List, Tuple
+import heapq
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+import numpy as np
 from embedding_query import embedding_query
 from cosine_similarity import cosine_similarity
 
+def _precision_from_sum(q: np.ndarray, embedding_sum: np.ndarray, count: int) -> float:
+    # Compute the element-wise average of embeddings in the path
+    combined_embedding = embedding_sum / count
+    # Compute the average of combined path embedding and query embedding
+    averaged_embedding = (q + combined_embedding) / 2
+    # Compute cosine similarity
+    norm = float(np.linalg.norm(q) * np.linalg.norm(averaged_embedding))
+    return float(q @ averaged_embedding) / norm if norm else 0.0
+
+def chain_precision(query_embedding, embeddings_chain) -> float:
+    """
+    PPF precision of one chain: cosine between the query and the average of
+    the query with the element-wise mean of the chain's embeddings.
+    """
+    q = np.asarray(query_embedding, dtype=np.float32)
+    embeddings = np.asarray(embeddings_chain, dtype=np.float32)
+    return _precision_from_sum(q, embeddings.sum(axis=0), len(embeddings))
+
+def chain_key(ids_chain) -> tuple:
+    """
+    Canonical form of a chain: its chunk ids as a sorted multiset. Chains with
+    the same key (e.g. the same chunks reached from another anchor or walked in
+    reverse) carry the same content and have the same PPF precision.
+    """
+    return tuple(sorted(ids_chain))
+
+class PrefixSumScorer:
+    """
+    PPF scoring over an expansion trie. Paths from one anchor arrive in DFS
+    order and share prefixes, so running embedding sums are kept on a stack
+    that is only unwound to where the next path diverges from the previous
+    one. Each distinct trie node is added once and each leaf costs O(dim),
+    instead of re-averaging every path from scratch.
+    """
+
+    def __init__(self, query_embedding):
+        self.q = np.asarray(query_embedding, dtype=np.float32)
+        self.prefix: List = []
+        self.sums: List[np.ndarray] = []
+        self.trie_nodes = 0
+        self.path_nodes = 0
+
+    def score(self, path: List, embedding_at: Callable[[int], np.ndarray]) -> float:
+        """Precision of `path`; `embedding_at(i)` is only called for nodes past the shared prefix."""
+        common = 0
+        limit = min(len(self.prefix), len(path))
+        while common < limit and self.prefix[common] == path[common]:
+            common += 1
+        del self.prefix[common:]
+        del self.sums[common:]
+        for i in range(common, len(path)):
+            embedding = np.asarray(embedding_at(i), dtype=np.float32)
+            self.sums.append(self.sums[-1] + embedding if self.sums else embedding)
+            self.prefix.append(path[i])
+        self.trie_nodes += len(path) - common
+        self.path_nodes += len(path)
+        return _precision_from_sum(self.q, self.sums[-1], len(path))
+
 def process_paths_for_ppf(
     query_embedding: List[float],
     paths: List[Tuple[List[str], List[str], List[List[float]]]]
@@ -9,20 +69,7 @@ def process_paths_for_ppf(
     enriched_chains = []
 
     for ids_chain, contents_chain, embeddings_chain in paths:
-        #Compute the element-wise average of embeddings in the path
-        combined_embedding = [
-            sum(values) / len(values)
-            for values in zip(*embeddings_chain)
-        ]
-
-        #Compute the average of combined path embedding and query embedding
-        averaged_embedding = [
-            (q + c) / 2
-            for q, c in zip(query_embedding, combined_embedding)
-        ]
-
-        # Compute cosine similarity
-        precision = cosine_similarity(query_embedding, averaged_embedding)
+        precision = chain_precision(query_embedding, embeddings_chain)
 
         # Append the structured enriched chain
         enriched_chains.append((ids_chain, contents_chain, precision))
@@ -30,21 +77,132 @@ def process_paths_for_ppf(
     print(f"\nProcessed {len(enriched_chains)} enriched chains with computed precision using query+path averaging.")
     return enriched_chains
 
+def iter_paths_for_ppf(
+    query_embedding: List[float],
+    paths: Iterable[Tuple[List[str], List[str], List[List[float]]]]
+) -> Iterator[Tuple[List[str], List[str], float]]:
+    """
+    Streaming form of process_paths_for_ppf: scores each path as it arrives
+    without building the enriched list.
+    """
+    try:
+        for ids_chain, contents_chain, embeddings_chain in paths:
+            yield ids_chain, contents_chain, chain_precision(query_embedding, embeddings_chain)
+    finally:
+        if hasattr(paths, "close"):
+            paths.close()
+
+def iter_paths_for_ppf_prefix(
+    query_embedding: List[float],
+    paths: Iterable[Tuple[List[str], List[str], List[List[float]]]]
+) -> Iterator[Tuple[List[str], List[str], float]]:
+    """
+    Prefix-sharing form of iter_paths_for_ppf (see PrefixSumScorer). Duplicate
+    chains, by chain_key, are dropped before scoring, so they never reach
+    filtering or reranking.
+    """
+    scorer = PrefixSumScorer(query_embedding)
+    seen = set()
+    duplicates = 0
+    try:
+        for ids_chain, contents_chain, embeddings_chain in paths:
+            key = chain_key(ids_chain)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            yield ids_chain, contents_chain, scorer.score(ids_chain, embeddings_chain.__getitem__)
+    finally:
+        if hasattr(paths, "close"):
+            paths.close()
+        print(f"\nPrefix scoring: {len(seen)} chains, {scorer.trie_nodes} trie nodes for "
+              f"{scorer.path_nodes} path nodes, {duplicates} duplicate chains dropped.")
+
+def stream_filter_by_precision(
+    chains: Iterable[tuple],
+    threshold: float = 0.8,
+    top_n: int = 5,
+    early_stop: bool = False
+) -> List[tuple]:
+    """
+    Bounded-memory form of filter_by_precision for a stream of scored chains,
+    with the same result. Keeps the best `top_n` chains seen in a min-heap and
+    returns those that pass `threshold`, falling back to the best `top_n`
+    overall if none pass.
+    With `early_stop`, consumption stops as soon as `top_n` chains have passed
+    the threshold, which also closes the upstream path cursor. The result is
+    then the first `top_n` passing chains in stream order, not the best ones.
+    """
+    if top_n <= 0:
+        return []
+    heap: List[tuple] = []
+    seen = 0
+    passed = 0
+    for chain in chains:
+        seen += 1
+        # seq breaks precision ties so chains themselves are never compared
+        entry = (chain[2], -seen, chain)
+        if len(heap) < top_n:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+        if chain[2] >= threshold:
+            passed += 1
+            if early_stop and passed >= top_n:
+                break
+    if early_stop and hasattr(chains, "close"):
+        chains.close()
+
+    best = [entry[2] for entry in sorted(heap, reverse=True)]
+    filtered = [chain for chain in best if chain[2] >= threshold]
+    print(f"\nStreamed {seen} chains, {passed} above threshold {threshold}.")
+    return filtered if filtered else best
+
 def filter_by_precision(chains: List[tuple], threshold: float = 0.8, top_n: int = 5) -> List[tuple]:
     """
-    Filter structured chains by precision threshold, fallback to top-N if none pass.
+    Filter structured chains by precision threshold, keeping the best top-N by
+    precision; fallback to top-N if none pass.
     Each item in `chains`:
         (List[str] ids_chain, List[str] contents_chain, float precision)
     """
-    filtered = [chain for chain in chains if chain[2] >= threshold]
+    chains_sorted = sorted(chains, key=lambda x: x[2], reverse=True)
+    filtered = [chain for chain in chains_sorted if chain[2] >= threshold]
 
     if not filtered:
         # fallback to top-N
-        chains_sorted = sorted(chains, key=lambda x: x[2], reverse=True)
         return chains_sorted[:top_n]
 
     return filtered[:top_n]
 
+def rescore_with_full_precision(
+    query_embedding: List[float],
+    chains: List[tuple],
+    full_embeddings: Dict[str, List[float]],
+    top_n: int = 5
+) -> List[tuple]:
+    """
+    Recompute precision for chains that were scored on quantized embeddings,
+    using full-precision vectors keyed by chunk id, and keep the best `top_n`.
+    """
+    rescored = []
+    for ids_chain, contents_chain, precision in chains:
+        if all(chunk_id in full_embeddings for chunk_id in ids_chain):
+            precision = chain_precision(query_embedding, [full_embeddings[chunk_id] for chunk_id in ids_chain])
+        rescored.append((ids_chain, contents_chain, precision))
+
+    rescored.sort(key=lambda x: x[2], reverse=True)
+    return rescored[:top_n]
+
+def attach_chain_contents(chains: List[tuple], contents_by_id: Dict[str, str]) -> List[tuple]:
+    """
+    Fill in contents_chain for chains scored in two-phase mode, where phase one
+    transferred only ids and embeddings.
+    """
+    return [
+        (ids_chain, [contents_by_id.get(chunk_id, "") for chunk_id in ids_chain], precision)
+        for ids_chain, _, precision in chains
+    ]
+
 def build_llm_context_from_chains(filtered_chains: List[tuple]) -> str:
     """
     Build LLM-ready context from filtered chains.
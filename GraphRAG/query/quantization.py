@@ -0,0 +1,118 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# "none" keeps full-precision vectors only; "float16" and "int8" store a compact
+# copy alongside the full vector and score on it, reranking survivors at full precision.
+EMBEDDING_QUANT = os.getenv("EMBEDDING_QUANT", "none").lower()
+QUANT_MODES = ("none", "float16", "int8")
+QUANT_BLOCK_ROWS = 4096
+
+
+def _check_mode(mode: str) -> str:
+    if mode not in QUANT_MODES:
+        raise ValueError(f"Unknown embedding quantization mode {mode!r}, expected one of {QUANT_MODES}")
+    return mode
+
+
+def bytes_per_vector(mode: str, dim: int) -> int:
+    """Storage cost of one embedding, including the int8 scale factor."""
+    _check_mode(mode)
+    if mode == "float16":
+        return 2 * dim
+    if mode == "int8":
+        return dim + 4
+    return 4 * dim
+
+
+def quantize_matrix(matrix, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Quantize a [N, D] matrix. Returns (codes, scales); scales is None unless
+    mode is int8, where each row is scaled independently by max|x| / 127.
+    """
+    _check_mode(mode)
+    mat = np.asarray(matrix, dtype=np.float32)
+    if mode == "float16":
+        return mat.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(mat).max(axis=-1) / 127.0
+        scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(mat / scales[..., None]), -127, 127).astype(np.int8)
+        return codes, scales
+    return mat, None
+
+
+def dequantize_matrix(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """Inverse of quantize_matrix, returning float32."""
+    out = np.asarray(codes).astype(np.float32)
+    if scales is not None:
+        out *= np.asarray(scales, dtype=np.float32)[..., None]
+    return out
+
+
+def quantize_embedding(embedding: Sequence[float], mode: str) -> Tuple[bytes, float]:
+    """
+    Quantize one vector into (raw bytes, scale) for storage as a Neo4j byte[] property.
+    Neo4j keeps float lists as float64, so the bytes form is 4x / 8x smaller on the wire.
+    """
+    codes, scales = quantize_matrix(np.asarray(embedding, dtype=np.float32)[None, :], mode)
+    scale = float(scales[0]) if scales is not None else 1.0
+    return codes[0].tobytes(), scale
+
+
+def dequantize_embedding(blob: bytes, scale: float, mode: str) -> np.ndarray:
+    """Inverse of quantize_embedding."""
+    _check_mode(mode)
+    if mode == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if mode == "int8":
+        return np.frombuffer(blob, dtype=np.int8).astype(np.float32) * np.float32(scale)
+    return np.frombuffer(blob, dtype=np.float32).copy()
+
+
+def row_norms(codes: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """L2 norm of every dequantized row, computed block by block."""
+    norms = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], QUANT_BLOCK_ROWS):
+        block = codes[start:start + QUANT_BLOCK_ROWS].astype(np.float32)
+        norms[start:start + len(block)] = np.linalg.norm(block, axis=1)
+    if scales is not None:
+        norms *= scales
+    return norms
+
+
+def quantized_cosine(codes: np.ndarray, scales: Optional[np.ndarray], norms: np.ndarray, query) -> np.ndarray:
+    """
+    Cosine similarity of `query` against every row of a quantized matrix without
+    dequantizing it: int8 rows are dotted as-is and rescaled by their per-row scale.
+    `norms` are the L2 norms of the dequantized rows. Rows are widened to float32
+    block by block, so the transient footprint stays at QUANT_BLOCK_ROWS rows.
+    """
+    q = np.asarray(query, dtype=np.float32)
+    dots = np.empty(codes.shape[0], dtype=np.float32)
+    for start in range(0, codes.shape[0], QUANT_BLOCK_ROWS):
+        block = codes[start:start + QUANT_BLOCK_ROWS]
+        dots[start:start + len(block)] = block.astype(np.float32) @ q
+    if scales is not None:
+        dots *= scales
+    q_norm = float(np.linalg.norm(q)) or 1.0
+    return dots / (np.where(norms > 0, norms, 1.0) * q_norm)
+
+
+def embeddings_from_records(
+    values: List,
+    scales: List[float],
+    mode: str,
+    fallbacks: Optional[List] = None
+) -> List[np.ndarray]:
+    """
+    Decode the per-node `embedding_q` / `embedding_scale` lists returned by a path
+    query. A node without a compact copy (null `embedding_q`) uses its entry in
+    `fallbacks`, the full-precision embedding.
+    """
+    fallbacks = fallbacks if fallbacks is not None else [None] * len(values)
+    return [
+        dequantize_embedding(v, s, mode) if v is not None else np.asarray(full, dtype=np.float32)
+        for v, s, full in zip(values, scales, fallbacks)
+    ]
@@ -1,59 +1,183 @@
+import hashlib
 import os
-import sys
-from neo4j import GraphDatabase
-from typing import List, Tuple
-from openai import OpenAI
-import math
-import cohere
-import joblib
-from pathlib import Path
-
-from Secret.secret import (
-    NEO4J_URI_secret,
-    NEO4J_USER_secret,
-    NEO4J_PASS_secret,
-    OPENAI_API_KEY_secret,
-    COHERE_API_KEY_secret
-)
-
-NEO4J_URI = os.getenv("NEO4J_URI", NEO4J_URI_secret)
-NEO4J_USER = os.getenv("NEO4J_USER", NEO4J_USER_secret)
-NEO4J_PASS = os.getenv("NEO4J_PASS", NEO4J_PASS_secret)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", OPENAI_API_KEY_secret)
-COHERE_API_KEY = os.getenv("COHERE_API_KEY", COHERE_API_KEY_secret)
-MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
-SIMILAR_K = int(os.getenv("SIMILAR_K", 3))
-client = OpenAI(api_key=OPENAI_API_KEY)
-cohere_client = cohere.Client(COHERE_API_KEY)
-EMBEDDING_DIM = 1536
-SYSTEM_MAX_HOPS = 10
-TOP_K = 5 
-
-def rerank_chunks_with_cohere(question: str, top_chunks: List[Tuple[str, str, float]], top_n: int = 5) -> List[Tuple[str, str, float]]:
-    documents = [
-    {"id": f"{i}", "text": "\n\n".join(chunk[1])}
-    for i, chunk in enumerate(top_chunks)
-]
-
-    try:
-        response = cohere_client.rerank(
-            query=question,
-            documents=documents,
-            model="rerank-english-v3.0",
-            top_n=top_n
-        )
-        reranked_chunks = []
-        for result in response.results:
-            idx = result.index 
-            reranked_chunks.append((
-                top_chunks[idx][0], 
-                top_chunks[idx][1],
-                result.relevance_score
-            ))
-            print("\nChunks passed to Cohere reranker:")
-            for cid, _, sim in top_chunks:
-                print(f"{cid} with similarity {sim:.4f}")
-        return reranked_chunks
-    except Exception as e:
-        print(f"Error during Cohere rerank: {e}")
-        return top_chunks[:top_n]
\ No newline at end of file
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import get_cohere_client
+
+RERANK_MODEL = "rerank-english-v3.0"
+# Scoring backend: "cohere", or "local" for the offline stand-in
+RERANK_BACKEND = os.getenv("RERANK_BACKEND", "cohere")
+# How chunk scores combine into a chain score: max | mean | weighted
+RERANK_AGGREGATION = os.getenv("RERANK_AGGREGATION", "max")
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 10000))
+
+
+class RerankCache:
+    """
+    LRU map of (query hash, chunk id) -> relevance score. Shared by concurrent
+    queries, so every access holds a lock.
+    """
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE):
+        self.max_size = max_size
+        self.scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self.scores.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self.scores.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: Tuple[str, str], score: float):
+        with self._lock:
+            self.scores[key] = score
+            self.scores.move_to_end(key)
+            while len(self.scores) > self.max_size:
+                self.scores.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.scores.clear()
+            self.hits = self.misses = 0
+
+
+_cache = RerankCache()
+
+
+def query_hash(question: str, backend: str = RERANK_BACKEND) -> str:
+    """Cache key for a question; includes the backend and model, whose scores are not interchangeable."""
+    normalized = " ".join(question.lower().split())
+    return hashlib.sha1(f"{backend}:{RERANK_MODEL}:{normalized}".encode("utf-8")).hexdigest()
+
+
+# === BACKENDS ===
+def cohere_scores(question: str, texts: List[str]) -> List[float]:
+    """Relevance of each text to the question from the Cohere rerank endpoint, in input order."""
+    response = get_cohere_client().rerank(
+        query=question,
+        documents=texts,
+        model=RERANK_MODEL,
+        top_n=len(texts)
+    )
+    scores = [0.0] * len(texts)
+    for result in response.results:
+        scores[result.index] = result.relevance_score
+    return scores
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def local_scores(question: str, texts: List[str]) -> List[float]:
+    """
+    Offline stand-in for a cross-encoder: scores each (question, text) pair
+    jointly by the share of question terms the text covers, with a mild
+    penalty for long texts. Deterministic, so tests can assert on the order.
+    """
+    query_terms = set(_TOKEN.findall(question.lower()))
+    if not query_terms:
+        return [0.0] * len(texts)
+    scores = []
+    for text in texts:
+        tokens = _TOKEN.findall((text or "").lower())
+        coverage = len(query_terms & set(tokens)) / len(query_terms)
+        scores.append(coverage / (1.0 + len(tokens) / 1000.0))
+    return scores
+
+
+RERANK_BACKENDS: Dict[str, Callable[[str, List[str]], List[float]]] = {
+    "cohere": cohere_scores,
+    "local": local_scores,
+}
+
+
+# === AGGREGATION ===
+def aggregate_chain_score(chunk_scores: List[float], aggregation: str = RERANK_AGGREGATION) -> float:
+    """
+    Combine per-chunk scores of one chain: `max` (the best chunk), `mean`, or
+    `weighted`, a mean that weights the chunk at hop i by 1 / (i + 1) so the
+    anchor, matched directly against the query, counts most.
+    """
+    if not chunk_scores:
+        return 0.0
+    if aggregation == "max":
+        return max(chunk_scores)
+    if aggregation == "mean":
+        return sum(chunk_scores) / len(chunk_scores)
+    if aggregation == "weighted":
+        weights = [1.0 / (i + 1) for i in range(len(chunk_scores))]
+        return sum(w * s for w, s in zip(weights, chunk_scores)) / sum(weights)
+    raise ValueError(f"Unknown rerank aggregation {aggregation!r}")
+
+
+def rerank_chunks_with_cohere(
+    question: str,
+    top_chunks: List[Tuple[str, str, float]],
+    top_n: int = 5,
+    aggregation: str = RERANK_AGGREGATION,
+    backend: str = RERANK_BACKEND,
+    cache: RerankCache = _cache
+) -> List[Tuple[str, str, float]]:
+    """
+    Rerank chains at chunk level: every unique chunk across the chains is
+    scored once (and only if not already cached for this question), then
+    chunk scores are aggregated back to a score per chain. Chains come back as
+    (ids_chain, contents_chain, rerank score), best `top_n` first.
+
+    With no more than `top_n` chains there is nothing to cut, so the chains are
+    returned in their PPF order without calling the reranker.
+    """
+    if len(top_chunks) <= top_n:
+        print(f"\nSkipping rerank: {len(top_chunks)} chains <= top_n={top_n}.")
+        return list(top_chunks)
+
+    print("\nChains passed to reranker:")
+    for ids_chain, _, sim in top_chunks:
+        print(f"{ids_chain} with similarity {sim:.4f}")
+
+    texts: Dict[str, str] = {}
+    for ids_chain, contents_chain, _ in top_chunks:
+        for chunk_id, content in zip(ids_chain, contents_chain):
+            texts.setdefault(chunk_id, content)
+
+    key = query_hash(question, backend)
+    scores: Dict[str, float] = {}
+    missing = []
+    for chunk_id in texts:
+        score = cache.get((key, chunk_id))
+        if score is None:
+            missing.append(chunk_id)
+        else:
+            scores[chunk_id] = score
+
+    if missing:
+        try:
+            fresh = RERANK_BACKENDS[backend](question, [texts[chunk_id] for chunk_id in missing])
+        except Exception as e:
+            print(f"Error during {backend} rerank: {e}")
+            return top_chunks[:top_n]
+        for chunk_id, score in zip(missing, fresh):
+            scores[chunk_id] = score
+            cache.put((key, chunk_id), score)
+
+    reranked = [
+        (ids_chain, contents_chain, aggregate_chain_score([scores[c] for c in ids_chain], aggregation))
+        for ids_chain, contents_chain, _ in top_chunks
+    ]
+    reranked.sort(key=lambda chain: chain[2], reverse=True)
+    print(f"Reranked {len(top_chunks)} chains from {len(texts)} unique chunks "
+          f"({len(texts) - len(missing)} cached, {len(missing)} scored by {backend}).")
+    return reranked[:top_n]
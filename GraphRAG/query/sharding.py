@@ -0,0 +1,331 @@
+import heapq
+import json
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from compute_max_hops import get_graph_defined_max_hops
+from config import NEO4J_USER, NEO4J_PASS
+from graph_snapshot import GraphSnapshot, graph_max_hops
+from precision_expander import iter_paths_for_ppf, iter_paths_for_ppf_prefix
+from quantization import EMBEDDING_QUANT
+from top_k import (
+    find_anchors_precise,
+    iter_anchor_paths_precise,
+    fetch_chunk_contents,
+    fetch_full_embeddings,
+)
+
+# Chunk nodes are partitioned across shards by source document at ingest,
+# optionally restricted to the tenants a shard serves. SIMILAR_TO edges never
+# cross shards: run `entity_linker.py --similar` once per Neo4j shard (with
+# NEO4J_URI pointing at it). Queries fan anchor search and expansion out to the
+# shards in parallel and merge their top chains.
+#
+# PPF_SHARDS points at a JSON file such as
+#   {"shards": [
+#       {"name": "a", "uri": "neo4j://db-a:7687", "tenants": ["scifact"]},
+#       {"name": "b", "uri": "neo4j://db-b:7687"},
+#       {"name": "local", "snapshot": "../snapshots/local"}
+#   ]}
+# Shards without "tenants" are shared: they take documents of any tenant that
+# has no dedicated shard.
+SHARDS_CONFIG = os.getenv("PPF_SHARDS")
+
+# (anchor, score) pairs; the anchor itself is whatever the shard's backend uses
+ShardAnchors = List[Tuple[object, float]]
+
+
+# === SHARD BACKENDS ===
+class Neo4jShard:
+    """A shard living in its own Neo4j database, queried with the top_k Cypher."""
+
+    quantized = EMBEDDING_QUANT != "none"
+
+    def __init__(self, name: str, uri: str, user: str = NEO4J_USER, password: str = NEO4J_PASS, tenants: Iterable[str] = ()):
+        self.name = name
+        self.uri = uri
+        self.auth = (user, password)
+        self.tenants: Set[str] = set(tenants or ())
+
+    @cached_property
+    def driver(self):
+        from neo4j import GraphDatabase
+        return GraphDatabase.driver(self.uri, auth=self.auth)
+
+    def find_anchors(self, query_embedding, k: int, allowed_ids=None, with_content: bool = True) -> ShardAnchors:
+        records = find_anchors_precise(query_embedding, k, with_content, allowed_ids, driver=self.driver)
+        return [(record, record["score"]) for record in records]
+
+    def iter_paths(self, anchors: ShardAnchors, hops: int, allowed_ids=None, with_content: bool = True) -> Iterator[tuple]:
+        return iter_anchor_paths_precise([a for a, _ in anchors], hops, with_content, allowed_ids, driver=self.driver)
+
+    def full_embeddings(self, ids: List[str]) -> Dict[str, List[float]]:
+        return fetch_full_embeddings(ids, driver=self.driver)
+
+    def fetch_contents(self, ids: List[str]) -> Dict[str, str]:
+        return fetch_chunk_contents(ids, driver=self.driver)
+
+    def graph_max_hops(self) -> int:
+        return get_graph_defined_max_hops(driver=self.driver)
+
+
+class SnapshotShard:
+    """A shard served in-process from a graph snapshot directory."""
+
+    def __init__(self, name: str, snapshot_dir: str, tenants: Iterable[str] = ()):
+        self.name = name
+        self.tenants: Set[str] = set(tenants or ())
+        self.snapshot = GraphSnapshot(snapshot_dir)
+        self.quantized = self.snapshot.embedding_quant != "none"
+
+    def find_anchors(self, query_embedding, k: int, allowed_ids=None, with_content: bool = True) -> ShardAnchors:
+        return self.snapshot.find_anchors(query_embedding, k, self.snapshot.allowed_mask(allowed_ids))
+
+    def iter_paths(self, anchors: ShardAnchors, hops: int, allowed_ids=None, with_content: bool = True) -> Iterator[tuple]:
+        mask = self.snapshot.allowed_mask(allowed_ids)
+        for anchor, _ in anchors:
+            for path in self.snapshot.iter_anchor_paths(anchor, hops, mask):
+                yield self.snapshot.path_tuple(path, with_content)
+
+    def full_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        return self.snapshot.full_embeddings(ids)
+
+    def fetch_contents(self, ids: List[str]) -> Dict[str, str]:
+        return self.snapshot.fetch_contents(ids)
+
+    def graph_max_hops(self) -> int:
+        return self.snapshot.graph_max_hops
+
+
+class InMemoryShard:
+    """
+    Dict-backed stand-in for a shard, for local runs and tests. Accepts writes
+    (add_chunks / add_edge) so ingest routing can be exercised without Neo4j.
+    """
+
+    quantized = False
+
+    def __init__(self, name: str, tenants: Iterable[str] = ()):
+        self.name = name
+        self.tenants: Set[str] = set(tenants or ())
+        self.contents: Dict[str, str] = {}
+        self.embeddings: Dict[str, np.ndarray] = {}
+        self.edges: Dict[str, List[Tuple[str, float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.contents)
+
+    def add_chunks(self, rows: Iterable[Tuple[str, str, List[float]]]):
+        """Add (chunk_id, content, embedding) rows."""
+        for chunk_id, content, embedding in rows:
+            self.contents[chunk_id] = content
+            self.embeddings[chunk_id] = np.asarray(embedding, dtype=np.float32)
+
+    def add_edge(self, id_a: str, id_b: str, score: float):
+        """Add a directed SIMILAR_TO edge between two chunks of this shard."""
+        self.edges.setdefault(id_a, []).append((id_b, score))
+
+    def find_anchors(self, query_embedding, k: int, allowed_ids=None, with_content: bool = True) -> ShardAnchors:
+        ids = [c for c in self.embeddings if allowed_ids is None or c in allowed_ids]
+        if not ids or k <= 0:
+            return []
+        matrix = np.stack([self.embeddings[c] for c in ids])
+        q = np.asarray(query_embedding, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(q)
+        sims = np.divide(matrix @ q, norms, out=np.zeros(len(ids), dtype=np.float32), where=norms > 0)
+        return [(ids[i], float(sims[i])) for i in np.argsort(-sims)[:k]]
+
+    def iter_paths(self, anchors: ShardAnchors, hops: int, allowed_ids=None, with_content: bool = True) -> Iterator[tuple]:
+        for anchor, _ in anchors:
+            for path in self._walk([anchor], set(), hops, allowed_ids):
+                yield (
+                    path,
+                    [self.contents[c] for c in path] if with_content else None,
+                    [self.embeddings[c] for c in path],
+                )
+
+    def _walk(self, path: List[str], used: Set[Tuple[str, int]], hops: int, allowed_ids) -> Iterator[List[str]]:
+        # Edge-unique like Cypher's variable-length match: nodes may repeat, edges may not
+        if len(path) - 1 == hops:
+            yield list(path)
+            return
+        for position, (nxt, _) in enumerate(self.edges.get(path[-1], [])):
+            edge = (path[-1], position)
+            if edge in used or (allowed_ids is not None and nxt not in allowed_ids):
+                continue
+            used.add(edge)
+            path.append(nxt)
+            yield from self._walk(path, used, hops, allowed_ids)
+            path.pop()
+            used.discard(edge)
+
+    def full_embeddings(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        return {c: self.embeddings[c] for c in ids if c in self.embeddings}
+
+    def fetch_contents(self, ids: List[str]) -> Dict[str, str]:
+        return {c: self.contents[c] for c in dict.fromkeys(ids) if c in self.contents}
+
+    def graph_max_hops(self) -> int:
+        ids = list(dict.fromkeys([*self.contents, *(t for targets in self.edges.values() for t, _ in targets)]))
+        index_of = {c: i for i, c in enumerate(ids)}
+        indptr = np.cumsum([0] + [len(self.edges.get(c, ())) for c in ids])
+        indices = [index_of[t] for c in ids for t, _ in self.edges.get(c, ())]
+        return graph_max_hops(indptr, indices)
+
+
+# === ROUTING AND FAN-OUT ===
+class ShardRouter:
+    """Routes documents to shards at ingest and fans queries out across them."""
+
+    def __init__(self, shards: List):
+        self.shards = list(shards)
+        self.by_name = {shard.name: shard for shard in self.shards}
+        if len(self.by_name) != len(self.shards):
+            raise ValueError("Shard names must be unique.")
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    @property
+    def quantized(self) -> bool:
+        return any(shard.quantized for shard in self.shards)
+
+    def shards_for(self, tenant: Optional[str] = None) -> List:
+        """
+        Shards that can hold a tenant's documents: those dedicated to it, or the
+        shared shards if none is. Without a tenant every shard is searched.
+        """
+        if tenant is None:
+            return list(self.shards)
+        dedicated = [shard for shard in self.shards if tenant in shard.tenants]
+        return dedicated or [shard for shard in self.shards if not shard.tenants]
+
+    def shard_for_source(self, source: str, tenant: Optional[str] = None):
+        """
+        Ingest-time placement: a stable hash of the source document picks one of
+        the tenant's shards, so all chunks of a document land together.
+        """
+        if tenant is None:
+            candidates = [shard for shard in self.shards if not shard.tenants] or self.shards
+        else:
+            candidates = self.shards_for(tenant)
+        if not candidates:
+            raise ValueError(f"No shard accepts documents for tenant {tenant!r}.")
+        return candidates[zlib.crc32(source.encode("utf-8")) % len(candidates)]
+
+    def graph_max_hops(self, tenant: Optional[str] = None) -> int:
+        """
+        Max hops over the shards routed for `tenant`. SIMILAR_TO edges never
+        cross shards, so no path is longer than the longest within one shard.
+        """
+        return max(self._fan_out(lambda shard: shard.graph_max_hops(), self.shards_for(tenant)), default=3)
+
+    def _fan_out(self, fn: Callable, shards: List) -> List:
+        if len(shards) <= 1:
+            return [fn(shard) for shard in shards]
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            return list(pool.map(fn, shards))
+
+    def find_anchors(
+        self,
+        query_embedding,
+        k: int,
+        tenant: Optional[str] = None,
+        allowed_ids: Optional[Set[str]] = None,
+        with_content: bool = True
+    ) -> Dict[str, ShardAnchors]:
+        """
+        Run anchor search on every shard routed for `tenant` in parallel and keep
+        the global top-k, grouped by shard name. Shards left without an anchor
+        are dropped, so expansion only touches shards that matter.
+        """
+        shards = self.shards_for(tenant)
+        results = self._fan_out(lambda shard: shard.find_anchors(query_embedding, k, allowed_ids, with_content), shards)
+        ranked = heapq.nlargest(
+            k,
+            ((score, shard.name, anchor) for shard, anchors in zip(shards, results) for anchor, score in anchors),
+            key=lambda entry: entry[0]
+        )
+        by_shard: Dict[str, ShardAnchors] = {}
+        for score, name, anchor in ranked:
+            by_shard.setdefault(name, []).append((anchor, score))
+        return by_shard
+
+    def expand(
+        self,
+        query_embedding,
+        anchors: Dict[str, ShardAnchors],
+        hops: int,
+        top_n: int,
+        allowed_ids: Optional[Set[str]] = None,
+        with_content: bool = True,
+        wrap_paths: Optional[Callable[[Iterator[tuple]], Iterator[tuple]]] = None,
+        prefix_scoring: bool = False
+    ) -> List[tuple]:
+        """
+        Expand each shard's anchors in parallel, score the paths with PPF on the
+        shard's worker and keep its best `top_n` chains. Returns the merged
+        chains, best first, ready for filter_by_precision. Since every chain of
+        the global top-n is in its own shard's top-n, nothing is lost by merging.
+        `wrap_paths` is applied to each shard's path stream (e.g. for cancellation).
+        With `prefix_scoring` paths are scored with iter_paths_for_ppf_prefix.
+        """
+        score_paths = iter_paths_for_ppf_prefix if prefix_scoring else iter_paths_for_ppf
+
+        def expand_shard(name: str) -> List[tuple]:
+            paths = self.by_name[name].iter_paths(anchors[name], hops, allowed_ids, with_content)
+            if wrap_paths is not None:
+                paths = wrap_paths(paths)
+            return heapq.nlargest(top_n, score_paths(query_embedding, paths), key=lambda chain: chain[2])
+
+        per_shard = self._fan_out(expand_shard, list(anchors))
+        merged = sorted((chain for chains in per_shard for chain in chains), key=lambda chain: chain[2], reverse=True)
+        print(f"Merged {len(merged)} chains from {len(per_shard)} shards.")
+        return merged
+
+    def _merge_lookup(self, method: str, ids: List[str], shard_names: Optional[List[str]]) -> dict:
+        shards = [self.by_name[name] for name in shard_names] if shard_names is not None else self.shards
+        merged: dict = {}
+        for found in self._fan_out(lambda shard: getattr(shard, method)(ids), shards):
+            merged.update(found)
+        return merged
+
+    def full_embeddings(self, ids: List[str], shard_names: Optional[List[str]] = None) -> Dict[str, List[float]]:
+        return self._merge_lookup("full_embeddings", ids, shard_names)
+
+    def fetch_contents(self, ids: List[str], shard_names: Optional[List[str]] = None) -> Dict[str, str]:
+        return self._merge_lookup("fetch_contents", ids, shard_names)
+
+
+def load_shard_router(config_path: str) -> ShardRouter:
+    """Build a router from a PPF_SHARDS-style JSON file."""
+    with open(config_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    shards = []
+    for entry in spec["shards"]:
+        tenants = entry.get("tenants", ())
+        if "snapshot" in entry:
+            shards.append(SnapshotShard(entry["name"], entry["snapshot"], tenants))
+        elif "uri" in entry:
+            shards.append(Neo4jShard(
+                entry["name"], entry["uri"], entry.get("user", NEO4J_USER), entry.get("password", NEO4J_PASS), tenants
+            ))
+        else:
+            raise ValueError(f"Shard {entry.get('name')!r} needs a 'uri' or a 'snapshot'.")
+    print(f"✅ Loaded {len(shards)} shards from {config_path}.")
+    return ShardRouter(shards)
+
+
+@lru_cache(maxsize=None)
+def get_shard_router() -> Optional[ShardRouter]:
+    """The configured router, or None when PPF_SHARDS is unset (single database)."""
+    return load_shard_router(SHARDS_CONFIG) if SHARDS_CONFIG else None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=get_shard_router.cache_clear)
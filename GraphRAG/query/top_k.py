@@ -1,94 +1,191 @@
-import os
-import sys
-from neo4j import GraphDatabase
-from typing import List, Tuple
-from openai import OpenAI
-import math
-import cohere
-import joblib
-from pathlib import Path
-import numpy as np
-from cosine_similarity import cosine_similarity
-
-from Secret.secret import (
-    NEO4J_URI_secret,
-    NEO4J_USER_secret,
-    NEO4J_PASS_secret,
-    OPENAI_API_KEY_secret,
-    COHERE_API_KEY_secret
-)
-
-NEO4J_URI = os.getenv("NEO4J_URI", NEO4J_URI_secret)
-NEO4J_USER = os.getenv("NEO4J_USER", NEO4J_USER_secret)
-NEO4J_PASS = os.getenv("NEO4J_PASS", NEO4J_PASS_secret)
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", OPENAI_API_KEY_secret)
-COHERE_API_KEY = os.getenv("COHERE_API_KEY", COHERE_API_KEY_secret)
-MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
-SIMILAR_K = int(os.getenv("SIMILAR_K", 3))
-client = OpenAI(api_key=OPENAI_API_KEY)
-cohere_client = cohere.Client(COHERE_API_KEY)
-EMBEDDING_DIM = 1536
-SYSTEM_MAX_HOPS = 10
-TOP_K = 5 
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from quantization import EMBEDDING_QUANT, embeddings_from_records
 
-def get_top_k_paths_precise(
+from config import get_neo4j_driver
+
+# In quantized mode the path query returns the compact byte[] copy of each
+# embedding instead of the float64 list, which is what dominates the payload.
+# Chunks without a compact copy (ingested after the backfill) send the float list.
+if EMBEDDING_QUANT != "none":
+    ANCHOR_EMBEDDING_PROJECTION = (
+        "node.embedding_q AS embedding, node.embedding_scale AS embedding_scale, "
+        "CASE WHEN node.embedding_q IS NULL THEN node.embedding END AS embedding_full"
+    )
+    EMBEDDINGS_PROJECTION = (
+        "[n IN path_nodes | n.embedding_q] AS embeddings, "
+        "[n IN path_nodes | n.embedding_scale] AS embedding_scales, "
+        "[n IN path_nodes | CASE WHEN n.embedding_q IS NULL THEN n.embedding END] AS embeddings_full"
+    )
+else:
+    ANCHOR_EMBEDDING_PROJECTION = "node.embedding AS embedding"
+    EMBEDDINGS_PROJECTION = "[n IN path_nodes | n.embedding] AS embeddings"
+
+def find_anchors_precise(
     query_embedding: List[float],
     k: int,
-    hops: int
-) -> List[Tuple[List[str], List[str]]]:
+    with_content: bool = True,
+    allowed_ids: Optional[Set[str]] = None,
+    driver=None
+) -> List[dict]:
     """
-    Retrieve top-k anchors by vector similarity, then for each anchor,
-    find all possible paths with exactly `hops` expansions,
-    returning structured paths (ids_chain, contents_chain) for PPF enrichment.
-    """
-    paths = []
+    Retrieve top-k anchors by vector similarity. Each anchor is a plain dict
+    (element_id, id, content, embedding[, embedding_scale], score), so anchor
+    search can run independently of path expansion.
 
-    with GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS)) as driver:
-        with driver.session() as session:
-            # Retrieve top-k anchors
+    With `allowed_ids` (entity pre-filtering) the search is an exact cosine
+    ranking over just those chunks, looked up by id, instead of the vector index.
+    `driver` selects another database (a shard); it defaults to the shared driver.
+    """
+    with (driver or get_neo4j_driver()).session() as session:
+        if allowed_ids is not None:
             result = session.run(
                 """
-                CALL db.index.vector.queryNodes('chunk_embedding_index', $k, $query_embedding)
-                YIELD node, score
-                RETURN node, score
+                MATCH (node:Chunk) WHERE node.id IN $allowed
+                WITH node, vector.similarity.cosine(node.embedding, $query_embedding) AS score
+                RETURN elementId(node) AS element_id, node.id AS id,
+                    CASE WHEN $with_content THEN node.content END AS content,
+                    {embedding}, score
                 ORDER BY score DESC
                 LIMIT $k
-                """,
-                {"k": k, "query_embedding": query_embedding}
+                """.format(embedding=ANCHOR_EMBEDDING_PROJECTION),
+                {"k": k, "query_embedding": query_embedding, "with_content": with_content, "allowed": list(allowed_ids)}
             )
+            return [record.data() for record in result]
 
-            for record in result:
-                anchor_node = record["node"]
-                anchor_id = anchor_node["id"]
-                anchor_content = anchor_node["content"]
-
-                # Retrieve all paths from anchor with exactly `hops` hops (paths of length hops + 1)
-                path_result = session.run(
-                    """
-                    MATCH p = (anchor:Chunk)-[:SIMILAR_TO*{min_hops}..{max_hops}]->(end:Chunk)
-                    WHERE elementId(anchor) = $node_id
-                    WITH nodes(p) AS path_nodes
-                    RETURN [n IN path_nodes | n.id] AS ids,
-                        [n IN path_nodes | n.content] AS contents,
-                        [n IN path_nodes | n.embedding] AS embeddings
-                    """.format(min_hops=hops, max_hops=hops),
-                    {"node_id": anchor_node.element_id}
-                )
-
-                for path_record in path_result:
-                    ids_chain = path_record["ids"]
-                    contents_chain = path_record["contents"]
-                    embeddings_chain = path_record["embeddings"]
-                    anchor_embedding = anchor_node["embedding"]
-
-                    # Ensure the anchor is included explicitly if needed
-                    if ids_chain[0] != anchor_id:
-                        ids_chain = [anchor_id] + ids_chain
+        result = session.run(
+            """
+            CALL db.index.vector.queryNodes('chunk_embedding_index', $k, $query_embedding)
+            YIELD node, score
+            RETURN elementId(node) AS element_id, node.id AS id,
+                CASE WHEN $with_content THEN node.content END AS content,
+                {embedding}, score
+            ORDER BY score DESC
+            LIMIT $k
+            """.format(embedding=ANCHOR_EMBEDDING_PROJECTION),
+            {"k": k, "query_embedding": query_embedding, "with_content": with_content}
+        )
+        return [record.data() for record in result]
+
+def iter_anchor_paths_precise(
+    anchors: List[dict],
+    hops: int,
+    with_content: bool = True,
+    allowed_ids: Optional[Set[str]] = None,
+    driver=None
+) -> Iterator[Tuple[List[str], List[str], List[List[float]]]]:
+    """
+    For each anchor from find_anchors_precise, yield every path with exactly
+    `hops` expansions as (ids_chain, contents_chain, embeddings_chain).
+    With `allowed_ids`, expansion is pruned to paths that stay inside that set.
+    """
+    allowed = list(allowed_ids) if allowed_ids is not None else None
+    contents_projection = "[n IN path_nodes | n.content]" if with_content else "null"
+
+    with (driver or get_neo4j_driver()).session() as session:
+        for anchor_record in anchors:
+            anchor_id = anchor_record["id"]
+            anchor_content = anchor_record["content"]
+            if EMBEDDING_QUANT != "none":
+                anchor_embedding = embeddings_from_records(
+                    [anchor_record["embedding"]], [anchor_record["embedding_scale"]], EMBEDDING_QUANT,
+                    [anchor_record["embedding_full"]]
+                )[0]
+            else:
+                anchor_embedding = anchor_record["embedding"]
+
+            # Retrieve all paths from anchor with exactly `hops` hops (paths of length hops + 1)
+            path_result = session.run(
+                """
+                MATCH p = (anchor:Chunk)-[:SIMILAR_TO*{min_hops}..{max_hops}]->(end:Chunk)
+                WHERE elementId(anchor) = $node_id
+                    AND ($allowed IS NULL OR all(n IN nodes(p) WHERE n.id IN $allowed))
+                WITH nodes(p) AS path_nodes
+                RETURN [n IN path_nodes | n.id] AS ids,
+                    {contents} AS contents,
+                    {embeddings}
+                """.format(min_hops=hops, max_hops=hops, contents=contents_projection, embeddings=EMBEDDINGS_PROJECTION),
+                {"node_id": anchor_record["element_id"], "allowed": allowed}
+            )
+
+            for path_record in path_result:
+                ids_chain = path_record["ids"]
+                contents_chain = path_record["contents"]
+                embeddings_chain = path_record["embeddings"]
+                if EMBEDDING_QUANT != "none":
+                    embeddings_chain = embeddings_from_records(
+                        embeddings_chain, path_record["embedding_scales"], EMBEDDING_QUANT,
+                        path_record["embeddings_full"]
+                    )
+
+                # Ensure the anchor is included explicitly if needed
+                if ids_chain[0] != anchor_id:
+                    ids_chain = [anchor_id] + ids_chain
+                    if contents_chain is not None:
                         contents_chain = [anchor_content] + contents_chain
-                        embeddings_chain = [anchor_embedding] + embeddings_chain
+                    embeddings_chain = [anchor_embedding] + embeddings_chain
 
-                    paths.append((ids_chain, contents_chain, embeddings_chain))
+                yield ids_chain, contents_chain, embeddings_chain
 
+def iter_top_k_paths_precise(
+    query_embedding: List[float],
+    k: int,
+    hops: int,
+    with_content: bool = True
+) -> Iterator[Tuple[List[str], List[str], List[List[float]]]]:
+    """
+    Retrieve top-k anchors by vector similarity, then for each anchor,
+    find all possible paths with exactly `hops` expansions,
+    returning structured paths (ids_chain, contents_chain) for PPF enrichment.
+
+    With `with_content=False` (two-phase retrieval) only ids and embeddings are
+    transferred and contents_chain is None; call fetch_chunk_contents for the
+    chains that survive filtering.
+
+    Paths are yielded straight off the driver cursor; closing the generator
+    early (e.g. once enough chains pass the threshold) ends the query.
+    """
+    anchors = find_anchors_precise(query_embedding, k, with_content)
+    yield from iter_anchor_paths_precise(anchors, hops, with_content)
+
+def get_top_k_paths_precise(
+    query_embedding: List[float],
+    k: int,
+    hops: int,
+    with_content: bool = True
+) -> List[Tuple[List[str], List[str]]]:
+    """
+    Materialized form of iter_top_k_paths_precise.
+    """
+    paths = list(iter_top_k_paths_precise(query_embedding, k, hops, with_content))
 
     print(f"\n✅ Retrieved {len(paths)} total paths across {k} anchors using {hops} hops.")
-    return paths
\ No newline at end of file
+    return paths
+
+def fetch_chunk_contents(ids: List[str], driver=None) -> Dict[str, str]:
+    """
+    Phase two of two-phase retrieval: fetch contents for the given chunk ids
+    in a single batched lookup.
+    """
+    unique_ids = list(dict.fromkeys(ids))
+    with (driver or get_neo4j_driver()).session() as session:
+        result = session.run(
+            "MATCH (c:Chunk) WHERE c.id IN $ids RETURN c.id AS id, c.content AS content",
+            {"ids": unique_ids}
+        )
+        contents = {record["id"]: record["content"] for record in result}
+
+    fetched_bytes = sum(len((c or "").encode("utf-8")) for c in contents.values())
+    print(f"Fetched content for {len(contents)} chunks ({fetched_bytes / 1024:.1f} KB).")
+    return contents
+
+def fetch_full_embeddings(ids: List[str], driver=None) -> Dict[str, List[float]]:
+    """
+    Fetch full-precision embeddings for the given chunk ids in one round trip,
+    used to rerank the final candidates after scoring on quantized vectors.
+    """
+    with (driver or get_neo4j_driver()).session() as session:
+        result = session.run(
+            "MATCH (c:Chunk) WHERE c.id IN $ids RETURN c.id AS id, c.embedding AS embedding",
+            {"ids": list(set(ids))}
+        )
+        return {record["id"]: record["embedding"] for record in result}
@@ -1,8 +1,8 @@
 # GraphRAG_retreival_controller/predict_controller.py
 
+import os
 import numpy as np
-import joblib
-from openai import OpenAI
+from functools import lru_cache
 from typing import List
 from pathlib import Path
 
@@ -10,21 +10,34 @@ BASE_DIR = Path(__file__).resolve().parent
 pca_path = BASE_DIR / "Models" / "pca.joblib"
 regressor_path = BASE_DIR / "Models" / "regression.joblib"
 
-print(f"Loading PCA from: {pca_path}")
-print(f"Loading regressor from: {regressor_path}")
+# Models and the OpenAI client are loaded on first use, so importing this
+# module (and forking workers after import) stays cheap.
+@lru_cache(maxsize=None)
+def load_models():
+    import joblib
 
-pca = joblib.load(pca_path)
-regressor = joblib.load(regressor_path)
-client    = OpenAI()
+    print(f"Loading PCA from: {pca_path}")
+    print(f"Loading regressor from: {regressor_path}")
+    return joblib.load(pca_path), joblib.load(regressor_path)
+
+@lru_cache(maxsize=None)
+def get_client():
+    from openai import OpenAI
+    return OpenAI()
+
+# Forked workers (e.g. train_controller's process pool) must not reuse the parent's connection pool
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=get_client.cache_clear)
 
 def embedding_query(query: str) -> List[float]:
-    response = client.embeddings.create(
+    response = get_client().embeddings.create(
         model="text-embedding-3-small",
         input=query
     )
     return response.data[0].embedding
 
 def predict_broadness_score(embedding: List[float]) -> float:
+    pca, regressor = load_models()
     arr         = np.array(embedding).reshape(1, -1)
     emb_reduced = pca.transform(arr)
     score       = regressor.predict(emb_reduced)[0]
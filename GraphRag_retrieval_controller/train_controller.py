@@ -1,43 +1,239 @@
-import pandas as pd
+# GraphRAG_retreival_controller/train_controller.py
+#
+# Trains the broadness controller (PCA + regressor) used by predict_controller.py.
+#
+#   python train_controller.py
+#   python train_controller.py --components 16,32,50,64 --regressors linear,ridge --folds 5 --workers 4
+#
+# Embeddings are kept in a persistent store keyed by query text, so a retrain
+# only embeds queries it has not seen, and in batches. PCA fits are cached per
+# dataset; every (components, regressor) pair of the grid is cross-validated on
+# a process pool (PCA fit on each fold's training rows only), and the best one
+# is refit on all rows and exported to Models/ along with profile.json (grid
+# results and inference latency).
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Tuple
+
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.model_selection import train_test_split
-from sklearn.decomposition import PCA
+import pandas as pd
 import joblib
+from sklearn.decomposition import PCA
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.metrics import mean_absolute_error, r2_score
+from sklearn.model_selection import KFold
 from tqdm import tqdm
-from openai import OpenAI
 
-client = OpenAI()
+BASE_DIR = Path(__file__).resolve().parent
+DATA_PATH = BASE_DIR / "data" / "data.csv"
+MODELS_DIR = BASE_DIR / "Models"
+CACHE_DIR = BASE_DIR / "cache"
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBED_BATCH_SIZE = 256
+
+REGRESSORS = {
+    "linear": LinearRegression,
+    "ridge": lambda: Ridge(alpha=1.0),
+    "ridge10": lambda: Ridge(alpha=10.0),
+}
+
+
+# === EMBEDDING STORE ===
+def text_key(text: str) -> str:
+    return hashlib.sha1(f"{EMBEDDING_MODEL}:{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Query embeddings on disk (one .npz per embedding model), keyed by a hash of
+    model and text. Saved through a temp file, so an interrupted run keeps the
+    previous store.
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR):
+        self.path = Path(cache_dir) / f"embeddings_{EMBEDDING_MODEL}.npz"
+        self.vectors: Dict[str, np.ndarray] = {}
+        if self.path.exists():
+            data = np.load(self.path)
+            self.vectors = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp.npz")
+        keys = list(self.vectors)
+        np.savez(tmp, keys=np.array(keys), vectors=np.stack([self.vectors[k] for k in keys]).astype(np.float32))
+        os.replace(tmp, self.path)
+
+    def embed(self, texts: List[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+        """Embeddings for `texts` in order; only texts missing from the store hit the API."""
+        keys = [text_key(t) for t in texts]
+        missing = list({k: t for k, t in zip(keys, texts) if k not in self.vectors}.items())
+        print(f"Embeddings: {len(texts) - len(missing)} cached, {len(missing)} to embed.")
+        for start in tqdm(range(0, len(missing), batch_size), desc="Embedding batches", disable=not missing):
+            batch = missing[start:start + batch_size]
+            for (key, _), vector in zip(batch, embed_batch([t for _, t in batch])):
+                self.vectors[key] = np.asarray(vector, dtype=np.float32)
+            # Save per batch so an API failure midway keeps the work done so far
+            self.save()
+        return np.stack([self.vectors[k] for k in keys])
+
+
+def embed_batch(texts: List[str]) -> List[List[float]]:
+    from predict_controller import get_client
+
+    response = get_client().embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
 
-def embedding_query(query: str):
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=query
-    )
-    return response.data[0].embedding
 
-df = pd.read_csv("data/data.csv")
-queries = df['Queries'].tolist()
-labels = df['Label'].tolist()
+# === PCA CACHE ===
+def dataset_fingerprint(queries: List[str]) -> str:
+    digest = hashlib.sha1(EMBEDDING_MODEL.encode("utf-8"))
+    for q in queries:
+        digest.update(text_key(q).encode("ascii"))
+    return digest.hexdigest()[:16]
 
-embeddings = []
-for q in tqdm(queries, desc="Generating embeddings"):
-    embeddings.append(embedding_query(q))
 
-X = np.array(embeddings)
-y = np.array(labels)
+def cached_pca(X: np.ndarray, n_components: int, fingerprint: str, cache_dir: Path = CACHE_DIR) -> PCA:
+    """PCA fit on X, reused from disk while the data behind `fingerprint` is unchanged."""
+    path = Path(cache_dir) / f"pca_{fingerprint}_{n_components}.joblib"
+    if path.exists():
+        return joblib.load(path)
+    pca = PCA(n_components=n_components, svd_solver="full").fit(X)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    joblib.dump(pca, path)
+    return pca
 
-pca = PCA(n_components=50)
-X_reduced = pca.fit_transform(X)
 
-X_train, X_test, y_train, y_test = train_test_split(X_reduced, y, test_size=0.1, random_state=42)
+# === GRID SEARCH ===
+# Worker state, set once per process by the pool initializer instead of pickled per task
+_folds: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
 
-regressor = LinearRegression()
-regressor.fit(X_train, y_train)
 
-score = regressor.score(X_test, y_test)
-print(f"Test R^2 Score: {score:.4f}")
+def _init_worker(folds):
+    global _folds
+    _folds = folds
 
-joblib.dump(pca, "models/pca.joblib")
-joblib.dump(regressor, "models/regression.joblib")
-print("PCA and Regression models saved.")
+
+def project_folds(X: np.ndarray, y: np.ndarray, max_components: int, folds: int, fingerprint: str, cache_dir: Path = CACHE_DIR) -> list:
+    """
+    (Z_train, y_train, Z_test, y_test) per CV fold, with PCA fit on that fold's
+    training rows only, so held-out rows never shape the projection. With the
+    full SVD solver the first k components do not depend on how many are kept,
+    so one fit at `max_components` serves every component count of the grid.
+    """
+    projected = []
+    splits = KFold(n_splits=folds, shuffle=True, random_state=42).split(X)
+    for i, (train_idx, test_idx) in enumerate(splits):
+        pca = cached_pca(X[train_idx], max_components, f"{fingerprint}_cv{folds}-{i}", cache_dir)
+        projected.append((pca.transform(X[train_idx]), y[train_idx], pca.transform(X[test_idx]), y[test_idx]))
+    return projected
+
+
+def evaluate(params: Tuple[int, str]) -> dict:
+    """Cross-validate one grid point on the first `n_components` columns of each fold's projection."""
+    n_components, regressor = params
+    r2, mae = [], []
+    for Z_train, y_train, Z_test, y_test in _folds:
+        model = REGRESSORS[regressor]().fit(Z_train[:, :n_components], y_train)
+        predicted = model.predict(Z_test[:, :n_components])
+        r2.append(r2_score(y_test, predicted))
+        mae.append(mean_absolute_error(y_test, predicted))
+    return {
+        "components": n_components,
+        "regressor": regressor,
+        "r2": float(np.mean(r2)),
+        "r2_std": float(np.std(r2)),
+        "mae": float(np.mean(mae)),
+    }
+
+
+def grid_search(folds: list, components: List[int], regressors: List[str], workers: int) -> List[dict]:
+    grid = [(c, r) for c in components for r in regressors]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(folds,)) as pool:
+        results = list(tqdm(pool.map(evaluate, grid), total=len(grid), desc="Grid search"))
+    # Best mean R^2 first; fewer components wins ties (cheaper at inference)
+    return sorted(results, key=lambda r: (-r["r2"], r["components"]))
+
+
+# === EXPORT ===
+def latency_profile(pca: PCA, regressor, X: np.ndarray, repeats: int = 1000) -> dict:
+    """Single-query inference latency (PCA transform + predict), as predict_broadness_score runs it."""
+    samples = []
+    for i in range(repeats):
+        row = X[i % len(X)].reshape(1, -1)
+        start = time.perf_counter()
+        regressor.predict(pca.transform(row))
+        samples.append((time.perf_counter() - start) * 1e6)
+    return {f"p{p}_us": float(np.percentile(samples, p)) for p in (50, 95, 99)}
+
+
+def train(
+    data_path: Path, components: List[int], regressors: List[str], folds: int, workers: int,
+    models_dir: Path = MODELS_DIR, cache_dir: Path = CACHE_DIR
+) -> dict:
+    df = pd.read_csv(data_path)
+    queries = df["Queries"].astype(str).tolist()
+    y = df["Label"].to_numpy(dtype=float)
+
+    X = EmbeddingStore(cache_dir).embed(queries)
+    fingerprint = dataset_fingerprint(queries)
+    # Every fold's training split must support the largest PCA size
+    max_rows = X.shape[0] - math.ceil(X.shape[0] / folds)
+    components = sorted(c for c in components if c <= min(max_rows, X.shape[1]))
+    if not components:
+        raise ValueError(f"No PCA size fits {max_rows} training rows x {X.shape[1]} dims per fold")
+
+    results = grid_search(project_folds(X, y, components[-1], folds, fingerprint, cache_dir), components, regressors, workers)
+    best = results[0]
+    print(f"Best: {best['components']} components + {best['regressor']} "
+          f"(CV R^2 {best['r2']:.4f} ± {best['r2_std']:.4f}, MAE {best['mae']:.4f})")
+
+    pca = cached_pca(X, best["components"], fingerprint, cache_dir)
+    regressor = REGRESSORS[best["regressor"]]().fit(pca.transform(X), y)
+
+    models_dir.mkdir(parents=True, exist_ok=True)
+    joblib.dump(pca, models_dir / "pca.joblib")
+    joblib.dump(regressor, models_dir / "regression.joblib")
+    profile = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "embedding_model": EMBEDDING_MODEL,
+        "dataset": {"path": str(data_path), "rows": len(queries), "fingerprint": fingerprint},
+        "cv": {"folds": folds, "pca": "fit per fold on its training rows"},
+        "best": best,
+        "grid": results,
+        "inference_latency": latency_profile(pca, regressor, X),
+    }
+    with open(models_dir / "profile.json", "w", encoding="utf-8") as f:
+        json.dump(profile, f, indent=2)
+    print(f"PCA, regression model and profile.json saved to {models_dir}.")
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the broadness controller.")
+    parser.add_argument("--data", type=Path, default=DATA_PATH, help="CSV with Queries and Label columns.")
+    parser.add_argument("--components", default="16,32,50,64", help="Comma-separated PCA sizes to try.")
+    parser.add_argument("--regressors", default=",".join(REGRESSORS), help=f"Comma-separated, from {list(REGRESSORS)}.")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--models-dir", type=Path, default=MODELS_DIR)
+    parser.add_argument("--cache-dir", type=Path, default=CACHE_DIR, help="Where embeddings and PCA fits are cached.")
+    args = parser.parse_args()
+
+    train(
+        args.data,
+        [int(c) for c in args.components.split(",")],
+        args.regressors.split(","),
+        args.folds,
+        args.workers,
+        args.models_dir,
+        args.cache_dir,
+    )
@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+GRAPHRAG = Path(__file__).resolve().parents[1] / "GraphRAG"
+
+# The query and ingestion modules import each other by bare name, as they do
+# when run as scripts from their own directories.
+sys.path.insert(0, str(GRAPHRAG / "query"))
+sys.path.insert(0, str(GRAPHRAG / "Ingestion"))
@@ -1,7 +1,7 @@
 import os
 import sys
 from pathlib import Path
-from typing import List
+from typing import Iterator, List
 
 from GraphRAG.Secret.secret import (
     NEO4J_URI_secret,
@@ -25,6 +25,10 @@ except ModuleNotFoundError:
 from neo4j import GraphDatabase
 import openai
 
+# Chunk with the ingestion pipeline's token windows
+sys.path.append(str(Path(__file__).resolve().parents[1] / "GraphRAG" / "Ingestion"))
+from graphrag_ingest import iter_token_windows, iter_txt_blocks
+
 
 
 # === CONFIGURATION ===
@@ -35,6 +39,9 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", OPENAI_API_KEY_secret)
 COHERE_API_KEY = os.getenv("COHERE_API_KEY", COHERE_API_KEY_secret)
 MODEL_NAME = os.getenv("MODEL_NAME", "gpt-4o-mini")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500))  # words per chunk
+# Chunks are cut in tokens; English text averages about 1.3 tokens per word
+TOKENS_PER_WORD = 1.3
+CHUNK_TOKENS = round(CHUNK_SIZE * TOKENS_PER_WORD)
 
 # Validate OpenAI API key\
 if not OPENAI_API_KEY:
@@ -54,27 +61,24 @@ openai.api_key = OPENAI_API_KEY
 
 def load_text_chunks(text: str, chunk_size: int = CHUNK_SIZE) -> List[str]:
     """
-    Split raw text into chunks of up to chunk_size words.
+    Split raw text into chunks of about chunk_size words.
     """
-    words = text.split()
-    return [" ".join(words[i:i+chunk_size]) for i in range(0, len(words), chunk_size)]
+    return list(iter_token_windows([text], round(chunk_size * TOKENS_PER_WORD), 0))
 
 
-def load_pdf_chunks(path: Path) -> List[str]:
+def load_pdf_chunks(path: Path) -> Iterator[str]:
     """
-    Extract text from a PDF and return word chunks.
+    Extract text from a PDF page by page and yield token chunks.
     """
     reader = PdfReader(str(path))
-    text = "".join(page.extract_text() or "" for page in reader.pages)
-    return load_text_chunks(text)
+    return iter_token_windows(((page.extract_text() or "") + "\n" for page in reader.pages), CHUNK_TOKENS, 0)
 
 
-def load_txt_chunks(path: Path) -> List[str]:
+def load_txt_chunks(path: Path) -> Iterator[str]:
     """
-    Read a text or markdown file and return word chunks.
+    Read a text or markdown file block by block and yield token chunks.
     """
-    text = path.read_text(encoding="utf-8")
-    return load_text_chunks(text)
+    return iter_token_windows(iter_txt_blocks(path), CHUNK_TOKENS, 0)
 
 
 def ingest_file(file_path: str):
@@ -95,6 +99,7 @@ def ingest_file(file_path: str):
         print(f"Unsupported file type: {suffix}")
         return
 
+    count = 0
     with driver.session() as session:
         for idx, chunk in enumerate(chunks, start=1):
             node_id = f"{path.stem}_{idx}"
@@ -102,7 +107,8 @@ def ingest_file(file_path: str):
                 "MERGE (c:Chunk {id: $id}) SET c.content = $content, c.source = $source",
                 id=node_id, content=chunk, source=path.name
             )
-    print(f"Ingested {len(chunks)} chunks from {path.name}")
+            count += 1
+    print(f"Ingested {count} chunks from {path.name}")
 
 
 def retrieve_chunks(question: str, limit: int = 3) -> List[str]:
@@ -166,5 +172,4 @@ if __name__ == "__main__":
     main()
 
 # === Requirements ===
-# pip install PyPDF2 neo4j openai
-# or pip install pypdf4 neo4j openai
+# pip install -r GraphRAG/requirements.txt
@@ -0,0 +1,104 @@
+import argparse
+
+import pytest
+
+import bench_admission
+from admission import DEFAULT_LADDER, AdmissionController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def run(controller: AdmissionController, clock: FakeClock, n: int, latency_s: float, hops: int = 7, failed: bool = False):
+    tickets = []
+    for _ in range(n):
+        clock.now += 1.0
+        ticket = controller.admit()
+        ticket.cap_hops(hops)
+        controller.complete(ticket, {"total": latency_s}, failed)
+        tickets.append(ticket)
+    return tickets
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def controller(clock):
+    return AdmissionController(
+        slo_p95_ms=100, cooldown=5, restore_after=10, queue_limit=2, clock=clock, verbose=False
+    )
+
+
+def test_steps_up_one_level_per_window_under_pressure(controller, clock):
+    run(controller, clock, 5, 0.5)
+    assert controller.level == 1
+    # Queries admitted before the change do not count against the new level
+    run(controller, clock, 4, 0.5)
+    assert controller.level == 1
+    run(controller, clock, 1, 0.5)
+    assert controller.level == 2
+    run(controller, clock, 50, 0.5)
+    assert controller.level == len(DEFAULT_LADDER) - 1
+
+
+def test_restores_after_a_longer_calm_window(controller, clock):
+    run(controller, clock, 10, 0.5)
+    assert controller.level == 2
+    run(controller, clock, 9, 0.01)
+    assert controller.level == 2
+    run(controller, clock, 1, 0.01)
+    assert controller.level == 1
+    run(controller, clock, 10, 0.01)
+    assert controller.level == 0
+    assert [(t["from"], t["to"]) for t in controller.transitions] == [(0, 1), (1, 2), (2, 1), (1, 0)]
+    assert controller.transitions[0]["at"] == 5.0
+
+
+def test_degraded_budget_caps_hops_and_is_recorded(controller, clock):
+    run(controller, clock, 5, 0.5)
+    (ticket,) = run(controller, clock, 1, 0.01, hops=7)
+    budget = DEFAULT_LADDER[1]
+    assert ticket.budget == budget and ticket.granted_hops == budget.max_hops
+    record = controller.degradations[-1]
+    assert record["level"] == 1 and record["requested_hops"] == 7 and record["granted_hops"] == budget.max_hops
+    assert "p95" in record["reason"]
+    assert len(controller.degradations) == 1
+
+
+def test_queue_depth_adds_a_level(controller, clock):
+    tickets = [controller.admit() for _ in range(3)]
+    assert [t.budget.level for t in tickets] == [0, 0, 1]
+    assert "queue depth 3 > 2" in tickets[2].reason
+    for ticket in tickets:
+        controller.complete(ticket, {"total": 0.01})
+    assert controller.in_flight == 0 and controller.level == 0
+    assert len(controller.degradations) == 1
+
+
+def test_failed_queries_count_towards_the_slo(controller, clock):
+    run(controller, clock, 5, 0.5, failed=True)
+    assert controller.level == 1
+    assert controller.summary()["failed"] == 5
+
+
+def test_simulated_burst_keeps_p95_near_the_slo():
+    args = argparse.Namespace(
+        duration=300.0, qps=2.0, broad=0.2, burst_start=100.0, burst_len=60.0, burst_qps=10.0, burst_broad=0.8,
+        base_ms=400.0, path_ms=0.01, capacity=8.0, slo_ms=3000.0, queue_limit=16, seed=0,
+    )
+    uncontrolled = AdmissionController(slo_p95_ms=args.slo_ms, ladder=DEFAULT_LADDER[:1], verbose=False)
+    controlled = AdmissionController(slo_p95_ms=args.slo_ms, queue_limit=args.queue_limit, verbose=False)
+    base = bench_admission.report("uncontrolled", bench_admission.simulate(args, uncontrolled), uncontrolled, args.slo_ms)
+    admitted = bench_admission.report("admission", bench_admission.simulate(args, controlled), controlled, args.slo_ms)
+
+    assert base["queries"] == admitted["queries"]
+    assert base["p95_ms"] > args.slo_ms > admitted["p95_ms"]
+    assert admitted["degraded"] > 0 and controlled.level == 0
@@ -0,0 +1,60 @@
+import re
+
+import pytest
+
+import graphrag_ingest
+from graphrag_ingest import iter_token_windows
+
+
+class WordEncoding:
+    """One token per whitespace-separated word, standing in for the tiktoken encoding."""
+
+    def __init__(self):
+        self.vocab = []
+        self.ids = {}
+
+    def encode(self, text, disallowed_special=()):
+        tokens = []
+        for word in re.findall(r"\S+", text):
+            if word not in self.ids:
+                self.ids[word] = len(self.vocab)
+                self.vocab.append(word)
+            tokens.append(self.ids[word])
+        return tokens
+
+    def decode_bytes(self, tokens):
+        return " ".join(self.vocab[t] for t in tokens).encode("utf-8")
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    monkeypatch.setattr(graphrag_ingest, "_encoding", WordEncoding())
+
+
+def split_blocks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("block_chars", [7, 37, 10_000])
+def test_windows_overlap_and_cover_the_text(block_chars):
+    words = [f"w{i}" for i in range(1000)]
+    windows = [w.split() for w in iter_token_windows(split_blocks(" ".join(words), block_chars), 50, 10)]
+
+    assert windows == [words[start:start + 50] for start in range(0, 961, 40)]
+    for previous, current in zip(windows, windows[1:]):
+        assert previous[-10:] == current[:10]
+
+
+def test_short_text_is_one_window():
+    assert list(iter_token_windows(["just a few words"], 50, 10)) == ["just a few words"]
+
+
+def test_no_overlap_windows_partition_the_text():
+    words = [f"w{i}" for i in range(95)]
+    windows = [w.split() for w in iter_token_windows([" ".join(words)], 20, 0)]
+    assert [word for window in windows for word in window] == words
+
+
+def test_overlap_must_be_smaller_than_window():
+    with pytest.raises(ValueError):
+        list(iter_token_windows(["text"], 10, 10))
@@ -0,0 +1,23 @@
+import sys
+
+import pytest
+
+import config
+import graphrag_ingest
+import quantization
+import snapshot_export
+
+
+def test_ingestion_and_query_modules_share_one_config():
+    assert graphrag_ingest.get_neo4j_driver is config.get_neo4j_driver
+    assert snapshot_export.quantize_matrix is quantization.quantize_matrix
+    assert not [name for name in sys.modules if name.startswith("query.")]
+
+
+def test_missing_settings_fail_with_their_names(monkeypatch):
+    monkeypatch.setattr(config, "NEO4J_URI", "neo4j://localhost:7687")
+    monkeypatch.setattr(config, "NEO4J_USER", None)
+    monkeypatch.setattr(config, "NEO4J_PASS", "")
+    config.get_neo4j_driver.cache_clear()
+    with pytest.raises(RuntimeError, match=r"^Missing setting\(s\) NEO4J_USER, NEO4J_PASS: .*NEO4J_USER_secret"):
+        config.get_neo4j_driver()
@@ -0,0 +1,90 @@
+import pytest
+
+import bench_entity_index
+import entity_index
+from entity_index import EntityIndex, normalize_entity
+
+
+@pytest.fixture
+def index():
+    index = EntityIndex(num_chunks=20)
+    for name, chunk_ids in {
+        "Vitamin C": ["c1", "c2"],
+        "vitamin c deficiency": ["c3"],
+        "Scurvy": ["c2", "c4"],
+        "British Royal Navy": ["c5"],
+        # In 5 of 20 chunks: above the default 0.2 document-frequency limit
+        "health": ["c1", "c2", "c3", "c4", "c5"],
+    }.items():
+        for chunk_id in chunk_ids:
+            index.add(name, chunk_id)
+    return index
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Vitamin C", "vitamin c"),
+    ("  Royal   Navy\n", "royal navy"),
+    ("U.S. Navy", "u s navy"),
+    ("vitamin-C's role", "vitamin c s role"),
+    ("?!", ""),
+])
+def test_normalize_entity(name, expected):
+    assert normalize_entity(name) == expected
+
+
+def test_empty_names_are_not_indexed(index):
+    index.add("...", "c9")
+    assert "" not in index.postings
+
+
+def test_match_finds_every_entity_ngram_of_the_question(index):
+    matches = index.match("What does Vitamin-C deficiency have to do with the British Royal Navy?")
+    assert matches == {
+        "vitamin c": {"c1", "c2"},
+        "vitamin c deficiency": {"c3"},
+        "british royal navy": {"c5"},
+    }
+
+
+def test_match_skips_entities_in_too_many_chunks(index):
+    assert "health" not in index.match("scurvy and health")
+    assert index.match("scurvy and health", max_df=0.25)["health"] == {"c1", "c2", "c3", "c4", "c5"}
+
+
+def test_match_without_chunk_count_has_no_frequency_limit():
+    index = EntityIndex({"health": ["c1", "c2"]})
+    assert index.match("health") == {"health": {"c1", "c2"}}
+
+
+def test_candidate_chunks_is_the_union_of_matches_or_none(index):
+    assert index.candidate_chunks("vitamin c and scurvy") == {"c1", "c2", "c4"}
+    assert index.candidate_chunks("nothing known here") is None
+    assert index.candidate_chunks("health") is None
+
+
+def test_save_load_round_trip(index, tmp_path):
+    path = str(tmp_path / "entity_index.json")
+    index.save(path)
+    loaded = EntityIndex.load(path)
+    assert loaded.postings == index.postings
+    assert loaded.num_chunks == index.num_chunks
+    assert loaded.match("vitamin c deficiency in the royal navy") == index.match("vitamin c deficiency in the royal navy")
+    assert not (tmp_path / "entity_index.json.tmp").exists()
+
+
+def test_get_entity_index_is_none_until_built(tmp_path, monkeypatch):
+    monkeypatch.setattr(entity_index, "_entity_index", None)
+    assert entity_index.get_entity_index(str(tmp_path / "missing.json")) is None
+
+
+def test_bench_caches_query_embeddings_outside_the_dataset(tmp_path, monkeypatch):
+    import embedding_query
+
+    calls = []
+    monkeypatch.setattr(embedding_query, "embedding_query", lambda q: calls.append(q) or [float(len(q)), 1.0])
+    questions = ["what causes scurvy", "vitamin c"]
+    first = bench_entity_index.load_query_embeddings(questions, tmp_path / "cache")
+    second = bench_entity_index.load_query_embeddings(questions, tmp_path / "cache")
+    assert calls == questions
+    assert first.tolist() == second.tolist() == [[18.0, 1.0], [9.0, 1.0]]
+    assert [p.parent.name for p in tmp_path.rglob("*.npy")] == ["cache"]
@@ -0,0 +1,48 @@
+import asyncio
+
+import pytest
+
+import eval_beir
+import orchestrator
+from eval_beir import build_offline_router, offline_providers, replay, summarize, synthetic_beir
+
+PATCHED = ["get_shard_router", "embedding_query", "predict_broadness_score", "graph_max_hops",
+           "rerank_chunks_with_cohere", "generate_answer_from_chunks"]
+
+
+@pytest.fixture(scope="module")
+def dataset():
+    corpus, queries, qrels = synthetic_beir(100)
+    return build_offline_router(corpus, num_shards=2), queries, qrels
+
+
+def test_offline_providers_are_restored_on_exit(dataset):
+    router, _, _ = dataset
+    originals = {name: getattr(orchestrator, name) for name in PATCHED}
+    with pytest.raises(RuntimeError):
+        with offline_providers(router):
+            assert orchestrator.get_shard_router() is router
+            assert orchestrator.embedding_query is eval_beir.fake_embedding
+            raise RuntimeError("query failed")
+    assert {name: getattr(orchestrator, name) for name in PATCHED} == originals
+
+
+def test_fake_broadness_spreads_over_the_unit_interval(dataset):
+    _, queries, _ = dataset
+    scores = [eval_beir.fake_broadness(eval_beir.fake_embedding(text)) for text in queries.values()]
+    assert all(0.0 <= s <= 1.0 for s in scores)
+    assert min(scores) < 0.25 and max(scores) > 0.75
+
+
+@pytest.mark.parametrize("speculative", [False, True])
+def test_offline_replay_end_to_end(dataset, speculative):
+    router, queries, qrels = dataset
+    with offline_providers(router):
+        rows, wall_s = asyncio.run(replay(queries, qrels, concurrency=4, k=10, offline=True, speculative=speculative))
+
+    assert [row["qid"] for row in rows] == list(queries)
+    assert all(row["error"] is None for row in rows)
+    assert all("total" in row["stages_ms"] for row in rows)
+    summary = summarize(rows, wall_s, 4, 10)
+    assert summary["ndcg@10"] > 0.5
+    assert ("speculation_hit_rate" in summary) == speculative
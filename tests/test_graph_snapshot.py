@@ -0,0 +1,183 @@
+import json
+
+import numpy as np
+import pytest
+
+from config import SYSTEM_MAX_HOPS
+from graph_snapshot import GraphSnapshot, graph_max_hops, iter_aggregate_chains_snapshot, iter_scored_paths_snapshot
+from precision_expander import chain_precision, iter_paths_for_ppf_prefix
+from snapshot_export import write_graph_snapshot, write_path_aggregates
+
+DIM = 16
+NUM_CHUNKS = 30
+
+
+def build_snapshot(out_dir, embedding_quant="none", seed=0):
+    rng = np.random.default_rng(seed)
+    ids = [f"doc_chunk_{i}" for i in range(NUM_CHUNKS)]
+    embeddings = rng.normal(size=(NUM_CHUNKS, DIM)).astype(np.float32)
+    edges = [
+        (ids[i], ids[j], float(rng.uniform(0.5, 1.0)))
+        for i in range(NUM_CHUNKS)
+        for j in rng.choice(NUM_CHUNKS, size=3, replace=False)
+        if i != j
+    ]
+    write_graph_snapshot(ids, [f"text {i}" for i in ids], embeddings.tolist(), edges, str(out_dir), embedding_quant)
+    return embeddings
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    path = tmp_path / "snapshot"
+    embeddings = build_snapshot(path)
+    return path, embeddings
+
+
+def edge_unique_walks(edges, anchor, hops, allowed=None):
+    """Reference expansion: every walk of `hops` directed edges from `anchor`, no edge used twice."""
+    def walk(path, used):
+        if len(path) - 1 == hops:
+            yield tuple(path)
+            return
+        for e, (a, b, _) in enumerate(edges):
+            if a == path[-1] and e not in used and (allowed is None or b in allowed):
+                yield from walk(path + [b], used | {e})
+
+    return list(walk([anchor], frozenset()))
+
+
+# Cycles in both directions, a self-revisit via a->b->a, and a parallel edge c->d
+SMALL_EDGES = [
+    ("a", "b", 0.9), ("b", "a", 0.8), ("b", "c", 0.7), ("c", "a", 0.6),
+    ("a", "c", 0.5), ("c", "d", 0.4), ("c", "d", 0.3), ("d", "e", 0.2),
+]
+
+
+@pytest.fixture
+def small_snapshot(tmp_path):
+    ids = ["a", "b", "c", "d", "e", "f"]
+    write_graph_snapshot(ids, ids, np.eye(len(ids)).tolist(), SMALL_EDGES, str(tmp_path / "small"))
+    return GraphSnapshot(str(tmp_path / "small"))
+
+
+@pytest.mark.parametrize("allowed", [None, {"a", "b", "c", "e"}])
+@pytest.mark.parametrize("hops", [1, 2, 3, 4, 5])
+def test_iter_anchor_paths_matches_edge_unique_dfs(small_snapshot, allowed, hops):
+    mask = small_snapshot.allowed_mask(allowed)
+    for anchor in small_snapshot.ids:
+        paths = [
+            tuple(small_snapshot.ids[i] for i in path)
+            for path in small_snapshot.iter_anchor_paths(small_snapshot.index_of[anchor], hops, mask)
+        ]
+        assert sorted(paths) == sorted(edge_unique_walks(SMALL_EDGES, anchor, hops, allowed))
+
+
+def test_graph_max_hops_is_the_longest_undirected_shortest_path(small_snapshot):
+    # e is 3 edges from b (b-a/c-d-e, against or along edge directions); f is isolated
+    assert small_snapshot.manifest["graph_max_hops"] == 3
+    assert small_snapshot.graph_max_hops == 3
+    assert graph_max_hops(small_snapshot.indptr, small_snapshot.indices, cap=2) == 2
+
+
+def test_graph_max_hops_of_a_long_chain_spans_source_batches():
+    num_nodes = 200
+    indptr = np.concatenate([np.arange(num_nodes), [num_nodes - 1]])
+    indices = np.arange(1, num_nodes)
+    assert graph_max_hops(indptr, indices, cap=1000) == num_nodes - 1
+    assert graph_max_hops(indptr, indices) == SYSTEM_MAX_HOPS
+
+
+def test_graph_max_hops_without_edges_falls_back_like_the_cypher():
+    assert graph_max_hops(np.zeros(4, dtype=np.int64), np.zeros(0, dtype=np.int32)) == 3
+
+
+def test_graph_max_hops_is_computed_for_snapshots_without_it(small_snapshot):
+    manifest = json.loads((small_snapshot.path / "manifest.json").read_text())
+    del manifest["graph_max_hops"]
+    (small_snapshot.path / "manifest.json").write_text(json.dumps(manifest))
+    assert GraphSnapshot(str(small_snapshot.path)).graph_max_hops == 3
+
+
+def test_path_aggregates_default_to_snapshot_quantization(tmp_path):
+    path = tmp_path / "snapshot"
+    build_snapshot(path)
+    write_path_aggregates(str(path), max_hops=2, top_m=4)
+    assert GraphSnapshot(str(path)).path_aggregates.manifest["quant"] == "none"
+
+    build_snapshot(path, embedding_quant="int8")
+    write_path_aggregates(str(path), max_hops=2, top_m=4)
+    assert GraphSnapshot(str(path)).path_aggregates.manifest["quant"] == "int8"
+
+
+@pytest.mark.parametrize("hops", [1, 2, 3])
+def test_aggregate_chain_precision_matches_chain_precision(snapshot_dir, hops):
+    path, embeddings = snapshot_dir
+    write_path_aggregates(str(path), max_hops=3, top_m=4)
+    snapshot = GraphSnapshot(str(path))
+    index_of = {chunk_id: i for i, chunk_id in enumerate(snapshot.ids)}
+    q = np.random.default_rng(1).normal(size=DIM).astype(np.float32)
+
+    chains = list(iter_aggregate_chains_snapshot(snapshot, q, [(0, 1.0), (5, 1.0)], hops))
+    assert chains
+    for ids_chain, contents_chain, precision in chains:
+        assert len(ids_chain) == hops + 1
+        assert contents_chain == [f"text {chunk_id}" for chunk_id in ids_chain]
+        expected = chain_precision(q, embeddings[[index_of[c] for c in ids_chain]])
+        assert precision == pytest.approx(expected, abs=1e-5)
+
+
+@pytest.mark.parametrize("embedding_quant", ["none", "int8"])
+@pytest.mark.parametrize("hops", [1, 2, 3])
+def test_scored_paths_match_prefix_scoring_of_materialized_paths(tmp_path, embedding_quant, hops):
+    build_snapshot(tmp_path / "snapshot", embedding_quant)
+    snapshot = GraphSnapshot(str(tmp_path / "snapshot"))
+    q = np.random.default_rng(1).normal(size=DIM).astype(np.float32)
+    anchors = [(0, 1.0), (5, 1.0)]
+
+    scored = list(iter_scored_paths_snapshot(snapshot, q, anchors, hops))
+    paths = (snapshot.path_tuple(p) for a, _ in anchors for p in snapshot.iter_anchor_paths(a, hops))
+    expected = list(iter_paths_for_ppf_prefix(q, paths))
+    assert scored
+    assert [c[:2] for c in scored] == [c[:2] for c in expected]
+    assert [c[2] for c in scored] == pytest.approx([c[2] for c in expected], abs=1e-6)
+
+
+def test_scored_paths_report_stats_when_closed_early(snapshot_dir, capsys):
+    path, _ = snapshot_dir
+    snapshot = GraphSnapshot(str(path))
+    chains = iter_scored_paths_snapshot(snapshot, np.ones(DIM), [(0, 1.0)], 2)
+    next(chains)
+    chains.close()
+    assert "Prefix scoring: 1 chains" in capsys.readouterr().out
+
+
+def test_aggregates_of_another_snapshot_are_ignored(tmp_path):
+    path = tmp_path / "snapshot"
+    build_snapshot(path)
+    write_path_aggregates(str(path), max_hops=1, top_m=2)
+    assert GraphSnapshot(str(path)).path_aggregates is not None
+
+    # Re-exporting the same graph within the same second still gets a new snapshot id
+    (path / "paths").rename(tmp_path / "paths")
+    build_snapshot(path)
+    (tmp_path / "paths").rename(path / "paths")
+    assert GraphSnapshot(str(path)).path_aggregates is None
+
+
+def test_aggregates_of_an_unknown_format_version_are_ignored(snapshot_dir, capsys):
+    path, _ = snapshot_dir
+    write_path_aggregates(str(path), max_hops=1, top_m=2)
+    manifest = json.loads((path / "paths" / "manifest.json").read_text())
+    manifest["format_version"] += 1
+    (path / "paths" / "manifest.json").write_text(json.dumps(manifest))
+    assert GraphSnapshot(str(path)).path_aggregates is None
+    assert "format version" in capsys.readouterr().out
+
+
+def test_snapshot_of_an_unknown_format_version_is_rejected(snapshot_dir):
+    path, _ = snapshot_dir
+    manifest = json.loads((path / "manifest.json").read_text())
+    manifest["format_version"] += 1
+    (path / "manifest.json").write_text(json.dumps(manifest))
+    with pytest.raises(ValueError, match="format version"):
+        GraphSnapshot(str(path))
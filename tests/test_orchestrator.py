@@ -0,0 +1,165 @@
+import asyncio
+from functools import partial
+
+import numpy as np
+import pytest
+
+import compute_max_hops
+import orchestrator
+from compute_max_hops import compute_hops
+from graph_snapshot import GraphSnapshot
+from precision_expander import attach_chain_contents
+from rerank_cohere import rerank_chunks_with_cohere
+from snapshot_export import write_graph_snapshot
+
+DIM = 16
+NUM_CHUNKS = 40
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    """A random SIMILAR_TO graph served from a snapshot, with offline stand-ins for every provider."""
+    rng = np.random.default_rng(0)
+    ids = [f"doc{i // 4}_chunk_{i % 4}" for i in range(NUM_CHUNKS)]
+    edges = [
+        (ids[i], ids[j], float(rng.uniform(0.5, 1.0)))
+        for i in range(NUM_CHUNKS)
+        for j in rng.choice(NUM_CHUNKS, size=3, replace=False)
+        if i != j
+    ]
+    embeddings = rng.normal(size=(NUM_CHUNKS, DIM)).astype(np.float32)
+    write_graph_snapshot(ids, [f"text of {c}" for c in ids], embeddings.tolist(), edges, str(tmp_path / "snapshot"))
+    snapshot = GraphSnapshot(str(tmp_path / "snapshot"))
+
+    def no_neo4j(*args, **kwargs):
+        raise AssertionError("Neo4j queried with a snapshot configured")
+
+    monkeypatch.setattr(compute_max_hops, "get_graph_defined_max_hops", no_neo4j)
+    monkeypatch.setattr(orchestrator, "_snapshot", snapshot)
+    monkeypatch.setattr(orchestrator, "get_shard_router", lambda: None)
+    monkeypatch.setattr(orchestrator, "embedding_query", lambda question: embeddings[0] + embeddings[1])
+    monkeypatch.setattr(orchestrator, "predict_broadness_score", lambda embedding: 1.0)
+    monkeypatch.setattr(orchestrator, "rerank_chunks_with_cohere", partial(rerank_chunks_with_cohere, backend="local"))
+    monkeypatch.setattr(orchestrator, "generate_answer_from_chunks", lambda question, chains: "answer")
+    return snapshot
+
+
+def test_snapshot_queries_take_max_hops_from_the_snapshot(snapshot):
+    trace = {}
+    answer, timings = orchestrator.answer_question("text of doc0", trace=trace)
+    assert answer == "answer"
+    assert trace["hops"] == compute_hops(1.0, graph_max=snapshot.graph_max_hops)
+    assert trace["chains"]
+    assert "total" in timings
+
+
+@pytest.mark.parametrize("prefix_scoring", [False, True])
+def test_two_phase_fetches_contents_of_surviving_chunks_only(snapshot, monkeypatch, prefix_scoring):
+    monkeypatch.setattr(orchestrator, "PREFIX_SCORING", prefix_scoring)
+    query = orchestrator.embedding_query("question")
+    anchors = snapshot.find_anchors(query, 5)
+    single_phase = orchestrator.expand_and_filter(query, anchors, 2, top_n=5)
+
+    read = []
+    content = snapshot.content
+    monkeypatch.setattr(snapshot, "content", lambda i: read.append(snapshot.ids[i]) or content(i))
+    fetched = []
+    fetch_contents = snapshot.fetch_contents
+    monkeypatch.setattr(snapshot, "fetch_contents", lambda ids: fetched.append(list(ids)) or fetch_contents(ids))
+    monkeypatch.setattr(orchestrator, "TWO_PHASE", True)
+    two_phase = orchestrator.expand_and_filter(query, anchors, 2, top_n=5)
+
+    assert two_phase == single_phase
+    surviving = [chunk_id for ids_chain, _, _ in two_phase for chunk_id in ids_chain]
+    assert surviving
+    assert fetched == [surviving]
+    assert set(read) == set(surviving)
+
+
+def test_attach_chain_contents_fills_missing_chunks_with_empty_text():
+    chains = [(["a", "b"], None, 0.9), (["c"], None, 0.8)]
+    assert attach_chain_contents(chains, {"a": "A", "c": "C"}) == [(["a", "b"], ["A", ""], 0.9), (["c"], ["C"], 0.8)]
+
+
+class FakeExpansion:
+    """expand_and_filter stand-in: chains depend only on the depth; a speculative call runs until cancelled."""
+
+    def __init__(self):
+        self.calls = []
+        self.finished = []
+
+    def chains(self, hops):
+        return [([f"c{hops}_{i}"], [f"text {hops} {i}"], 1.0 - i / 10) for i in range(3)]
+
+    def __call__(self, query_emb, anchors, hops, top_n, cancel=None, allowed_ids=None, path_budget=None):
+        self.calls.append((hops, cancel))
+        try:
+            if cancel is not None and cancel.wait(timeout=0.2):
+                raise orchestrator.ExpansionCancelled()
+            return self.chains(hops)
+        finally:
+            self.finished.append(hops)
+
+
+@pytest.fixture
+def speculation(monkeypatch):
+    """Offline async pipeline whose hop history makes 1 the speculative guess; returns (expansion, set_hops)."""
+    expansion = FakeExpansion()
+    predicted = {"hops": 1}
+
+    def predict_hops(query_emb, tenant=None):
+        if isinstance(predicted["hops"], Exception):
+            raise predicted["hops"]
+        return 0.5, predicted["hops"]
+
+    monkeypatch.setattr(orchestrator, "_recent_hops", orchestrator.deque([1, 1, 2]))
+    monkeypatch.setattr(orchestrator, "embedding_query", lambda question: [1.0, 0.0])
+    monkeypatch.setattr(orchestrator, "entity_candidates", lambda question: None)
+    monkeypatch.setattr(orchestrator, "predict_hops", predict_hops)
+    monkeypatch.setattr(orchestrator, "find_anchors", lambda *args: ["anchor"])
+    monkeypatch.setattr(orchestrator, "expand_and_filter", expansion)
+    monkeypatch.setattr(orchestrator, "rerank_chunks_with_cohere", lambda question, chains, top_n: chains[:top_n])
+    monkeypatch.setattr(orchestrator, "generate_answer_from_chunks", lambda question, chains: chains[0][0][0])
+    return expansion, lambda hops: predicted.update(hops=hops)
+
+
+def run(speculative):
+    trace = {}
+    answer, timings = asyncio.run(orchestrator.answer_question_async("question", speculative, trace=trace))
+    return answer, timings, trace
+
+
+def test_speculation_hit_uses_the_speculative_expansion(speculation):
+    expansion, set_hops = speculation
+    set_hops(1)
+    answer, timings, trace = run(speculative=True)
+    assert [hops for hops, _ in expansion.calls] == [1]
+    assert timings["speculation_hit"] == 1.0
+    assert "speculative_expansion" not in timings and "expansion" in timings
+    assert trace["chains"] == expansion.chains(1)
+
+
+def test_speculation_miss_cancels_and_reexpands_at_the_predicted_depth(speculation):
+    expansion, set_hops = speculation
+    set_hops(2)
+    _, _, expected = run(speculative=False)
+    expansion.calls.clear()
+
+    answer, timings, trace = run(speculative=True)
+    (spec_hops, spec_cancel), (hops, cancel) = expansion.calls
+    assert (spec_hops, hops) == (1, 2)
+    assert spec_cancel.is_set() and cancel is None
+    assert timings["speculation_hit"] == 0.0
+    assert trace["chains"] == expected["chains"] == expansion.chains(2)
+    assert answer == "c2_0"
+
+
+def test_failed_query_waits_for_the_cancelled_speculation(speculation):
+    expansion, set_hops = speculation
+    set_hops(RuntimeError("broadness model unavailable"))
+    with pytest.raises(RuntimeError):
+        run(speculative=True)
+    ((_, cancel),) = expansion.calls
+    assert cancel.is_set()
+    # The speculative thread finished before answer_question_async returned
+    assert expansion.finished == [1]
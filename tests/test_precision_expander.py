@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+
+from precision_expander import (
+    PrefixSumScorer,
+    chain_precision,
+    filter_by_precision,
+    iter_paths_for_ppf,
+    iter_paths_for_ppf_prefix,
+    stream_filter_by_precision,
+)
+
+DIM = 8
+
+
+def scored_chains(n, seed=0):
+    rng = np.random.default_rng(seed)
+    # Rounded so ties occur and tie order is checked too
+    return [([f"c{i}"], [f"text {i}"], float(round(p, 1))) for i, p in enumerate(rng.uniform(0.5, 1.0, n))]
+
+
+class Cursor:
+    """Chain stream that records how far it was consumed and whether it was closed."""
+
+    def __init__(self, chains):
+        self.chains = chains
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.consumed == len(self.chains):
+            raise StopIteration
+        self.consumed += 1
+        return self.chains[self.consumed - 1]
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.8, 0.95, 1.1])
+@pytest.mark.parametrize("top_n", [1, 5, 50, 500])
+def test_stream_filter_matches_filter_by_precision(threshold, top_n):
+    chains = scored_chains(200)
+    expected = filter_by_precision(chains, threshold, top_n)
+    assert stream_filter_by_precision(iter(chains), threshold, top_n) == expected
+
+
+def test_stream_filter_falls_back_to_best_when_none_pass():
+    chains = scored_chains(50)
+    result = stream_filter_by_precision(iter(chains), threshold=1.1, top_n=3)
+    assert [c[2] for c in result] == sorted((c[2] for c in chains), reverse=True)[:3]
+
+
+def test_stream_filter_non_positive_top_n_returns_nothing():
+    chains = scored_chains(10)
+    assert stream_filter_by_precision(iter(chains), top_n=0) == []
+    assert stream_filter_by_precision(iter(chains), top_n=-1) == []
+
+
+def test_stream_filter_consumes_everything_without_early_stop():
+    cursor = Cursor(scored_chains(100))
+    stream_filter_by_precision(cursor, threshold=0.5, top_n=3)
+    assert cursor.consumed == 100
+    assert not cursor.closed
+
+
+def test_stream_filter_early_stop_closes_cursor_after_top_n_pass():
+    chains = scored_chains(100)
+    cursor = Cursor(chains)
+    result = stream_filter_by_precision(cursor, threshold=0.8, top_n=3, early_stop=True)
+
+    passing = [i for i, c in enumerate(chains) if c[2] >= 0.8][:3]
+    assert cursor.consumed == passing[-1] + 1
+    assert cursor.closed
+    assert sorted(result, key=lambda c: c[0]) == sorted((chains[i] for i in passing), key=lambda c: c[0])
+
+
+def dfs_paths(embeddings, hops):
+    """All `hops`-edge walks over a complete graph without self-loops, in DFS order, as PPF path tuples."""
+    def walk(path):
+        if len(path) - 1 == hops:
+            yield list(path)
+            return
+        for nxt in range(len(embeddings)):
+            if nxt != path[-1]:
+                yield from walk(path + [nxt])
+
+    for anchor in range(len(embeddings)):
+        for path in walk([anchor]):
+            yield [f"c{i}" for i in path], [f"text {i}" for i in path], [embeddings[i] for i in path]
+
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(0).normal(size=(5, DIM)).astype(np.float32)
+
+
+@pytest.mark.parametrize("hops", [0, 1, 2, 3])
+def test_prefix_sum_scorer_matches_chain_precision(embeddings, hops):
+    q = np.random.default_rng(1).normal(size=DIM)
+    scorer = PrefixSumScorer(q)
+    for ids_chain, _, embeddings_chain in dfs_paths(embeddings, hops):
+        assert scorer.score(ids_chain, embeddings_chain.__getitem__) == pytest.approx(
+            chain_precision(q, embeddings_chain), abs=1e-6
+        )
+    if hops > 1:
+        assert scorer.trie_nodes < scorer.path_nodes
+
+
+def test_prefix_scoring_drops_duplicate_chains(embeddings, capsys):
+    q = np.random.default_rng(1).normal(size=DIM)
+    paths = list(dfs_paths(embeddings, 2))
+    plain = list(iter_paths_for_ppf(q, paths))
+    prefix = list(iter_paths_for_ppf_prefix(q, paths))
+
+    # Walks over the same chunk multiset (e.g. a path and its reverse) are kept once, the first time
+    first = {}
+    for chain in plain:
+        first.setdefault(tuple(sorted(chain[0])), chain)
+    assert len(prefix) < len(paths)
+    assert [c[0] for c in prefix] == [c[0] for c in first.values()]
+    assert [c[2] for c in prefix] == pytest.approx([c[2] for c in first.values()], abs=1e-6)
+    assert f"{len(paths) - len(prefix)} duplicate chains dropped" in capsys.readouterr().out
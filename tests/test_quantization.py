@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+import quantization
+from quantization import (
+    bytes_per_vector,
+    dequantize_embedding,
+    dequantize_matrix,
+    embeddings_from_records,
+    quantize_embedding,
+    quantize_matrix,
+    quantized_cosine,
+    row_norms,
+)
+
+DIM = 64
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(0)
+    # Rows of very different magnitudes, so per-row int8 scales matter
+    return (rng.normal(size=(50, DIM)) * rng.uniform(0.01, 10.0, size=(50, 1))).astype(np.float32)
+
+
+def test_none_round_trip_is_exact(matrix):
+    codes, scales = quantize_matrix(matrix, "none")
+    assert scales is None
+    np.testing.assert_array_equal(dequantize_matrix(codes, scales), matrix)
+
+
+def test_float16_round_trip_error_is_within_half_precision(matrix):
+    codes, scales = quantize_matrix(matrix, "float16")
+    assert codes.dtype == np.float16 and scales is None
+    # float16 keeps 11 significant bits: relative error at most 2^-11
+    error = np.abs(dequantize_matrix(codes, scales) - matrix)
+    assert np.all(error <= np.abs(matrix) * 2.0 ** -11 + 1e-7)
+
+
+def test_int8_round_trip_error_is_within_half_a_step_per_row(matrix):
+    codes, scales = quantize_matrix(matrix, "int8")
+    assert codes.dtype == np.int8 and scales.shape == (len(matrix),)
+    np.testing.assert_allclose(scales, np.abs(matrix).max(axis=1) / 127.0, rtol=1e-6)
+    error = np.abs(dequantize_matrix(codes, scales) - matrix)
+    assert np.all(error <= scales[:, None] / 2 * (1 + 1e-5))
+
+
+def test_int8_zero_row_round_trips():
+    codes, scales = quantize_matrix(np.zeros((2, DIM)), "int8")
+    assert np.all(scales == 1.0)
+    np.testing.assert_array_equal(dequantize_matrix(codes, scales), np.zeros((2, DIM)))
+
+
+@pytest.mark.parametrize("mode", ["none", "float16", "int8"])
+def test_embedding_bytes_round_trip(matrix, mode):
+    blob, scale = quantize_embedding(matrix[3], mode)
+    assert len(blob) + (4 if mode == "int8" else 0) == bytes_per_vector(mode, DIM)
+    codes, scales = quantize_matrix(matrix[3:4], mode)
+    np.testing.assert_array_equal(dequantize_embedding(blob, scale, mode), dequantize_matrix(codes, scales)[0])
+
+
+@pytest.mark.parametrize("mode, atol", [("none", 1e-6), ("float16", 1e-3), ("int8", 2e-2)])
+def test_quantized_cosine_matches_exact_cosine(monkeypatch, matrix, mode, atol):
+    # Small blocks, so the block-by-block widening is exercised too
+    monkeypatch.setattr(quantization, "QUANT_BLOCK_ROWS", 7)
+    query = np.random.default_rng(1).normal(size=DIM).astype(np.float32)
+    codes, scales = quantize_matrix(matrix, mode)
+    np.testing.assert_allclose(row_norms(codes, scales), np.linalg.norm(dequantize_matrix(codes, scales), axis=1), rtol=1e-5)
+
+    exact = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    np.testing.assert_allclose(quantized_cosine(codes, scales, row_norms(codes, scales), query), exact, atol=atol)
+
+
+def test_embeddings_from_records_fall_back_to_the_float_embedding(matrix):
+    blob, scale = quantize_embedding(matrix[0], "int8")
+    full = matrix[1].tolist()
+    decoded = embeddings_from_records([blob, None], [scale, None], "int8", fallbacks=[None, full])
+    np.testing.assert_array_equal(decoded[0], dequantize_embedding(blob, scale, "int8"))
+    assert decoded[1].dtype == np.float32
+    np.testing.assert_array_equal(decoded[1], matrix[1])
+
+
+def test_unknown_mode_is_rejected(matrix):
+    with pytest.raises(ValueError):
+        quantize_matrix(matrix, "int4")
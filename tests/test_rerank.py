@@ -0,0 +1,83 @@
+import pytest
+
+import rerank_cohere
+from rerank_cohere import RerankCache, aggregate_chain_score, local_scores, rerank_chunks_with_cohere
+
+CHAINS = [
+    (["a", "b"], ["vitamin c deficiency", "sailors at sea"], 0.9),
+    (["c"], ["scurvy is caused by a lack of vitamin c"], 0.85),
+    (["d", "a"], ["unrelated text", "vitamin c deficiency"], 0.8),
+    (["e"], ["nothing relevant here"], 0.95),
+]
+
+
+@pytest.fixture
+def counting_backend(monkeypatch):
+    calls = []
+
+    def backend(question, texts):
+        calls.append(list(texts))
+        return local_scores(question, texts)
+
+    monkeypatch.setitem(rerank_cohere.RERANK_BACKENDS, "counting", backend)
+    return calls
+
+
+def test_local_scores_rank_by_query_term_coverage():
+    scores = local_scores("what causes scurvy", ["scurvy causes", "what causes scurvy", "bread"])
+    assert scores[1] > scores[0] > scores[2] == 0.0
+
+
+def test_rerank_orders_chains_by_aggregated_chunk_score(counting_backend):
+    reranked = rerank_chunks_with_cohere(
+        "what causes scurvy vitamin c", CHAINS, top_n=2, aggregation="max", backend="counting", cache=RerankCache()
+    )
+    assert [chain[0] for chain in reranked] == [["c"], ["a", "b"]]
+
+
+def test_rerank_scores_each_unique_chunk_once(counting_backend):
+    rerank_chunks_with_cohere("scurvy", CHAINS, top_n=2, backend="counting", cache=RerankCache())
+    assert len(counting_backend) == 1
+    assert len(counting_backend[0]) == 5  # chunk "a" appears in two chains
+
+
+def test_rerank_skips_chunks_already_cached(counting_backend):
+    cache = RerankCache()
+    rerank_chunks_with_cohere("scurvy", CHAINS, top_n=2, backend="counting", cache=cache)
+    more = CHAINS + [(["f", "c"], ["scurvy in history", "scurvy is caused by a lack of vitamin c"], 0.7)]
+    rerank_chunks_with_cohere("scurvy", more, top_n=2, backend="counting", cache=cache)
+    assert counting_backend[1] == ["scurvy in history"]
+    assert cache.hits == 5
+
+
+def test_rerank_cache_is_per_question(counting_backend):
+    cache = RerankCache()
+    rerank_chunks_with_cohere("scurvy", CHAINS, top_n=2, backend="counting", cache=cache)
+    rerank_chunks_with_cohere("sailors", CHAINS, top_n=2, backend="counting", cache=cache)
+    assert len(counting_backend) == 2 and len(counting_backend[1]) == 5
+
+
+def test_rerank_skipped_when_nothing_to_cut(counting_backend):
+    assert rerank_chunks_with_cohere("scurvy", CHAINS[:2], top_n=2, backend="counting") == CHAINS[:2]
+    assert counting_backend == []
+
+
+def test_rerank_cache_evicts_least_recently_used():
+    cache = RerankCache(max_size=2)
+    cache.put(("q", "a"), 1.0)
+    cache.put(("q", "b"), 2.0)
+    assert cache.get(("q", "a")) == 1.0
+    cache.put(("q", "c"), 3.0)
+    assert cache.get(("q", "b")) is None
+    assert cache.get(("q", "a")) == 1.0 and cache.get(("q", "c")) == 3.0
+    assert len(cache) == 2
+
+
+@pytest.mark.parametrize("aggregation, expected", [("max", 0.9), ("mean", 0.5), ("weighted", (0.9 + 0.1 / 2) / 1.5)])
+def test_aggregate_chain_score(aggregation, expected):
+    assert aggregate_chain_score([0.9, 0.1], aggregation) == pytest.approx(expected)
+
+
+def test_aggregate_chain_score_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        aggregate_chain_score([0.5], "median")
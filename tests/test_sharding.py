@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from sharding import InMemoryShard, ShardRouter
+
+DIM = 8
+
+
+def build(num_docs=10, chunks_per_doc=5, seed=0):
+    """The same chunks both split over three shards by document and in one shard."""
+    rng = np.random.default_rng(seed)
+    router = ShardRouter([InMemoryShard("a", tenants=["t1"]), InMemoryShard("b"), InMemoryShard("c")])
+    single = InMemoryShard("all")
+    for doc in range(num_docs):
+        ids = [f"doc{doc}_chunk_{i}" for i in range(chunks_per_doc)]
+        rows = [(c, f"text of {c}", rng.normal(size=DIM).tolist()) for c in ids]
+        shard = router.shard_for_source(f"doc{doc}.txt", tenant="t1" if doc < 2 else None)
+        for target in (shard, single):
+            target.add_chunks(rows)
+        # SIMILAR_TO edges stay within a document, hence within a shard
+        for i in range(chunks_per_doc):
+            for j in rng.choice(chunks_per_doc, size=2, replace=False):
+                if i != j:
+                    score = float(rng.uniform(0.5, 1.0))
+                    shard.add_edge(ids[i], ids[j], score)
+                    single.add_edge(ids[i], ids[j], score)
+    return router, single, rng.normal(size=DIM)
+
+
+def test_duplicate_shard_names_are_rejected():
+    with pytest.raises(ValueError):
+        ShardRouter([InMemoryShard("a"), InMemoryShard("a")])
+
+
+def test_tenant_routing():
+    router = ShardRouter([InMemoryShard("a", tenants=["t1"]), InMemoryShard("b"), InMemoryShard("c")])
+    assert [s.name for s in router.shards_for("t1")] == ["a"]
+    assert [s.name for s in router.shards_for("other")] == ["b", "c"]
+    assert [s.name for s in router.shards_for(None)] == ["a", "b", "c"]
+
+    assert router.shard_for_source("paper.txt", "t1").name == "a"
+    placed = {router.shard_for_source(f"doc{i}.txt").name for i in range(50)}
+    assert placed == {"b", "c"}
+    assert router.shard_for_source("doc7.txt") is router.shard_for_source("doc7.txt")
+
+
+def test_source_without_a_shard_for_its_tenant_is_rejected():
+    router = ShardRouter([InMemoryShard("a", tenants=["t1"])])
+    with pytest.raises(ValueError):
+        router.shard_for_source("paper.txt", "t2")
+
+
+def test_find_anchors_merges_to_the_global_top_k():
+    router, single, query = build()
+    merged = router.find_anchors(query, k=6)
+    expected = single.find_anchors(query, k=6)
+
+    flat = sorted(((score, anchor) for anchors in merged.values() for anchor, score in anchors), reverse=True)
+    assert [anchor for _, anchor in flat] == [anchor for anchor, _ in expected]
+    assert [score for score, _ in flat] == pytest.approx([score for _, score in expected])
+    for name, anchors in merged.items():
+        assert all(anchor in router.by_name[name].contents for anchor, _ in anchors)
+
+
+def test_find_anchors_only_searches_the_tenant_shards():
+    router, _, query = build()
+    merged = router.find_anchors(query, k=10, tenant="t1")
+    assert list(merged) == ["a"]
+    assert len(merged["a"]) == len(router.by_name["a"])
+
+
+@pytest.mark.parametrize("prefix_scoring", [False, True])
+def test_expand_merges_to_the_global_top_n(prefix_scoring):
+    router, single, query = build()
+    anchors = router.find_anchors(query, k=6)
+    merged = router.expand(query, anchors, hops=2, top_n=5, prefix_scoring=prefix_scoring)
+
+    all_anchors = [(anchor, score) for shard_anchors in anchors.values() for anchor, score in shard_anchors]
+    expected = ShardRouter([single]).expand(query, {"all": all_anchors}, hops=2, top_n=5, prefix_scoring=prefix_scoring)
+
+    assert [chain[2] for chain in merged[:5]] == pytest.approx([chain[2] for chain in expected])
+    assert all(merged[i][2] >= merged[i + 1][2] for i in range(len(merged) - 1))
+
+
+def test_lookups_merge_across_shards():
+    router, single, _ = build()
+    ids = ["doc0_chunk_1", "doc3_chunk_2", "doc5_chunk_4", "missing"]
+    assert router.fetch_contents(ids) == single.fetch_contents(ids)
+    embeddings = router.full_embeddings(ids)
+    assert sorted(embeddings) == sorted(ids[:3])
+    for c in ids[:3]:
+        np.testing.assert_array_equal(embeddings[c], single.embeddings[c])
+
+
+def test_graph_max_hops_is_the_largest_over_the_tenant_shards():
+    router = ShardRouter([InMemoryShard("a", tenants=["t1"]), InMemoryShard("b")])
+    a, b = router.by_name["a"], router.by_name["b"]
+    for shard, length in ((a, 2), (b, 5)):
+        ids = [f"{shard.name}{i}" for i in range(length + 1)]
+        shard.add_chunks((c, c, [1.0] * DIM) for c in ids)
+        for x, y in zip(ids, ids[1:]):
+            shard.add_edge(x, y, 1.0)
+    assert router.graph_max_hops("t1") == 2
+    assert router.graph_max_hops("other") == 5
+    assert router.graph_max_hops() == 5
@@ -0,0 +1,53 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("pandas")
+pytest.importorskip("joblib")
+pytest.importorskip("tqdm")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "GraphRag_retrieval_controller"))
+import train_controller  # noqa: E402
+from sklearn.decomposition import PCA  # noqa: E402
+from sklearn.linear_model import LinearRegression  # noqa: E402
+from sklearn.model_selection import KFold, cross_val_score  # noqa: E402
+from sklearn.pipeline import make_pipeline  # noqa: E402
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(120, 40)).astype(np.float32)
+    y = X[:, :3] @ np.array([0.5, -0.2, 0.1]) + rng.normal(scale=0.05, size=120)
+    return X, y
+
+
+@pytest.mark.parametrize("n_components", [4, 10])
+def test_grid_scores_match_a_pca_pipeline_inside_cv(tmp_path, data, n_components):
+    X, y = data
+    train_controller._init_worker(train_controller.project_folds(X, y, 16, 5, "test", cache_dir=tmp_path))
+
+    expected = cross_val_score(
+        make_pipeline(PCA(n_components, svd_solver="full"), LinearRegression()), X, y,
+        cv=KFold(n_splits=5, shuffle=True, random_state=42), scoring="r2"
+    ).mean()
+    assert train_controller.evaluate((n_components, "linear"))["r2"] == pytest.approx(expected, abs=1e-5)
+    assert len(list(tmp_path.glob("pca_test_cv5-*_16.joblib"))) == 5
+
+
+def test_embedding_store_only_embeds_new_texts(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_embed_batch(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(train_controller, "embed_batch", fake_embed_batch)
+    first = train_controller.EmbeddingStore(tmp_path).embed(["a", "bb", "a"], batch_size=1)
+    second = train_controller.EmbeddingStore(tmp_path).embed(["bb", "ccc"])
+    assert calls == [["a"], ["bb"], ["ccc"]]
+    assert first.tolist() == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert second.tolist() == [[2.0, 1.0], [3.0, 1.0]]